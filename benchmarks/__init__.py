@@ -0,0 +1 @@
+"""Benchmarks of the coffea-casa stack, run from a checkout of the repository"""
@@ -0,0 +1,15 @@
+"""Offline Analysis Grand Challenge throughput benchmark
+
+Measures the events/s per core of the coffea-casa stack without network
+access: AGC-shaped ROOT files are synthesized locally (``synthesize``), the
+AGC processor (``processor``) runs through a ``LocalCluster`` whose workers
+have the size and Dask config of coffea-casa's HTCondor workers (``suite``),
+and the runs of the image flavours are compared (``report``). Each run
+reports events/s per core, bytes read, the peak memory of the workers and
+the time spent merging the outputs after the last chunk was processed.
+
+Run inside each image, from a checkout of the repository::
+
+    python -m benchmarks.agc run --flavour noml --output results/noml.json
+    python -m benchmarks.agc compare results/*.json
+"""
@@ -0,0 +1,53 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.agc",
+                                     description="Offline AGC throughput benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="synthesize the dataset and time the processor")
+    run.add_argument("--flavour", default=os.environ.get("CASA_FLAVOUR"),
+                     help="image flavour recorded with the results (default $CASA_FLAVOUR)")
+    run.add_argument("--files", type=int, default=4, help="number of files")
+    run.add_argument("--events", type=int, default=100_000, help="events per file")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--chunksize", type=int, default=100_000)
+    run.add_argument("--workers", default="auto", help="number of workers, or auto")
+    run.add_argument("--repeat", type=int, default=3, help="runs, the fastest is kept")
+    run.add_argument("--data", default=os.path.join(tempfile.gettempdir(), "agc-benchmark"),
+                     help="directory of the synthesized files")
+    run.add_argument("--output", help="JSON file written with the results")
+
+    compare = commands.add_parser("compare", help="compare results of several flavours")
+    compare.add_argument("results", nargs="+", help="JSON files written by run")
+    compare.add_argument("--baseline", default="noml")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        from .report import compare as compare_results, load_results
+
+        print(compare_results(load_results(args.results), baseline=args.baseline))
+        return 0
+
+    from .report import compare as compare_results
+    from .suite import run_suite
+
+    workers = args.workers if args.workers == "auto" else int(args.workers)
+    result = run_suite(args.data, files=args.files, events=args.events, seed=args.seed,
+                       repeat=args.repeat, n_workers=workers, chunksize=args.chunksize,
+                       flavour=args.flavour)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    print(compare_results([result]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
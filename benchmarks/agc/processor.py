@@ -0,0 +1,66 @@
+"""The AGC processor timed by the benchmark
+
+The selection of the gallery notebooks (``coffea_analysis.ipynb`` and
+``ttbar_HT.ipynb``): opposite-sign dimuon and dielectron masses and the
+scalar sum of the jet transverse momenta, read through ``AGCSchema``.
+Written against the API shared by coffea 0.7 and the CalVer releases, so
+that every image flavour runs the same code.
+"""
+import os
+import sys
+import time
+
+import awkward as ak
+import hist
+from coffea import processor
+
+GALLERY = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "docs", "gallery")
+
+
+def agc_schema():
+    """Return ``AGCSchema`` of docs/gallery/agc_schema.py
+
+    The gallery directory is put on ``sys.path``, which workers started by
+    multiprocessing inherit, so that they can unpickle the schema.
+    """
+    gallery = os.path.abspath(GALLERY)
+    if gallery not in sys.path:
+        sys.path.insert(0, gallery)
+    from agc_schema import AGCSchema
+    return AGCSchema
+
+
+def _dilepton_mass(leptons):
+    leptons = leptons[leptons.pt > 10]
+    pairs = leptons[(ak.num(leptons, axis=1) == 2) & (ak.sum(leptons.ch, axis=1) == 0)]
+    return (pairs[:, 0] + pairs[:, 1]).mass
+
+
+class AGCProcessor(processor.ProcessorABC):
+    def process(self, events):
+        mll = hist.Hist(
+            hist.axis.StrCategory(["ee", "mumu"], name="channel"),
+            hist.axis.Regular(60, 0, 150, name="mass", label="Dilepton mass [GeV]"),
+        )
+        mll.fill(channel="mumu", mass=_dilepton_mass(events.muon))
+        mll.fill(channel="ee", mass=_dilepton_mass(events.electron))
+
+        jets = events.jet[events.jet.pt > 25]
+        ht = hist.Hist(hist.axis.Regular(50, 0, 1000, name="ht", label="HT [GeV]"))
+        ht.fill(ht=ak.sum(jets.pt, axis=-1))
+
+        _log_process_end()
+        return {"mll": mll, "ht": ht, "events": len(events)}
+
+    def postprocess(self, accumulator):
+        return accumulator
+
+
+def _log_process_end():
+    # Lets the benchmark tell processing from merging; see suite.merge_time
+    try:
+        from distributed import get_worker
+
+        get_worker().log_event("agc-benchmark", {"end": time.time()})
+    except ValueError:
+        pass
@@ -0,0 +1,47 @@
+"""Compare AGC benchmark results across image flavours
+
+Standard library only, so that results gathered from several images can be
+compared anywhere.
+"""
+import json
+
+FLAVOURS = ("noml", "dak", "full", "0.7")
+
+
+def _mib(nbytes):
+    return f"{nbytes / 2**20:.0f} MiB"
+
+
+def load_results(paths):
+    results = []
+    for path in paths:
+        with open(path) as f:
+            results.append(json.load(f))
+    return results
+
+
+def _order(result):
+    flavour = result.get("flavour")
+    return (FLAVOURS.index(flavour) if flavour in FLAVOURS else len(FLAVOURS), str(flavour))
+
+
+def compare(results, baseline="noml"):
+    """Return a table of ``results``, throughput relative to ``baseline``"""
+    results = sorted(results, key=_order)
+    reference = next((r for r in results if r.get("flavour") == baseline), results[0])
+    lines = [
+        f"{'flavour':<10}{'coffea':<12}{'ev/s/core':>11}{'vs ' + reference['flavour']:>9}"
+        f"{'read':>11}{'peak worker':>13}{'peak total':>12}{'merge s':>9}{'wall s':>8}"
+    ]
+    for r in results:
+        ratio = r["events_per_second_per_core"] / reference["events_per_second_per_core"]
+        lines.append(
+            f"{r['flavour']:<10}{r['versions']['coffea']:<12}"
+            f"{r['events_per_second_per_core']:>11.0f}{ratio:>9.2f}"
+            f"{_mib(r['bytes_read']):>11}{_mib(r['peak_worker_memory']):>13}"
+            f"{_mib(r['peak_total_memory']):>12}{r['merge_time']:>9.2f}{r['wall_time']:>8.1f}"
+        )
+    shapes = {(r["files"], r["events"], r["chunksize"]) for r in results}
+    if len(shapes) > 1:
+        lines.append("Warning: the runs processed different datasets or chunk sizes")
+    return "\n".join(lines)
@@ -0,0 +1,188 @@
+"""Run the AGC processor on a LocalCluster shaped like coffea-casa workers"""
+import os
+import platform
+import threading
+import time
+
+import dask
+import yaml
+from dask.utils import parse_bytes
+from distributed import Client, LocalCluster
+
+from coffea_casa.local_workers import local_worker_budget
+
+from .synthesize import synthesize_dataset
+
+REPO = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)
+CONFIG_FILES = (
+    os.path.join(REPO, "coffea_casa", "jobqueue-coffea-casa.yaml"),
+    os.path.join(REPO, "docker", "dask", "dask.yaml"),
+)
+
+# The image's TLS settings point at secrets only mounted in the pods
+NO_TLS = {
+    "distributed.comm.require-encryption": False,
+    "distributed.comm.tls.ca-file": None,
+    "distributed.comm.tls.scheduler": {"cert": None, "key": None},
+    "distributed.comm.tls.worker": {"cert": None, "key": None},
+    "distributed.comm.tls.client": {"cert": None, "key": None},
+}
+
+
+def load_dask_config():
+    """Use coffea-casa's Dask config as defaults, as in the images"""
+    for path in CONFIG_FILES:
+        with open(path) as f:
+            dask.config.update_defaults(yaml.safe_load(f))
+
+
+def cluster_shape(n_workers="auto"):
+    """Return ``(n_workers, threads_per_worker, memory_limit)``
+
+    Workers get the cores and memory of a coffea-casa HTCondor job
+    (``jobqueue.coffea-casa``), as many as fit on this machine.
+    """
+    cores = int(dask.config.get("jobqueue.coffea-casa.cores", 1))
+    memory = parse_bytes(dask.config.get("jobqueue.coffea-casa.memory", "4GiB"))
+    n_workers, threads, available = local_worker_budget(
+        n_workers, reserve_cores=0, memory_fraction=1.0, threads_per_worker=cores)
+    if n_workers <= 0:
+        raise RuntimeError(f"This machine has fewer than {cores} cores for one worker")
+    return n_workers, threads, min(memory, available)
+
+
+def _rss():
+    import psutil
+
+    return psutil.Process().memory_info().rss
+
+
+class MemorySampler:
+    """Peak resident memory of the workers, polled every ``interval``"""
+    def __init__(self, client, interval=0.2):
+        self.client = client
+        self.interval = interval
+        self.peak_worker = 0
+        self.peak_total = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        rss = self.client.run(_rss)
+        if rss:
+            self.peak_worker = max(self.peak_worker, max(rss.values()))
+            self.peak_total = max(self.peak_total, sum(rss.values()))
+
+    def __enter__(self):
+        self.sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+def versions():
+    """Return the versions of the stack under test"""
+    import awkward
+    import coffea
+    import distributed
+    import numpy
+    import uproot
+
+    return {
+        "python": platform.python_version(),
+        "coffea": coffea.__version__,
+        "uproot": uproot.__version__,
+        "awkward": awkward.__version__,
+        "numpy": numpy.__version__,
+        "dask": dask.__version__,
+        "distributed": distributed.__version__,
+    }
+
+
+def run_agc(paths, *, n_workers="auto", chunksize=100_000, flavour=None):
+    """Process ``paths`` with the AGC processor; return the measurements
+
+    Parameters
+    ----------
+    paths : list of str
+        AGC-shaped ROOT files, see ``synthesize_dataset``
+    n_workers : int or "auto", default "auto"
+        Workers of the LocalCluster
+    chunksize : int, default 100000
+        Events per chunk
+    flavour : str, optional
+        Image flavour recorded with the results
+
+    Returns
+    -------
+    dict
+        JSON-serializable results, read by ``report.compare``
+    """
+    from coffea import processor
+
+    from .processor import AGCProcessor, agc_schema
+
+    load_dask_config()
+    # Before the workers start, so that they inherit the path to the schema
+    schema = agc_schema()
+    n_workers, threads, memory = cluster_shape(n_workers)
+    with dask.config.set(NO_TLS), \
+            LocalCluster(n_workers=n_workers, threads_per_worker=threads,
+                         memory_limit=memory, dashboard_address=None) as cluster, \
+            Client(cluster) as client:
+        client.wait_for_workers(n_workers)
+        runner = processor.Runner(
+            executor=processor.DaskExecutor(client=client, status=False),
+            schema=schema, chunksize=chunksize, savemetrics=True)
+        fileset = {"agc": list(paths)}
+
+        with MemorySampler(client) as memory_sampler:
+            start = time.time()
+            output, metrics = runner(fileset=fileset, treename="events",
+                                     processor_instance=AGCProcessor())
+            end = time.time()
+        process_end = max((msg["end"] for _, msg in client.get_events("agc-benchmark")),
+                          default=end)
+
+    cores = n_workers * threads
+    wall = end - start
+    return {
+        "flavour": flavour or os.environ.get("CASA_FLAVOUR", "unknown"),
+        "versions": versions(),
+        "files": len(paths),
+        "events": int(output["events"]),
+        "workers": n_workers,
+        "threads_per_worker": threads,
+        "memory_limit": memory,
+        "chunksize": chunksize,
+        "chunks": int(metrics.get("chunks", 0)),
+        "wall_time": wall,
+        "process_time": max(process_end - start, 0.0),
+        "merge_time": max(end - process_end, 0.0),
+        "events_per_second_per_core": output["events"] / wall / cores,
+        "bytes_read": int(metrics.get("bytesread", 0)),
+        "peak_worker_memory": memory_sampler.peak_worker,
+        "peak_total_memory": memory_sampler.peak_total,
+    }
+
+
+def run_suite(directory, *, files=4, events=100_000, seed=0, repeat=3, **kwargs):
+    """Synthesize the dataset and return the fastest of ``repeat`` runs
+
+    The first run also warms the page cache and the imports of the workers.
+    """
+    paths = synthesize_dataset(directory, files=files, events=events, seed=seed)
+    runs = [run_agc(paths, **kwargs) for _ in range(repeat)]
+    best = max(runs, key=lambda r: r["events_per_second_per_core"])
+    best["repeat"] = repeat
+    best["seed"] = seed
+    return best
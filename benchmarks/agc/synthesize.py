@@ -0,0 +1,121 @@
+"""Synthetic ROOT files with the branch layout of the AGC open data
+
+The files have the flat ``events`` tree read by
+``docs/gallery/agc_schema.py``: one ``number<name>`` counter and
+``<name>_pt/eta/phi/e`` branches per object collection, ``met_*`` scalars,
+``GenPart_*`` counted by ``numGenPart`` and ``PV_*`` counted by ``nPV_x``.
+Multiplicities and kinematics are drawn from a seeded generator, so that a
+given ``(events, seed)`` always produces the same bytes of physics content.
+"""
+import os
+
+import awkward as ak
+import numpy as np
+import uproot
+
+# collection: (mean multiplicity, mass in GeV, has a charge branch)
+COLLECTIONS = {
+    "jet": (6.0, 10.0, False),
+    "muon": (1.5, 0.10566, True),
+    "electron": (1.2, 0.000511, True),
+    "photon": (1.0, 0.0, False),
+}
+
+# Counter branches that do not follow the number<name> pattern
+COUNTERS = {"GenPart": "numGenPart", "PV": "nPV_x"}
+
+
+def _counter_name(collection):
+    return COUNTERS.get(collection, f"number{collection}")
+
+
+def _field_name(collection, field):
+    return f"{collection}_{field}"
+
+
+def _kinematics(rng, total, mass):
+    pt = rng.exponential(30.0, total) + 5.0
+    eta = rng.normal(0.0, 1.5, total)
+    phi = rng.uniform(-np.pi, np.pi, total)
+    energy = np.sqrt((pt * np.cosh(eta)) ** 2 + mass ** 2)
+    return {"pt": pt.astype(np.float32), "eta": eta.astype(np.float32),
+            "phi": phi.astype(np.float32), "e": energy.astype(np.float32)}
+
+
+def synthesize_events(events, seed=0):
+    """Return ``{branch group: array}`` of ``events`` AGC-shaped events
+
+    ``seed`` is an int or a list of ints.
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for name, (mean, mass, charged) in COLLECTIONS.items():
+        counts = rng.poisson(mean, events)
+        fields = _kinematics(rng, int(counts.sum()), mass)
+        if charged:
+            fields["ch"] = rng.choice(np.array([-1, 1], dtype=np.int32), int(counts.sum()))
+        data[name] = ak.unflatten(ak.zip(fields), counts)
+
+    counts = rng.poisson(20, events)
+    total = int(counts.sum())
+    data["GenPart"] = ak.unflatten(ak.zip({
+        "pt": (rng.exponential(20.0, total) + 1.0).astype(np.float32),
+        "eta": rng.normal(0.0, 2.5, total).astype(np.float32),
+        "phi": rng.uniform(-np.pi, np.pi, total).astype(np.float32),
+        "pdgId": rng.choice(np.array([-13, -11, 1, 2, 5, 11, 13, 21, 22], dtype=np.int32),
+                            total),
+    }), counts)
+
+    counts = rng.poisson(20, events) + 1
+    total = int(counts.sum())
+    data["PV"] = ak.unflatten(ak.zip({
+        "x": rng.normal(0.0, 0.01, total).astype(np.float32),
+        "y": rng.normal(0.0, 0.01, total).astype(np.float32),
+        "z": rng.normal(0.0, 4.0, total).astype(np.float32),
+    }), counts)
+    data["PV_npvs"] = counts.astype(np.int32)
+
+    data["met_pt"] = rng.exponential(40.0, events).astype(np.float32)
+    data["met_phi"] = rng.uniform(-np.pi, np.pi, events).astype(np.float32)
+    return data
+
+
+def write_agc_file(path, events, seed=0, basket_events=50_000):
+    """Write ``events`` synthetic events to the ROOT file ``path``"""
+    with uproot.recreate(path) as f:
+        tree = None
+        for start in range(0, events, basket_events):
+            data = synthesize_events(min(basket_events, events - start),
+                                     seed=[*np.atleast_1d(seed).tolist(), start])
+            if tree is None:
+                tree = f.mktree(
+                    "events",
+                    {name: array.type.content if hasattr(array, "layout") else array.dtype
+                     for name, array in data.items()},
+                    counter_name=_counter_name,
+                    field_name=_field_name,
+                )
+            tree.extend(data)
+    return path
+
+
+def synthesize_dataset(directory, files=4, events=100_000, seed=0):
+    """Write ``files`` files of ``events`` events to ``directory``
+
+    Existing files of the same name are reused, so that repeated runs of the
+    benchmark only pay the generation once.
+
+    Returns
+    -------
+    list of str
+        Paths of the files
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(files):
+        path = os.path.join(directory, f"agc-{events}-{seed}-{i}.root")
+        if not os.path.exists(path):
+            write_agc_file(f"{path}.tmp", events, seed=[seed, i])
+            os.replace(f"{path}.tmp", path)
+        paths.append(path)
+    return paths
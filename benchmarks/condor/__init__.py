@@ -0,0 +1,16 @@
+"""End-to-end scaling benchmark of CoffeaCasaCluster against a fake HTCondor
+
+``fake`` puts ``condor_submit``, ``condor_q``, ``condor_rm`` and
+``condor_release`` shims on ``PATH`` that run each job as a local process,
+with configurable queue delay and hold and eviction injection; Dask jobs
+start the worker from their ClassAd as the coffea-casa worker image does.
+``suite`` drives a real ``CoffeaCasaCluster`` through ``scale()``,
+``adapt()`` and ``close()`` against it and measures scale-up latency,
+scale-down correctness and submit throughput, without HTCondor or network
+access.
+
+Run from a checkout of the repository::
+
+    python -m benchmarks.condor scale-up --workers 16 --queue-delay 2
+    python -m benchmarks.condor all --evict-fraction 0.2 --output condor.json
+"""
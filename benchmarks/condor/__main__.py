@@ -0,0 +1,55 @@
+import argparse
+import json
+import os
+import sys
+
+BENCHMARK_NAMES = ("scale-up", "scale-down", "adapt", "submit")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.condor",
+        description="CoffeaCasaCluster scaling benchmarks against a fake HTCondor")
+    parser.add_argument("benchmark", choices=BENCHMARK_NAMES + ("all",))
+    parser.add_argument("--workers", type=int, default=8, help="workers requested")
+    parser.add_argument("--cores", type=int, default=1, help="cores per job")
+    parser.add_argument("--memory", default="1GiB", help="memory per job")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="workers per job (pilot jobs)")
+    parser.add_argument("--drain-timeout", type=int, default=None,
+                        help="CoffeaCasaCluster drain_timeout (default from the config)")
+    parser.add_argument("--queue-delay", type=float, default=0.0,
+                        help="seconds a job stays idle before it starts")
+    parser.add_argument("--queue-jitter", type=float, default=0.0,
+                        help="random extra queue delay, up to this many seconds")
+    parser.add_argument("--hold-fraction", type=float, default=0.0,
+                        help="fraction of job starts that go on hold instead")
+    parser.add_argument("--evict-fraction", type=float, default=0.0,
+                        help="fraction of job starts evicted after --evict-after")
+    parser.add_argument("--evict-after", type=float, default=30.0)
+    parser.add_argument("--submit-latency", type=float, default=0.0,
+                        help="seconds added to each condor_submit call")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="JSON file written with the results")
+    args = parser.parse_args(argv)
+
+    from .suite import run_benchmarks, summary
+
+    names = BENCHMARK_NAMES if args.benchmark == "all" else (args.benchmark,)
+    results = run_benchmarks(
+        names, args.workers,
+        cluster_kwargs={"cores": args.cores, "memory": args.memory,
+                        "processes": args.processes, "drain_timeout": args.drain_timeout},
+        queue_delay=args.queue_delay, queue_jitter=args.queue_jitter,
+        hold_fraction=args.hold_fraction, evict_fraction=args.evict_fraction,
+        evict_after=args.evict_after, submit_latency=args.submit_latency, seed=args.seed)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    print(summary(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
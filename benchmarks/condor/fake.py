@@ -0,0 +1,974 @@
+"""A local stand-in for an HTCondor schedd
+
+``condor_submit``, ``condor_q``, ``condor_rm`` and ``condor_release`` shims
+backed by a state directory, running each job as a local process: the
+submit file is parsed (``+Attr``/``MY.Attr`` attributes, ``$(ClusterId)``,
+``$(ProcId)``, ``$F()`` and ``$ENV()`` macros, ``queue N``) and one starter
+process per job plays the job through its states:
+
+- idle for ``queue_delay`` (+ up to ``queue_jitter``) seconds;
+- held with ``hold_reason`` for a fraction ``hold_fraction`` of the starts;
+- running: Dask jobs (``CoffeaCasaWorkerType == "dask"``) start the worker
+  the way the coffea-casa worker image does, from the job ClassAd; other
+  jobs run their ``executable`` and ``arguments``;
+- evicted after ``evict_after`` seconds for a fraction ``evict_fraction``
+  of the starts, then idle again;
+- removed by ``condor_rm``, or completed when the job exits.
+
+Removal and eviction follow HTCondor: ``kill_sig``, then a hard kill after
+``job_max_vacate_time``; Dask jobs with ``CoffeaCasaDrainTimeout`` are
+drained first, as the worker launcher does.
+
+The shims only use the standard library, so that each call is as cheap as
+the interpreter start. Every call and every job transition is appended to
+``commands.jsonl`` and ``history.jsonl`` in the state directory.
+
+    with FakeCondor(queue_delay=2, evict_fraction=0.1) as condor:
+        cluster = CoffeaCasaCluster(force_tcp=True)
+        cluster.scale(10)
+        ...
+        condor.history()
+"""
+import fcntl
+import json
+import math
+import os
+import random
+import re
+import shlex
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+COMMANDS = ("condor_submit", "condor_q", "condor_rm", "condor_release")
+
+# JobStatus values
+IDLE, RUNNING, REMOVED, COMPLETED, HELD = 1, 2, 3, 4, 5
+STATUS_LETTERS = {IDLE: "I", RUNNING: "R", REMOVED: "X", COMPLETED: "C", HELD: "H"}
+
+DEFAULT_CONFIG = {
+    "queue_delay": 0.0,
+    "queue_jitter": 0.0,
+    "hold_fraction": 0.0,
+    "hold_reason": "Error from slot1@fake: Docker job has gone over memory limit",
+    "hold_reason_code": 34,
+    "evict_fraction": 0.0,
+    "evict_after": 30.0,
+    "submit_latency": 0.0,
+    "seed": None,
+    "python": sys.executable,
+}
+
+# Submit commands turned into job attributes
+SUBMIT_ATTRIBUTES = {
+    "executable": "Cmd",
+    "arguments": "Args",
+    "batch_name": "JobBatchName",
+    "kill_sig": "KillSig",
+    "job_max_vacate_time": "JobMaxVacateTime",
+    "request_cpus": "RequestCpus",
+    "requestcpus": "RequestCpus",
+    "request_memory": "RequestMemory",
+    "requestmemory": "RequestMemory",
+    "request_disk": "RequestDisk",
+    "requestdisk": "RequestDisk",
+    "docker_image": "DockerImage",
+    "transfer_input_files": "TransferInput",
+}
+
+
+# ---------------------------------------------------------------------------
+# ClassAd expressions
+# ---------------------------------------------------------------------------
+
+class _Undefined:
+    def __repr__(self):
+        return "undefined"
+
+
+UNDEFINED = _Undefined()
+
+_TOKEN = re.compile(
+    r'\s*(?:(?P<num>\d+\.\d*(?:[eE][-+]?\d+)?|\.\d+|\d+)'
+    r'|(?P<str>"(?:[^"\\]|\\.)*")'
+    r'|(?P<op>=\?=|=!=|==|!=|<=|>=|&&|\|\||[-+*/%<>!()?:,])'
+    r'|(?P<name>[A-Za-z_][A-Za-z0-9_.]*))'
+)
+
+# Binary operators by increasing precedence
+_LEVELS = (("||",), ("&&",), ("==", "!=", "=?=", "=!="), ("<", "<=", ">", ">="),
+           ("+", "-"), ("*", "/", "%"))
+
+
+def _tokenize(text):
+    tokens, pos = [], 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None or match.end() == pos:
+            raise ValueError(f"Cannot parse ClassAd expression {text!r} at {pos}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        token = self.peek()
+        if value is not None and token[1] != value:
+            raise ValueError(f"Expected {value!r}, got {token[1]!r}")
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.ternary()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Unexpected {self.peek()[1]!r}")
+        return node
+
+    def ternary(self):
+        node = self.binary(0)
+        if self.peek()[1] == "?":
+            self.take("?")
+            yes = self.ternary()
+            self.take(":")
+            return ("?", node, yes, self.ternary())
+        return node
+
+    def binary(self, level):
+        if level == len(_LEVELS):
+            return self.unary()
+        node = self.binary(level + 1)
+        while self.peek()[0] == "op" and self.peek()[1] in _LEVELS[level]:
+            op = self.take()[1]
+            node = (op, node, self.binary(level + 1))
+        return node
+
+    def unary(self):
+        if self.peek()[1] in ("!", "-", "+"):
+            return ("u" + self.take()[1], self.unary())
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.take()
+        if kind == "num":
+            return ("lit", float(value) if any(c in value for c in ".eE") else int(value))
+        if kind == "str":
+            return ("lit", json.loads(value))
+        if kind == "op" and value == "(":
+            node = self.ternary()
+            self.take(")")
+            return node
+        if kind == "name":
+            lower = value.lower()
+            if lower in ("true", "false"):
+                return ("lit", lower == "true")
+            if lower in ("undefined", "error"):
+                return ("lit", UNDEFINED)
+            if self.peek()[1] == "(":
+                self.take("(")
+                args = []
+                while self.peek()[1] != ")":
+                    args.append(self.ternary())
+                    if self.peek()[1] == ",":
+                        self.take(",")
+                self.take(")")
+                return ("call", lower, args)
+            return ("attr", re.sub(r"^(my|target)\.", "", value, flags=re.I))
+        raise ValueError(f"Unexpected {value!r}")
+
+
+def _compare(op, a, b):
+    if isinstance(a, str) and isinstance(b, str):
+        a, b = a.lower(), b.lower()
+    elif isinstance(a, str) != isinstance(b, str):
+        return UNDEFINED if op in ("<", "<=", ">", ">=") else op == "!="
+    return {"==": a == b, "!=": a != b, "<": a < b, "<=": a <= b,
+            ">": a > b, ">=": a >= b}[op]
+
+
+_FUNCTIONS = {
+    "floor": lambda x: math.floor(x),
+    "ceiling": lambda x: math.ceil(x),
+    "int": lambda x: int(x),
+    "real": lambda x: float(x),
+    "regexp": lambda pattern, target: re.search(pattern, target) is not None,
+    "strcat": lambda *xs: "".join(str(x) for x in xs),
+    "string": lambda x: str(x),
+}
+
+
+def _eval_call(node, ad, depth):
+    name, args = node[1], [_eval(arg, ad, depth) for arg in node[2]]
+    if name == "isundefined":
+        return args[0] is UNDEFINED
+    if name == "ifthenelse":
+        return args[1] if args[0] is True else args[2]
+    if name not in _FUNCTIONS or any(a is UNDEFINED for a in args):
+        return UNDEFINED
+    return _FUNCTIONS[name](*args)
+
+
+def _eval_conditional(node, ad, depth):
+    test = _eval(node[1], ad, depth)
+    return _eval(node[2] if test is True else node[3], ad, depth)
+
+
+def _eval_unary(node, ad, depth):
+    value = _eval(node[1], ad, depth)
+    if value is UNDEFINED:
+        return UNDEFINED
+    op = node[0]
+    return (not value) if op == "u!" else (-value if op == "u-" else value)
+
+
+def _eval_logical(node, ad, depth):
+    op, a = node[0], _eval(node[1], ad, depth)
+    if (op == "&&" and a is False) or (op == "||" and a is True):
+        return a
+    b = _eval(node[2], ad, depth)
+    if a is UNDEFINED or b is UNDEFINED:
+        return UNDEFINED if (op == "&&") != (b is False) else b
+    return (a and b) if op == "&&" else (a or b)
+
+
+def _eval_identity(node, ad, depth):
+    a, b = _eval(node[1], ad, depth), _eval(node[2], ad, depth)
+    same = type(a) is type(b) and a == b
+    return same if node[0] == "=?=" else not same
+
+
+def _divide(a, b):
+    if b == 0:
+        return UNDEFINED
+    if isinstance(a, int) and isinstance(b, int):
+        return int(a / b)
+    return a / b
+
+
+_ARITHMETIC = {
+    "+": lambda a, b: UNDEFINED if isinstance(a, str) else a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": _divide,
+    "%": lambda a, b: a % b,
+}
+
+
+def _eval_binary(node, ad, depth):
+    op, a, b = node[0], _eval(node[1], ad, depth), _eval(node[2], ad, depth)
+    if a is UNDEFINED or b is UNDEFINED:
+        return UNDEFINED
+    if op in ("==", "!=", "<", "<=", ">", ">="):
+        return _compare(op, a, b)
+    return _ARITHMETIC[op](a, b)
+
+
+_OPERATORS = {
+    "lit": lambda node, ad, depth: node[1],
+    "attr": lambda node, ad, depth: lookup(ad, node[1], depth + 1),
+    "call": _eval_call,
+    "?": _eval_conditional,
+    "u!": _eval_unary,
+    "u-": _eval_unary,
+    "u+": _eval_unary,
+    "&&": _eval_logical,
+    "||": _eval_logical,
+    "=?=": _eval_identity,
+    "=!=": _eval_identity,
+}
+
+
+def _eval(node, ad, depth):
+    return _OPERATORS.get(node[0], _eval_binary)(node, ad, depth)
+
+
+def evaluate(expression, ad=None, depth=0):
+    """Evaluate the ClassAd ``expression`` in the context of the job ``ad``"""
+    return _eval(_Parser(expression).parse(), ad or {}, depth)
+
+
+def lookup(ad, name, depth=0):
+    """Return the value of attribute ``name`` (case-insensitive) of ``ad``"""
+    if depth > 20:
+        return UNDEFINED
+    for key, expression in ad.items():
+        if key.lower() == name.lower():
+            return evaluate(expression, ad, depth)
+    return UNDEFINED
+
+
+def literal(value):
+    """Return the ClassAd expression of the Python ``value``"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return json.dumps(str(value))
+
+
+def matches(ad, constraint):
+    return constraint is None or evaluate(constraint, ad) is True
+
+
+def format_value(value):
+    """Format ``value`` as ``condor_q -af`` does"""
+    if value is UNDEFINED:
+        return "undefined"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+# ---------------------------------------------------------------------------
+# Submit files
+# ---------------------------------------------------------------------------
+
+_MACRO = re.compile(r"\$(?:(?P<fn>F|ENV)[A-Za-z]*)?\((?P<name>[^()]*)\)")
+
+
+def parse_submit(text):
+    """Return ``(entries, count)`` of a submit file
+
+    ``entries`` are the ``(key, value)`` lines before ``queue``, with
+    ``+Attr`` keys written ``MY.Attr``.
+    """
+    entries, count = [], None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if re.match(r"queue\b", line, re.I):
+            rest = line[5:].strip()
+            count = int(rest) if rest else 1
+            break
+        key, sep, value = line.partition("=")
+        if not sep:
+            raise ValueError(f"Cannot parse submit line {line!r}")
+        key = key.strip()
+        if key.startswith("+"):
+            key = "MY." + key[1:]
+        entries.append((key, value.strip()))
+    if count is None:
+        raise ValueError("No queue statement in the submit file")
+    return entries, count
+
+
+def expand(value, macros, environ=os.environ, depth=0):
+    """Expand ``$(name)``, ``$F(name)`` and ``$ENV(name)`` in ``value``"""
+    def replace(match):
+        fn, name = match.group("fn"), match.group("name")
+        if fn == "ENV":
+            return environ.get(name, "")
+        text = macros.get(name.lower(), "")
+        text = expand(text, macros, environ, depth + 1) if depth < 10 else text
+        return text.strip('"') if fn == "F" else text
+    return _MACRO.sub(replace, value)
+
+
+def job_ads(text, cluster, owner="fake", environ=os.environ):
+    """Return the ClassAds of the jobs queued by the submit file ``text``"""
+    entries, count = parse_submit(text)
+    now = time.time()
+    ads = []
+    for proc in range(count):
+        macros = {key.lower(): value for key, value in entries}
+        macros.update({"clusterid": str(cluster), "cluster": str(cluster),
+                       "procid": str(proc), "process": str(proc)})
+        ad = {}
+        for key, value in entries:
+            value = expand(value, macros, environ)
+            if key.lower().startswith("my."):
+                ad[key[3:]] = value or "undefined"
+            elif key.lower() in SUBMIT_ATTRIBUTES:
+                attr = SUBMIT_ATTRIBUTES[key.lower()]
+                if attr in ("RequestCpus", "RequestMemory", "RequestDisk"):
+                    ad[attr] = value
+                else:
+                    ad[attr] = literal(value.strip('"'))
+        ad.update({
+            "ClusterId": literal(cluster), "ProcId": literal(proc),
+            "GlobalJobId": literal(f"fake#{cluster}.{proc}#{int(now)}"),
+            "Owner": literal(owner), "QDate": literal(int(now)),
+            "JobStatus": literal(IDLE), "EnteredCurrentStatus": literal(int(now)),
+            "NumJobStarts": literal(0),
+        })
+        ads.append(ad)
+    return ads
+
+
+# ---------------------------------------------------------------------------
+# State directory
+# ---------------------------------------------------------------------------
+
+class Schedd:
+    """Jobs, configuration and logs of the fake schedd in ``directory``"""
+    def __init__(self, directory=None):
+        self.directory = directory or os.environ["FAKE_CONDOR_DIR"]
+        self.jobs_dir = os.path.join(self.directory, "jobs")
+
+    def config(self):
+        config = dict(DEFAULT_CONFIG)
+        try:
+            with open(os.path.join(self.directory, "config.json")) as f:
+                config.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        return config
+
+    @contextmanager
+    def lock(self):
+        with open(os.path.join(self.directory, "lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _append(self, name, record):
+        with open(os.path.join(self.directory, name), "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def log_event(self, job_id, event, **extra):
+        self._append("history.jsonl", {"time": time.time(), "job": job_id,
+                                       "event": event, **extra})
+
+    def log_command(self, argv, start, returncode):
+        self._append("commands.jsonl", {"command": os.path.basename(argv[0]),
+                                        "argv": argv[1:], "start": start,
+                                        "end": time.time(), "returncode": returncode})
+
+    def next_cluster(self):
+        path = os.path.join(self.directory, "next_cluster")
+        try:
+            with open(path) as f:
+                cluster = int(f.read())
+        except FileNotFoundError:
+            cluster = 1
+        with open(path, "w") as f:
+            f.write(str(cluster + 1))
+        return cluster
+
+    def read(self, job_id):
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def write(self, job_id, ad):
+        tmp = self._path(job_id) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(ad, f)
+        os.replace(tmp, self._path(job_id))
+
+    def delete(self, job_id):
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def jobs(self):
+        """Return ``{job_id: ad}`` of the jobs in the queue"""
+        jobs = {}
+        for name in sorted(os.listdir(self.jobs_dir)):
+            if name.endswith(".json"):
+                ad = self.read(name[:-5])
+                if ad is not None:
+                    jobs[name[:-5]] = ad
+        return jobs
+
+    def set_status(self, job_id, status, **attributes):
+        """Change the JobStatus of ``job_id``; return its ad, None if gone"""
+        with self.lock():
+            ad = self.read(job_id)
+            if ad is None:
+                return None
+            ad["JobStatus"] = literal(status)
+            ad["EnteredCurrentStatus"] = literal(int(time.time()))
+            for key, value in attributes.items():
+                ad[key] = literal(value)
+            self.write(job_id, ad)
+        return ad
+
+    def status(self, job_id):
+        ad = self.read(job_id)
+        return None if ad is None else lookup(ad, "JobStatus")
+
+
+def _select(jobs, ids, constraint):
+    selected = {}
+    for job_id, ad in jobs.items():
+        cluster = job_id.split(".")[0]
+        if ids and job_id not in ids and cluster not in ids:
+            continue
+        if matches(ad, constraint):
+            selected[job_id] = ad
+    return selected
+
+
+# ---------------------------------------------------------------------------
+# Commands
+# ---------------------------------------------------------------------------
+
+def condor_submit(argv, schedd):
+    args, files, terse = list(argv), [], False
+    while args:
+        arg = args.pop(0)
+        if arg in ("-terse",):
+            terse = True
+        elif arg in ("-name", "-pool", "-batch-name", "-append", "-a"):
+            args.pop(0)
+        elif arg.startswith("-"):
+            continue
+        else:
+            files.append(arg)
+    text = "".join(open(f).read() for f in files) if files else sys.stdin.read()
+    config = schedd.config()
+    if config["submit_latency"]:
+        time.sleep(config["submit_latency"])
+
+    with schedd.lock():
+        cluster = schedd.next_cluster()
+        ads = job_ads(text, cluster, owner=os.environ.get("USER", "fake"))
+        for ad in ads:
+            schedd.write(f"{cluster}.{lookup(ad, 'ProcId')}", ad)
+    for ad in ads:
+        job_id = f"{cluster}.{lookup(ad, 'ProcId')}"
+        schedd.log_event(job_id, "submit")
+        _spawn_starter(schedd, job_id, config)
+    if terse:
+        print(f"{cluster}.0 - {cluster}.{len(ads) - 1}")
+    else:
+        print("Submitting job(s)" + "." * len(ads))
+        print(f"{len(ads)} job(s) submitted to cluster {cluster}.")
+    return 0
+
+
+def _spawn_starter(schedd, job_id, config):
+    log = open(os.path.join(schedd.directory, "logs", f"{job_id}.log"), "ab")
+    with log:
+        subprocess.Popen(
+            [config["python"], "-m", "benchmarks.condor.fake", "starter", job_id],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+            start_new_session=True, env=dict(os.environ, FAKE_CONDOR_DIR=schedd.directory),
+        )
+
+
+def _parse_query_args(argv):
+    ids, constraint, attributes, rest = [], None, [], list(argv)
+    options = {"long": False, "json": False, "totals": False, "all": False,
+               "separator": " "}
+    while rest:
+        arg = rest.pop(0)
+        if arg in ("-constraint", "-const"):
+            constraint = rest.pop(0)
+        elif arg in ("-af", "-autoformat") or arg.startswith("-af:"):
+            attributes = [a for a in rest if not a.startswith("-")]
+            rest = [a for a in rest if a.startswith("-")]
+            if "t" in arg.partition(":")[2]:
+                options["separator"] = "\t"
+        elif arg in ("-long", "-l"):
+            options["long"] = True
+        elif arg == "-json":
+            options["json"] = True
+        elif arg == "-totals":
+            options["totals"] = True
+        elif arg in ("-all", "-a"):
+            options["all"] = True
+        elif arg in ("-name", "-pool"):
+            rest.pop(0)
+        elif arg.startswith("-"):
+            continue
+        elif re.fullmatch(r"\d+(\.\d+)?", arg):
+            ids.append(arg)
+        else:
+            # An owner
+            constraint = f'Owner == "{arg}"' + (f" && ({constraint})" if constraint else "")
+    return ids, constraint, attributes, options
+
+
+def condor_q(argv, schedd):
+    ids, constraint, attributes, options = _parse_query_args(argv)
+    jobs = _select(schedd.jobs(), ids, constraint)
+    if attributes:
+        for ad in jobs.values():
+            print(options["separator"].join(format_value(lookup(ad, a)) for a in attributes))
+    elif options["json"]:
+        print(json.dumps([{k: format_value(evaluate(v, ad)) for k, v in ad.items()}
+                          for ad in jobs.values()], indent=1))
+    elif options["long"]:
+        for ad in jobs.values():
+            print("\n".join(f"{k} = {v}" for k, v in ad.items()) + "\n")
+    else:
+        counts = {}
+        if not options["totals"]:
+            print(f"{'ID':>10} {'OWNER':<10} {'ST':<3} {'BATCH_NAME'}")
+        for job_id, ad in jobs.items():
+            status = lookup(ad, "JobStatus")
+            counts[status] = counts.get(status, 0) + 1
+            if not options["totals"]:
+                print(f"{job_id:>10} {format_value(lookup(ad, 'Owner')):<10} "
+                      f"{STATUS_LETTERS.get(status, '?'):<3} "
+                      f"{format_value(lookup(ad, 'JobBatchName'))}")
+        print(f"\nTotal for query: {len(jobs)} jobs; {counts.get(COMPLETED, 0)} completed, "
+              f"{counts.get(REMOVED, 0)} removed, {counts.get(IDLE, 0)} idle, "
+              f"{counts.get(RUNNING, 0)} running, {counts.get(HELD, 0)} held, 0 suspended")
+    return 0
+
+
+def condor_rm(argv, schedd):
+    ids, constraint, _, options = _parse_query_args(argv)
+    if not ids and constraint is None and not options["all"]:
+        print("Error: no jobs specified", file=sys.stderr)
+        return 1
+    removed = []
+    with schedd.lock():
+        for job_id, ad in _select(schedd.jobs(), ids, constraint).items():
+            if lookup(ad, "JobStatus") in (REMOVED, COMPLETED):
+                continue
+            ad["JobStatus"] = literal(REMOVED)
+            ad["EnteredCurrentStatus"] = literal(int(time.time()))
+            schedd.write(job_id, ad)
+            removed.append(job_id)
+    for job_id in removed:
+        schedd.log_event(job_id, "remove")
+        print(f"Job {job_id} marked for removal")
+    if not removed:
+        print("Couldn't find/remove all jobs matching the request", file=sys.stderr)
+        return 1
+    return 0
+
+
+def condor_release(argv, schedd):
+    ids, constraint, _, options = _parse_query_args(argv)
+    released = []
+    config = schedd.config()
+    with schedd.lock():
+        for job_id, ad in _select(schedd.jobs(), ids, constraint).items():
+            if lookup(ad, "JobStatus") == HELD:
+                ad["JobStatus"] = literal(IDLE)
+                ad["EnteredCurrentStatus"] = literal(int(time.time()))
+                ad.pop("HoldReason", None)
+                ad.pop("HoldReasonCode", None)
+                schedd.write(job_id, ad)
+                released.append(job_id)
+    for job_id in released:
+        schedd.log_event(job_id, "release")
+        _spawn_starter(schedd, job_id, config)
+        print(f"Job {job_id} released")
+    if not released:
+        print("Couldn't find/release all jobs matching the request", file=sys.stderr)
+        return 1
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Starter: one process per job, playing it through its states
+# ---------------------------------------------------------------------------
+
+def _worker_command(ad, python):
+    """Return the command and environment the coffea-casa worker image runs"""
+    name = format_value(lookup(ad, "DaskWorkerName"))
+    processes = lookup(ad, "DaskWorkerProcesses")
+    processes = 1 if processes is UNDEFINED else int(processes)
+    cores = lookup(ad, "DaskWorkerCores")
+    cores = 1 if cores is UNDEFINED else int(cores)
+    command = [
+        python, "-m", "distributed.cli.dask_worker",
+        format_value(lookup(ad, "DaskSchedulerAddress")),
+        "--name", name,
+        "--nthreads", str(max(1, cores // processes)),
+        "--nanny", "--death-timeout", "60", "--no-dashboard",
+    ]
+    if processes > 1:
+        # Pilot job: workers named as the launcher of the image names them
+        command += ["--nworkers", str(processes)]
+    memory = lookup(ad, "DaskWorkerMemory")
+    if memory is not UNDEFINED:
+        command += ["--memory-limit", str(int(memory) // processes)]
+    resources = lookup(ad, "DaskWorkerResources")
+    if resources is not UNDEFINED:
+        command += ["--resources", format_value(resources)]
+    lifetime = lookup(ad, "DaskWorkerLifetime")
+    if lifetime is not UNDEFINED:
+        stagger = lookup(ad, "DaskWorkerLifetimeStagger")
+        command += ["--lifetime", f"{lifetime}s",
+                    "--lifetime-stagger", f"{0 if stagger is UNDEFINED else stagger}s"]
+    env = {}
+    for attr, key in (("Compression", "COMPRESSION"), ("ZstdLevel", "ZSTD__LEVEL"),
+                      ("Shard", "SHARD"), ("Offload", "OFFLOAD")):
+        value = lookup(ad, f"DaskComm{attr}")
+        if value is not UNDEFINED:
+            env[f"DASK_DISTRIBUTED__COMM__{key}"] = str(value)
+    return command, env
+
+
+def _job_command(ad, python):
+    if format_value(lookup(ad, "CoffeaCasaWorkerType")).lower() == "dask":
+        return _worker_command(ad, python)
+    args = lookup(ad, "Args")
+    args = shlex.split(args) if isinstance(args, str) else []
+    return [format_value(lookup(ad, "Cmd"))] + args, {}
+
+
+class Starter:
+    def __init__(self, schedd, job_id):
+        self.schedd = schedd
+        self.job_id = job_id
+        self.config = schedd.config()
+        seed = self.config["seed"]
+        self.rng = random.Random(None if seed is None else f"{seed}-{job_id}")
+        self.job_dir = os.path.join(schedd.directory, "execute", job_id)
+
+    def _removed(self):
+        return self.schedd.status(self.job_id) in (REMOVED, None)
+
+    def _wait(self, seconds):
+        """Sleep ``seconds``; return False if the job was removed meanwhile"""
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            if self._removed():
+                return False
+            time.sleep(min(0.1, max(deadline - time.monotonic(), 0)))
+        return not self._removed()
+
+    def _finish(self, event, **extra):
+        with self.schedd.lock():
+            self.schedd.delete(self.job_id)
+        self.schedd.log_event(self.job_id, event, **extra)
+
+    def _vacate(self, proc, ad):
+        """Stop the job as HTCondor does: soft kill, then hard kill"""
+        drain = lookup(ad, "CoffeaCasaDrainTimeout")
+        if (proc.poll() is None and drain not in (UNDEFINED, 0)
+                and format_value(lookup(ad, "CoffeaCasaWorkerType")).lower() == "dask"):
+            # What the worker launcher traps the soft-kill signal for
+            name = format_value(lookup(ad, "DaskWorkerName"))
+            processes = lookup(ad, "DaskWorkerProcesses")
+            names = ([name] if processes is UNDEFINED or int(processes) <= 1
+                     else [f"{name}-{i}" for i in range(int(processes))])
+            subprocess.run(
+                [self.config["python"], "-m", "coffea_casa.preemption",
+                 format_value(lookup(ad, "DaskSchedulerAddress")),
+                 *names, "--timeout", str(drain)],
+                timeout=float(drain) + 5, check=False)
+        kill_sig = format_value(lookup(ad, "KillSig"))
+        sig = getattr(signal, kill_sig if kill_sig.startswith("SIG") else "SIGTERM",
+                      signal.SIGTERM)
+        vacate = lookup(ad, "JobMaxVacateTime")
+        vacate = 10 if vacate is UNDEFINED else float(vacate)
+        with _suppress_lookup():
+            os.killpg(proc.pid, sig)
+        try:
+            proc.wait(vacate)
+        except subprocess.TimeoutExpired:
+            with _suppress_lookup():
+                os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+
+    def run(self):
+        while True:
+            delay = self.config["queue_delay"] + self.rng.uniform(0, self.config["queue_jitter"])
+            if not self._wait(delay):
+                return self._finish("removed")
+            if self.rng.random() < self.config["hold_fraction"]:
+                self.schedd.set_status(self.job_id, HELD,
+                                       HoldReason=self.config["hold_reason"],
+                                       HoldReasonCode=self.config["hold_reason_code"])
+                self.schedd.log_event(self.job_id, "hold", reason=self.config["hold_reason"])
+                return
+            ad = self.schedd.read(self.job_id)
+            if ad is None or lookup(ad, "JobStatus") == REMOVED:
+                return self._finish("removed")
+            starts = lookup(ad, "NumJobStarts") + 1
+            ad = self.schedd.set_status(
+                self.job_id, RUNNING, NumJobStarts=starts,
+                JobCurrentStartDate=int(time.time()),
+                RemoteHost=f"slot1@fake-{self.job_id}")
+            self.schedd.log_event(self.job_id, "start", starts=starts)
+            evict_at = None
+            if self.rng.random() < self.config["evict_fraction"]:
+                evict_at = time.monotonic() + self.config["evict_after"]
+
+            command, env = _job_command(ad, self.config["python"])
+            os.makedirs(self.job_dir, exist_ok=True)
+            ad_file = os.path.join(self.job_dir, ".job.ad")
+            with open(ad_file, "w") as f:
+                f.write("\n".join(f"{k} = {v}" for k, v in ad.items()) + "\n")
+            proc = subprocess.Popen(
+                command, cwd=self.job_dir, start_new_session=True,
+                env=dict(os.environ, _CONDOR_JOB_AD=ad_file, _CONDOR_JOB_IWD=self.job_dir,
+                         **env))
+            while proc.poll() is None:
+                if self._removed():
+                    self._vacate(proc, ad)
+                    return self._finish("removed", returncode=proc.returncode)
+                if evict_at is not None and time.monotonic() >= evict_at:
+                    self._vacate(proc, ad)
+                    break
+                time.sleep(0.1)
+            else:
+                return self._finish("complete", returncode=proc.returncode)
+            # Evicted: back to the queue
+            if self.schedd.set_status(self.job_id, IDLE) is None:
+                return self._finish("removed")
+            self.schedd.log_event(self.job_id, "evict")
+
+
+@contextmanager
+def _suppress_lookup():
+    try:
+        yield
+    except ProcessLookupError:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Installation
+# ---------------------------------------------------------------------------
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+
+
+def install(bin_dir, python=sys.executable):
+    """Write the ``condor_*`` shims to ``bin_dir``"""
+    os.makedirs(bin_dir, exist_ok=True)
+    for command in COMMANDS:
+        path = os.path.join(bin_dir, command)
+        with open(path, "w") as f:
+            f.write("#!/bin/sh\n"
+                    f'PYTHONPATH="{REPO}${{PYTHONPATH:+:$PYTHONPATH}}" '
+                    f'exec "{python}" -m benchmarks.condor.fake {command} "$@"\n')
+        os.chmod(path, 0o755)
+    return bin_dir
+
+
+class FakeCondor:
+    """Install the fake HTCondor commands on ``PATH`` for the ``with`` block
+
+    Takes the settings of ``DEFAULT_CONFIG`` as keyword arguments; jobs
+    still in the queue at exit are removed and their processes killed.
+    """
+    def __init__(self, directory=None, **config):
+        unknown = set(config) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise TypeError(f"Unknown fake HTCondor settings: {', '.join(sorted(unknown))}")
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self._tmpdir = None
+        self.directory = directory
+        self.schedd = None
+        self._environ = None
+
+    def __enter__(self):
+        if self.directory is None:
+            self._tmpdir = tempfile.TemporaryDirectory(prefix="fake-condor-")
+            self.directory = self._tmpdir.name
+        for sub in ("jobs", "logs", "execute"):
+            os.makedirs(os.path.join(self.directory, sub), exist_ok=True)
+        self.update(**self.config)
+        bin_dir = install(os.path.join(self.directory, "bin"), self.config["python"])
+        self._environ = {k: os.environ.get(k) for k in ("PATH", "FAKE_CONDOR_DIR")}
+        os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+        os.environ["FAKE_CONDOR_DIR"] = self.directory
+        self.schedd = Schedd(self.directory)
+        return self
+
+    def update(self, **config):
+        """Change the injected behaviour of jobs started from now on"""
+        self.config.update(config)
+        with open(os.path.join(self.directory, "config.json"), "w") as f:
+            json.dump(self.config, f)
+
+    def __exit__(self, *exc):
+        self.remove_all()
+        for key, value in self._environ.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
+
+    def jobs(self):
+        """Return ``{job_id: JobStatus}`` of the jobs in the queue"""
+        return {job_id: lookup(ad, "JobStatus") for job_id, ad in self.schedd.jobs().items()}
+
+    def ads(self):
+        return self.schedd.jobs()
+
+    def history(self):
+        """Return the job transitions, oldest first"""
+        return _read_jsonl(os.path.join(self.directory, "history.jsonl"))
+
+    def commands(self, name=None):
+        """Return the shim invocations (of ``name`` only, if given)"""
+        records = _read_jsonl(os.path.join(self.directory, "commands.jsonl"))
+        return [r for r in records if name is None or r["command"] == name]
+
+    def wait_empty(self, timeout=60):
+        """Wait for the queue to drain; return whether it did"""
+        deadline = time.monotonic() + timeout
+        while self.schedd.jobs():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def remove_all(self, timeout=30):
+        """Remove every job and wait for the starters to stop them"""
+        with self.schedd.lock():
+            for job_id, ad in self.schedd.jobs().items():
+                if lookup(ad, "JobStatus") == HELD:
+                    self.schedd.delete(job_id)
+                else:
+                    ad["JobStatus"] = literal(REMOVED)
+                    self.schedd.write(job_id, ad)
+        self.wait_empty(timeout)
+
+
+def _read_jsonl(path):
+    try:
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command, args = argv[0], argv[1:]
+    schedd = Schedd()
+    if command == "starter":
+        Starter(schedd, args[0]).run()
+        return 0
+    if command not in COMMANDS:
+        print(f"Unknown command {command}, expected one of {', '.join(COMMANDS)}",
+              file=sys.stderr)
+        return 2
+    start = time.time()
+    try:
+        returncode = globals()[command](args, schedd)
+    except (ValueError, OSError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        returncode = 1
+    schedd.log_command([command] + args, start, returncode)
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""Drive CoffeaCasaCluster through scale(), adapt() and close() on a fake schedd"""
+import math
+import os
+import re
+import socket
+import statistics
+import time
+
+import dask
+from distributed import Client
+
+from .fake import FakeCondor
+
+# The image's TLS settings point at secrets only mounted in the pods
+NO_TLS = {
+    "distributed.comm.require-encryption": False,
+    "distributed.comm.tls.ca-file": None,
+    "distributed.comm.tls.scheduler": {"cert": None, "key": None},
+    "distributed.comm.tls.worker": {"cert": None, "key": None},
+    "distributed.comm.tls.client": {"cert": None, "key": None},
+}
+
+# Workers of pilot jobs (processes > 1) get a "-<i>" suffix
+_WORKER_NAME = re.compile(r"htcondor--(\d+\.\d+)--(?:-\d+)?")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_cluster(*, cores=1, memory="1GiB", drain_timeout=None, **kwargs):
+    """Return a ``CoffeaCasaCluster`` whose jobs reach it on the loopback"""
+    from coffea_casa import CoffeaCasaCluster
+
+    os.environ["POD_IP"] = "127.0.0.1"
+    return CoffeaCasaCluster(
+        force_tcp=True, worker_image="fake", scheduler_port=_free_port(),
+        dashboard_port=_free_port(), cores=cores, memory=memory,
+        drain_timeout=drain_timeout, **kwargs)
+
+
+def _workers(client):
+    """Return ``{worker name: job id}`` of the workers connected to the scheduler"""
+    workers = {}
+    for info in client.scheduler_info()["workers"].values():
+        match = _WORKER_NAME.fullmatch(str(info.get("name")))
+        if match:
+            workers[match.group(0)] = match.group(1)
+    return workers
+
+
+def _worker_jobs(client):
+    """Return the job ids of the workers connected to the scheduler"""
+    return set(_workers(client).values())
+
+
+def _wait(predicate, timeout, interval=0.05):
+    """Poll ``predicate`` until it holds; return the seconds waited, or None"""
+    start = time.monotonic()
+    while not predicate():
+        if time.monotonic() - start > timeout:
+            return None
+        time.sleep(interval)
+    return time.monotonic() - start
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def scale_up(condor, n, *, timeout=120, **cluster_kwargs):
+    """Time ``scale(n)`` until each of the ``n`` workers has connected"""
+    with make_cluster(**cluster_kwargs) as cluster, Client(cluster) as client:
+        start = time.monotonic()
+        cluster.scale(n)
+        arrivals = {}
+
+        def all_arrived():
+            now = time.monotonic() - start
+            for worker in _workers(client):
+                arrivals.setdefault(worker, now)
+            return len(arrivals) >= n
+
+        _wait(all_arrived, timeout)
+        latencies = sorted(arrivals.values())
+    return {
+        "workers": n,
+        "connected": len(latencies),
+        "first_worker": latencies[0] if latencies else None,
+        "median_worker": _percentile(latencies, 0.5),
+        "p90_worker": _percentile(latencies, 0.9),
+        "last_worker": latencies[-1] if len(latencies) == n else None,
+        "held": sum(1 for e in condor.history() if e["event"] == "hold"),
+    }
+
+
+def scale_down(condor, n, m, *, timeout=120, **cluster_kwargs):
+    """Scale to ``n`` then ``m`` workers; check the queue matches the workers
+
+    Correct when, once settled, exactly ``m`` jobs are queued, each running
+    a connected worker, and ``close()`` leaves the queue empty.
+    """
+    with make_cluster(**cluster_kwargs) as cluster, Client(cluster) as client:
+        cluster.scale(n)
+        _wait(lambda: len(_workers(client)) >= n, timeout)
+
+        cluster.scale(m)
+        jobs = math.ceil(m / (cluster_kwargs.get("processes") or 1))
+        settled = _wait(lambda: len(_worker_jobs(client)) == jobs
+                        and len(condor.jobs()) == jobs, timeout)
+        queued, connected = set(condor.jobs()), _worker_jobs(client)
+
+        start_close = time.monotonic()
+        cluster.close()
+        emptied = condor.wait_empty(timeout)
+        close_time = time.monotonic() - start_close
+    return {
+        "workers": n,
+        "target": m,
+        "settle_time": settled,
+        "queued": len(queued),
+        "connected": len(connected),
+        "orphan_jobs": sorted(queued - connected),
+        "unknown_workers": sorted(connected - queued),
+        "close_time": close_time,
+        "left_after_close": 0 if emptied else len(condor.jobs()),
+        "correct": settled is not None and queued == connected and emptied,
+    }
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def adapt(condor, maximum, *, tasks=None, task_time=1.0, timeout=300, **cluster_kwargs):
+    """Run ``tasks`` sleeps on an adaptive cluster, then wait for it to shrink"""
+    tasks = maximum * 4 if tasks is None else tasks
+    with make_cluster(**cluster_kwargs) as cluster, Client(cluster) as client:
+        cluster.adapt(minimum=0, maximum=maximum, interval="500ms", wait_count=2)
+        start = time.monotonic()
+        futures = client.map(_sleep, [task_time] * tasks, pure=False)
+        first = None
+        for future in futures:
+            future.result(timeout=timeout)
+            first = first or time.monotonic() - start
+        done = time.monotonic() - start
+        del futures
+        shrunk = _wait(lambda: not condor.jobs(), timeout)
+    return {
+        "maximum": maximum,
+        "tasks": tasks,
+        "task_time": task_time,
+        "first_result": first,
+        "makespan": done,
+        "ideal_makespan": task_time * tasks / maximum,
+        "jobs_submitted": sum(1 for e in condor.history() if e["event"] == "submit"),
+        "shrink_time": shrunk,
+    }
+
+
+def submit_throughput(condor, n, **cluster_kwargs):
+    """Measure ``condor_submit`` calls while ``scale(n)`` queues its jobs
+
+    The jobs never start (``queue_delay`` is raised for the measurement),
+    so that only the submission path is timed.
+    """
+    queue_delay = condor.config["queue_delay"]
+    condor.update(queue_delay=3600)
+    try:
+        with make_cluster(**cluster_kwargs) as cluster:
+            cluster.scale(n)
+            queued = _wait(lambda: len(condor.jobs()) >= n, 600)
+        calls = condor.commands("condor_submit")
+        removals = condor.commands("condor_rm")
+    finally:
+        condor.update(queue_delay=queue_delay)
+    durations = [c["end"] - c["start"] for c in calls]
+    span = (max(c["end"] for c in calls) - min(c["start"] for c in calls)) if calls else 0
+    return {
+        "workers": n,
+        "queue_time": queued,
+        "submit_calls": len(calls),
+        "jobs_per_second": (n / span) if span else None,
+        "mean_submit": statistics.mean(durations) if durations else None,
+        "max_submit": max(durations) if durations else None,
+        "rm_calls": len(removals),
+    }
+
+
+BENCHMARKS = {
+    "scale-up": scale_up,
+    "scale-down": lambda condor, n, **kwargs: scale_down(condor, n, n // 4, **kwargs),
+    "adapt": adapt,
+    "submit": submit_throughput,
+}
+
+
+def run_benchmarks(names, workers, cluster_kwargs=None, **condor_config):
+    """Run the benchmarks ``names``, each against a fresh fake schedd
+
+    ``cluster_kwargs`` are passed to ``CoffeaCasaCluster`` and
+    ``condor_config`` to ``FakeCondor``.
+    """
+    results = {"config": dict(condor_config, workers=workers)}
+    with dask.config.set(NO_TLS):
+        for name in names:
+            with FakeCondor(**condor_config) as condor:
+                result = BENCHMARKS[name](condor, workers, **(cluster_kwargs or {}))
+                result["commands"] = {
+                    command: len(condor.commands(command))
+                    for command in ("condor_submit", "condor_q", "condor_rm")}
+                result["evictions"] = sum(
+                    1 for e in condor.history() if e["event"] == "evict")
+                results[name] = result
+    return results
+
+
+def summary(results):
+    """Return a table of the results of ``run_benchmarks``"""
+    def fmt(value):
+        if value is None:
+            return "-"
+        return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+    lines = []
+    for name, result in results.items():
+        if name == "config":
+            continue
+        lines.append(f"{name}:")
+        for key, value in result.items():
+            if isinstance(value, dict):
+                value = ", ".join(f"{k}={v}" for k, v in value.items())
+            elif isinstance(value, list):
+                value = ", ".join(value) or "none"
+            lines.append(f"  {key:<18}{fmt(value)}")
+    return "\n".join(lines)
@@ -0,0 +1,198 @@
+import json
+import os
+import re
+import uuid
+
+from jupyterhub.apihandlers import APIHandler
+from kubernetes import client
+from tornado import web
+from tornado.ioloop import IOLoop
+
+# Burst Dask worker pods of CoffeaCasaCluster(burst_workers=N)
+#
+# Notebooks have no Kubernetes rights of their own: they ask the hub, with
+# their JupyterHub API token, to start, list and delete worker pods. The hub
+# builds the pod spec itself, so that a pod can only mount the secret of the
+# user who asked for it, and caps the number and the size of each user's pods.
+# BURST_WORKERS_MAX=0 (the default) disables burst workers.
+BURST_NAMESPACE = os.environ.get('POD_NAMESPACE', 'default')
+BURST_WORKERS_MAX = int(os.environ.get('BURST_WORKERS_MAX', '0'))
+BURST_WORKER_MAX_CORES = int(os.environ.get('BURST_WORKER_MAX_CORES', '4'))
+BURST_WORKER_MAX_MEMORY = int(os.environ.get('BURST_WORKER_MAX_MEMORY', str(16 * 2**30)))
+# Comma-separated image repositories the pods may run (any tag)
+BURST_WORKER_IMAGES = [image for image in os.environ.get(
+    'BURST_WORKER_IMAGES', 'hub.opensciencegrid.org/coffea-casa/cc-analysis-ubuntu').split(',') if image]
+
+BURST_PREFIX = 'dask-burst-'
+SECRETS_MOUNT = '/etc/cmsaf-secrets'
+WORKER_PORT = 8788
+FINISHED_PHASES = ('Succeeded', 'Failed')
+
+_BURST_ID = re.compile(r'^dask-burst-[a-z0-9]{1,32}$')
+_SCHEDULER_ADDRESS = re.compile(r'^(tls|tcp)://[A-Za-z0-9.\-\[\]:]+$')
+
+##############################################################################
+def burst_selector(username, burst=None):
+    # escape_username comes from secret_creation_hook.py
+    selector = 'app=coffea-casa-burst-worker,coffea-casa/user=%s' % escape_username(username)[:63]
+    if burst:
+        selector += ',coffea-casa/burst=%s' % burst
+    return selector
+
+def image_allowed(image):
+    repository = image.split('@')[0]
+    if ':' in repository.rsplit('/', 1)[-1]:
+        repository = repository.rsplit(':', 1)[0]
+    return repository in BURST_WORKER_IMAGES
+
+def burst_pod(pod_name, burst, username, scheduler_address, image, cores, memory, env):
+    args = [
+        'python', '-m', 'distributed.cli.dask_worker', scheduler_address,
+        '--name', pod_name,
+        '--nthreads', str(cores),
+        '--memory-limit', str(memory),
+        '--no-dashboard',
+    ]
+    if scheduler_address.startswith('tls://'):
+        args += [
+            '--tls-ca-file', '%s/ca.pem' % SECRETS_MOUNT,
+            '--tls-cert', '%s/hostcert.pem' % SECRETS_MOUNT,
+            '--tls-key', '%s/hostcert.pem' % SECRETS_MOUNT,
+            '--listen-address', 'tls://0.0.0.0:%d' % WORKER_PORT,
+            '--contact-address', 'tls://$(WORKER_IP):%d' % WORKER_PORT,
+        ]
+    resources = {'cpu': str(cores), 'memory': '%dMi' % (memory // 2**20)}
+    return {
+        'apiVersion': 'v1',
+        'kind': 'Pod',
+        'metadata': {
+            'name': pod_name,
+            'labels': {
+                'app': 'coffea-casa-burst-worker',
+                'coffea-casa/burst': burst,
+                'coffea-casa/user': escape_username(username)[:63],
+            },
+            # The label is truncated: ownership is checked on the full name
+            'annotations': {'coffea-casa/user': username},
+        },
+        'spec': {
+            'restartPolicy': 'Never',
+            'automountServiceAccountToken': False,
+            'containers': [{
+                'name': 'dask-worker',
+                'image': image,
+                'args': args,
+                'env': [
+                    # Skip the HTCondor bring-up of the image entrypoint
+                    {'name': 'COFFEA_CASA_SIDECAR', 'value': 'true'},
+                    {'name': 'WORKER_IP',
+                     'valueFrom': {'fieldRef': {'fieldPath': 'status.podIP'}}},
+                ] + [{'name': k, 'value': v} for k, v in env.items()],
+                'resources': {'requests': resources, 'limits': resources},
+                'volumeMounts': [
+                    {'name': 'cmsaf-secrets', 'mountPath': SECRETS_MOUNT, 'readOnly': True},
+                ],
+            }],
+            'volumes': [
+                {'name': 'cmsaf-secrets',
+                 'secret': {'secretName': username_to_secretname(username)}},
+            ],
+        },
+    }
+
+##############################################################################
+class BurstWorkersHandler(APIHandler):
+    """Start, list and delete the burst worker pods of the current user"""
+
+    def _user(self):
+        user = self.current_user
+        if user is None:
+            raise web.HTTPError(403)
+        if BURST_WORKERS_MAX <= 0:
+            raise web.HTTPError(404, 'Burst workers are disabled')
+        return user
+
+    def _burst(self):
+        burst = self.get_query_argument('burst', None)
+        if burst is not None and not _BURST_ID.match(burst):
+            raise web.HTTPError(400, 'Invalid burst id %r' % burst)
+        return burst
+
+    async def _pods(self, username, burst=None):
+        # Pods of the user (deleting the finished ones), oldest first
+        api = client.CoreV1Api()
+        result = await IOLoop.current().run_in_executor(
+            None, lambda: api.list_namespaced_pod(
+                BURST_NAMESPACE, label_selector=burst_selector(username, burst)))
+        pods = []
+        for pod in result.items:
+            if (pod.metadata.annotations or {}).get('coffea-casa/user') != username:
+                continue
+            if pod.status and pod.status.phase in FINISHED_PHASES:
+                await self._delete(pod.metadata.name)
+                continue
+            pods.append(pod.metadata.name)
+        return pods
+
+    async def _delete(self, name):
+        api = client.CoreV1Api()
+        try:
+            await IOLoop.current().run_in_executor(
+                None, lambda: api.delete_namespaced_pod(
+                    name, BURST_NAMESPACE, grace_period_seconds=30))
+        except client.exceptions.ApiException as e:
+            if e.status != 404:
+                raise
+
+    async def get(self):
+        user = self._user()
+        pods = await self._pods(user.name, self._burst())
+        self.finish(json.dumps({'pods': pods}))
+
+    async def post(self):
+        user = self._user()
+        burst = self._burst()
+        body = self.get_json_body() or {}
+        try:
+            count = int(body.get('count', 1))
+            cores = int(body['cores'])
+            memory = int(body['memory'])
+            scheduler_address = str(body['scheduler_address'])
+            image = str(body['image'])
+            env = {str(k): str(v) for k, v in (body.get('env') or {}).items()}
+        except (KeyError, TypeError, ValueError) as e:
+            raise web.HTTPError(400, 'Invalid request: %s' % e)
+        if burst is None or not _SCHEDULER_ADDRESS.match(scheduler_address):
+            raise web.HTTPError(400, 'Invalid burst id or scheduler address')
+        if not 0 < cores <= BURST_WORKER_MAX_CORES or not 0 < memory <= BURST_WORKER_MAX_MEMORY:
+            raise web.HTTPError(400, 'At most %d cores and %d bytes per pod'
+                                % (BURST_WORKER_MAX_CORES, BURST_WORKER_MAX_MEMORY))
+        if not image_allowed(image):
+            raise web.HTTPError(400, 'Image %r is not allowed' % image)
+        # Only Dask configuration can be passed to the workers
+        env = {k: v for k, v in env.items() if k.startswith('DASK_')}
+
+        count = min(count, BURST_WORKERS_MAX - len(await self._pods(user.name)))
+        api = client.CoreV1Api()
+        names = []
+        for _ in range(max(count, 0)):
+            name = '%s%s' % (BURST_PREFIX, uuid.uuid4().hex[:12])
+            manifest = burst_pod(name, burst, user.name, scheduler_address, image,
+                                 cores, memory, env)
+            await IOLoop.current().run_in_executor(
+                None, api.create_namespaced_pod, BURST_NAMESPACE, manifest)
+            names.append(name)
+        self.log.info('Created %d burst worker pod(s) for %s', len(names), user.name)
+        self.finish(json.dumps({'pods': names}))
+
+    async def delete(self):
+        # Delete the named pods, or all the pods of the burst
+        user = self._user()
+        names = set(self.get_query_arguments('name'))
+        for name in await self._pods(user.name, self._burst()):
+            if not names or name in names:
+                await self._delete(name)
+        self.set_status(204)
+        self.finish()
+
+c.JupyterHub.extra_handlers.append((r'api/coffea-casa/burst-workers', BurstWorkersHandler))
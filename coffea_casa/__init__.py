@@ -7,7 +7,21 @@ from .coffea_casa import (
     x509_user_proxy_path,
     security_obj,
 )
-from .plugin import DistributedEnvironmentPlugin
+from .comm_profiles import benchmark_comm_profiles
+from .histsink import HistSink, HistservSinkPlugin
+from .image_warming import warm_image
+from .journal import RunJournal, run_chunks
+from .kube import CoffeaCasaKubeBackend
+from .metadata_cache import MetadataCache
+from .plugin import (
+    CredentialRefreshPlugin,
+    DistributedEnvironmentPlugin,
+    MemoryLeakRestartPlugin,
+    OOMRetryPlugin,
+    TaskMemoryPlugin,
+)
+from .reduction import tree_reduce
+from .taskvine import CoffeaCasaVineCluster
 from .remote_debug import start_remote_debugger
 try:
     from ._version import version as __version__
@@ -17,9 +31,23 @@ except ImportError:  # package not built with hatch-vcs (e.g. raw checkout)
 __all__ = [
     'CoffeaCasaCluster',
     'CoffeaCasaJob',
+    'CoffeaCasaKubeBackend',
+    'CoffeaCasaVineCluster',
+    'HistSink',
+    'MetadataCache',
+    'RunJournal',
     'bearer_token_path',
     'x509_user_proxy_path',
     'security_obj',
+    "CredentialRefreshPlugin",
     "DistributedEnvironmentPlugin",
+    "HistservSinkPlugin",
+    "MemoryLeakRestartPlugin",
+    "OOMRetryPlugin",
+    "TaskMemoryPlugin",
+    "benchmark_comm_profiles",
+    "run_chunks",
     "start_remote_debugger",
+    "tree_reduce",
+    "warm_image",
 ]
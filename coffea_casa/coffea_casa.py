@@ -1,10 +1,55 @@
 """CoffeaCasaCluster class"""
+import asyncio
+from collections import deque
+from contextlib import suppress
+import copy
+from functools import partial
+import logging
+import math
 import os
 from pathlib import Path
 import socket
+import time
+import uuid
 import dask
+from dask.utils import parse_bytes, parse_timedelta
 from dask_jobqueue.htcondor import HTCondorCluster, HTCondorJob
-from distributed.security import Security
+from distributed.core import Status
+from distributed.nanny import Nanny
+from distributed.protocol.pickle import dumps
+from tornado.ioloop import PeriodicCallback
+
+from .comm_profiles import apply_comm_profile, comm_classads, comm_environment
+from .job_health import query_queue, retry_delay, unhealthy_jobs
+from .kube import CoffeaCasaKubeBackend, burst_target, is_burst_worker
+from .lifetime import replacement_due, staggered_lifetime
+from .local_workers import LOCAL_WORKER_PREFIX, is_local_worker, local_worker_budget
+from .memory_sizing import (
+    MIB,
+    TASK_MEMORY_TOPIC,
+    fit_memory,
+    load_history,
+    merge_peaks,
+    save_history,
+    update_history,
+)
+from .oom_retry import OOM_JOB_PREFIX, OOM_RESOURCE, OOM_RETRY_TOPIC, oom_jobs_target
+from .overprovision import MAX_SAMPLES, load_startup_times, save_startup_times, surplus_jobs
+from .plugin import (
+    CredentialRefreshPlugin,
+    MemoryLeakRestartPlugin,
+    OOMRetryPlugin,
+    TaskMemoryPlugin,
+)
+from .pilot import pilot_directives, worker_names
+from .placement import rank_expression
+from .profiling import profile_workers
+from .preemption import PREEMPTION_TOPIC, DEFAULT_DRAIN_TIMEOUT
+from .removal import CLUSTER_ID_ATTRIBUTE, cluster_constraint, remove_jobs
+from .scheduler_process import SchedulerProcess
+from .tls import CoffeaCasaSecurity
+
+logger = logging.getLogger(__name__)
 
 # Port settings
 DEFAULT_SCHEDULER_PORT = 8786
@@ -90,6 +135,21 @@ class CoffeaCasaJob(HTCondorJob):
     submit_command = "condor_submit -spool"
     config_name = "coffea-casa"
 
+    # Job ids already removed by a bulk condor_rm of the cluster
+    removed = set()
+
+    @classmethod
+    def _close_job(cls, job_id, cancel_command):
+        # Also called by the finalizer registered at submission
+        if job_id in cls.removed:
+            return
+        super()._close_job(job_id, cancel_command)
+
+    async def start(self):
+        # Startup times (submission to worker connection) size over-provisioning
+        self.submitted = time.time()
+        await super().start()
+
 
 class CoffeaCasaCluster(HTCondorCluster):
     """
@@ -97,6 +157,9 @@ class CoffeaCasaCluster(HTCondorCluster):
     """
     job_cls = CoffeaCasaJob
     config_name = "coffea-casa"
+    _close_wait = True
+    _worker_processes = 1
+    _memory_sizing = False
 
     def __init__(self,
                  *,
@@ -108,6 +171,25 @@ class CoffeaCasaCluster(HTCondorCluster):
                  dashboard_port=DEFAULT_DASHBOARD_PORT,
                  nanny_port=DEFAULT_NANNY_PORT,
                  check_ports=False,
+                 drain_timeout=None,
+                 lifetime=None,
+                 lifetime_stagger=None,
+                 lifetime_jitter=None,
+                 lifetime_replace_ahead=None,
+                 leak_threshold=None,
+                 local_workers=None,
+                 burst_workers=None,
+                 burst_after=None,
+                 credential_refresh=None,
+                 comm_profile=None,
+                 scheduler_process=None,
+                 rank_weights=None,
+                 rank_site=None,
+                 job_health_interval=None,
+                 job_idle_timeout=None,
+                 memory_sizing=None,
+                 oom_retry_workers=None,
+                 oom_retry_memory=None,
                  **job_kwargs):
         """
         Parameters
@@ -131,12 +213,181 @@ class CoffeaCasaCluster(HTCondorCluster):
             Nanny port
         check_ports : bool, default False
             Check if ports are available before starting
+        drain_timeout : int, optional
+            Seconds a worker gets, after HTCondor's soft-kill signal, to
+            retire gracefully and hand its data over to its peers. A
+            replacement job is requested as soon as a drained worker leaves.
+            Defaults to ``jobqueue.coffea-casa.drain-timeout`` (60); 0 or
+            ``None`` in the config disables the graceful drain.
+        lifetime : str, optional
+            Worker lifetime after which it retires gracefully, e.g. ``"2h"``
+        lifetime_stagger : str, optional
+            Jobs get lifetimes spread over ``[lifetime, lifetime + stagger)``
+            so that workers submitted together do not retire together.
+            Defaults to ``jobqueue.coffea-casa.lifetime-stagger`` (disabled).
+        lifetime_jitter : str, optional
+            Additional random ``+/-`` jitter applied by each worker. Defaults
+            to ``jobqueue.coffea-casa.lifetime-jitter`` (disabled).
+        lifetime_replace_ahead : str, optional
+            Submit a replacement job this long before a worker is expected to
+            retire. Defaults to ``jobqueue.coffea-casa.lifetime-replace-ahead``
+            (disabled).
+        leak_threshold : str, optional
+            Recycle a worker (restart its process, keeping the job) once its
+            unmanaged memory has grown by this much between tasks, e.g.
+            ``"1GiB"``. Disabled by default.
+        local_workers : int or "auto", optional
+            Start this many workers inside the notebook pod right away, sized
+            to the pod's cgroup CPU and memory limits, so that computations
+            can start while HTCondor jobs are pending. One local worker is
+            retired gracefully for each HTCondor worker that connects.
+            Defaults to ``jobqueue.coffea-casa.local-workers`` (0).
+        burst_workers : int, optional
+            Maximum number of worker pods started on the hub's Kubernetes
+            cluster while HTCondor jobs are stuck in the queue (see
+            ``CoffeaCasaKubeBackend``). Defaults to
+            ``jobqueue.coffea-casa.burst-workers`` (0, disabled).
+        burst_after : str, optional
+            Start burst pods for HTCondor jobs idle for longer than this and
+            than the measured pod start-up time. Defaults to
+            ``jobqueue.coffea-casa.burst-after``.
+        credential_refresh : str, optional
+            How often the bearer token and X.509 proxy files are checked;
+            renewed ones are installed on all running workers. Defaults to
+            ``jobqueue.coffea-casa.credential-refresh`` (disabled).
+        comm_profile : str or dict, optional
+            Compression, zstd level, shard size and offload threshold of
+            Dask comms, set on the client, the scheduler and the workers:
+            ``"lan"``, ``"wan"``, ``"wan-zstd"``, ``"wan-slow"`` or a dict of
+            overrides (see ``coffea_casa.comm_profiles``). Defaults to
+            ``jobqueue.coffea-casa.comm-profile``; ``None`` keeps the Dask
+            config.
+        scheduler_process : bool, optional
+            Run the scheduler in a separate process of the pod, with the same
+            ports, contact address and TLS settings, so that work in the
+            notebook kernel does not delay it (see ``SchedulerProcess``).
+            Defaults to ``jobqueue.coffea-casa.scheduler-process`` (False).
+        rank_weights : dict or False, optional
+            Weights of the ``"image"``, ``"site"`` and ``"scratch"`` terms of
+            the job Rank, preferring execute nodes that hold the worker image,
+            are at ``rank_site`` or have fast scratch (see
+            ``coffea_casa.placement``; missing terms take its
+            ``DEFAULT_RANK_WEIGHTS``). Updates
+            ``jobqueue.coffea-casa.rank-weights``, ``None`` by default: no
+            Rank unless weights are given. ``False`` disables the Rank.
+        rank_site : str, optional
+            Site preferred by the Rank, e.g. the one of the XCache. Defaults
+            to ``jobqueue.coffea-casa.rank-site``.
+        job_health_interval : str, optional
+            How often the jobs are checked. Held jobs, jobs that leave the
+            queue before their worker connects and jobs idle for longer than
+            ``job_idle_timeout`` are removed and resubmitted, after an
+            exponential backoff (``jobqueue.coffea-casa.job-retry-backoff``)
+            while failures repeat; the reasons are logged and recorded in
+            ``job_issues``. Defaults to
+            ``jobqueue.coffea-casa.job-health-interval`` (disabled).
+        job_idle_timeout : str, optional
+            Resubmit jobs idle for longer than this. Defaults to
+            ``jobqueue.coffea-casa.job-idle-timeout``.
+        memory_sizing : {"propose", "apply", False}, optional
+            Record the peak memory of each task prefix on the workers and
+            keep it across sessions (see ``coffea_casa.memory_sizing``).
+            ``"propose"`` logs the ``memory`` fitted to past runs, also
+            returned by ``recommend_memory()``; ``"apply"`` requests it for
+            the jobs, unless ``memory`` is given, and raises it on later
+            scale-ups if the tasks of this run need more. Defaults to
+            ``jobqueue.coffea-casa.memory-sizing`` (disabled).
+        oom_retry_workers : int, optional
+            Tasks running on a worker that dies near its memory limit are
+            retried only on workers of larger-memory jobs, of which up to
+            this many are run while such tasks are pending (see
+            ``coffea_casa.oom_retry``); the retries are logged and recorded
+            in ``oom_retries``. Defaults to
+            ``jobqueue.coffea-casa.oom-retry-workers`` (0, disabled).
+        oom_retry_memory : str, optional
+            Memory of the larger-memory jobs. Defaults to
+            ``jobqueue.coffea-casa.oom-retry-memory``, or twice ``memory``.
         **job_kwargs
-            Additional job configuration. ``n_workers`` defaults to 0
+            Additional job configuration. ``processes=M`` makes each job a
+            pilot hosting ``M`` workers, each with ``cores / M`` threads and
+            ``memory / M`` memory (see ``coffea_casa.pilot``). ``n_workers`` defaults to 0
             (no jobs submitted at construction; call ``.scale()``), but an
             explicit value is respected.
         """
         self._force_tcp = force_tcp
+        if drain_timeout is None:
+            drain_timeout = self._config("drain-timeout", DEFAULT_DRAIN_TIMEOUT)
+        self._drain_timeout = drain_timeout
+
+        # Worker lifetimes, in seconds
+        self._lifetime = parse_timedelta(
+            lifetime or self._config("lifetime", "2h"))
+        self._lifetime_stagger = parse_timedelta(
+            lifetime_stagger or self._config("lifetime-stagger", 0)) or 0
+        self._lifetime_jitter = parse_timedelta(
+            lifetime_jitter or self._config("lifetime-jitter", 0)) or 0
+        self._lifetime_replace_ahead = parse_timedelta(
+            lifetime_replace_ahead or self._config("lifetime-replace-ahead", None))
+        self._lifetime_index = 0
+        self._worker_started = {}
+        self._expiring = set()
+
+        # Worker plugins registered on the scheduler at startup, so that every
+        # worker (including those joining later) gets them.
+        self._worker_plugins = {}
+        leak_threshold = leak_threshold or self._config("leak-threshold", None)
+        if leak_threshold:
+            plugin = MemoryLeakRestartPlugin(leak_threshold)
+            self._worker_plugins[plugin.name] = plugin
+
+        # In-pod workers bridging the wait for HTCondor jobs
+        if local_workers is None:
+            local_workers = self._config("local-workers", 0)
+        self._local_workers_requested = local_workers
+        self._local_workers = {}
+
+        # Kubernetes burst tier for a congested HTCondor queue
+        if burst_workers is None:
+            burst_workers = self._config("burst-workers", 0)
+        self._burst_workers = burst_workers
+        self._burst_after = parse_timedelta(
+            burst_after or self._config("burst-after", "2m"))
+        self._burst = None
+        self._job_idle_since = {}
+
+        # Credentials shipped with the jobs, pushed again when renewed
+        self._credential_refresh = parse_timedelta(
+            credential_refresh or self._config("credential-refresh", None))
+        self._credentials = None
+
+        # Held, failed and stuck jobs, resubmitted after a backoff
+        self._job_health_interval = parse_timedelta(
+            job_health_interval or self._config("job-health-interval", None))
+        self._job_idle_timeout = parse_timedelta(
+            job_idle_timeout or self._config("job-idle-timeout", None))
+        self._job_retry_backoff = parse_timedelta(
+            self._config("job-retry-backoff", "30s")) or 0
+        self._job_retry_backoff_max = parse_timedelta(
+            self._config("job-retry-backoff-max", "10m")) or 0
+        self._job_failures = 0
+        self._job_retry = {}
+        self._connected_jobs = set()
+        self.job_issues = deque(maxlen=100)
+
+        # Larger-memory jobs for the tasks that killed their workers
+        self._setup_oom_retry(oom_retry_workers, oom_retry_memory)
+
+        # Over-provisioned scale-up, sized from the startup times of past jobs
+        self._startup_times = deque(load_startup_times(), maxlen=MAX_SAMPLES)
+        self._startup_times_changed = False
+        self._overprovision_target = None
+
+        # Same comm settings in this process (client and scheduler) and jobs
+        if comm_profile is None:
+            comm_profile = self._config("comm-profile", None)
+        self._comm_profile = comm_profile
+        if comm_profile is not None:
+            apply_comm_profile(comm_profile)
 
         # FIX 1: Sanitize dashboard_address boolean from Labextension
         # The Labextension can inject dashboard_address=True (a boolean) into
@@ -196,15 +447,78 @@ class CoffeaCasaCluster(HTCondorCluster):
             scheduler_port=scheduler_port,
             dashboard_port=dashboard_port,
             nanny_port=nanny_port,
+            drain_timeout=drain_timeout,
+            lifetime=self._lifetime,
+            lifetime_jitter=self._lifetime_jitter,
+            comm_profile=comm_profile,
+            rank_weights=rank_weights,
+            rank_site=rank_site,
+        )
+
+        # Tags the jobs, so that all of them are removed with one condor_rm
+        self._cluster_id = uuid.uuid4().hex[:12]
+        job_kwargs["job_extra_directives"] = merge_dicts(
+            job_kwargs["job_extra_directives"],
+            {f"+{CLUSTER_ID_ATTRIBUTE}": f'"{self._cluster_id}"'},
         )
 
         # By default do not submit any HTCondor jobs at construction time;
         # users are expected to call .scale()/.adapt(). An explicit
         # n_workers=N is respected.
         job_kwargs.setdefault('n_workers', 0)
+        self._worker_processes = (job_kwargs.get("processes")
+                                  or self._config("processes", 1) or 1)
+
+        # Memory request fitted to the peak memory of past tasks
+        self._setup_memory_sizing(job_kwargs, memory_sizing)
+
+        self._set_scheduler_process(job_kwargs, scheduler_process)
 
         super().__init__(**job_kwargs)
 
+    def _setup_oom_retry(self, oom_retry_workers=None, oom_retry_memory=None):
+        """Keep up to ``oom_retry_workers`` jobs of ``oom_retry_memory`` for OOM retries"""
+        if oom_retry_workers is None:
+            oom_retry_workers = self._config("oom-retry-workers", 0)
+        self._oom_retry_workers = oom_retry_workers
+        self._oom_retry_memory = oom_retry_memory or self._config("oom-retry-memory", None)
+        self._oom_jobs = {}
+        self._oom_job_index = 0
+        self._oom_events_seen = 0
+        self.oom_retries = deque(maxlen=100)
+
+    def _setup_memory_sizing(self, job_kwargs, memory_sizing=None):
+        """Record task memory with ``memory_sizing``, applying the fit to ``job_kwargs``"""
+        if memory_sizing is None:
+            memory_sizing = self._config("memory-sizing", False)
+        if memory_sizing not in ("propose", "apply", False, None):
+            raise ValueError(
+                f"memory_sizing must be 'propose', 'apply' or False, not {memory_sizing!r}")
+        self._memory_sizing = memory_sizing or False
+        self._memory_fixed = "memory" in job_kwargs
+        self._worker_threads = max(
+            1, (job_kwargs.get("cores") or self._config("cores", 1) or 1) // self._worker_processes)
+        self._memory_history = load_history() if memory_sizing else {}
+        self._task_memory = {}
+        if not memory_sizing:
+            return
+        plugin = TaskMemoryPlugin()
+        self._worker_plugins[plugin.name] = plugin
+        fitted = self._fit_memory(self._memory_history)
+        if fitted and memory_sizing == "apply" and not self._memory_fixed:
+            logger.info("Requesting memory=%r per job, fitted to past tasks", fitted)
+            job_kwargs["memory"] = fitted
+        elif fitted:
+            logger.info("Past tasks fit in memory=%r per job", fitted)
+
+    @classmethod
+    def _set_scheduler_process(cls, job_kwargs, scheduler_process=None):
+        """Run the scheduler out of the kernel when ``scheduler_process``"""
+        if scheduler_process is None:
+            scheduler_process = cls._config("scheduler-process", False)
+        if scheduler_process:
+            job_kwargs.setdefault("scheduler_cls", SchedulerProcess)
+
     @classmethod
     def _modify_job_kwargs(cls,
                            job_kwargs,
@@ -215,7 +529,13 @@ class CoffeaCasaCluster(HTCondorCluster):
                            scheduler_options=None,
                            scheduler_port=DEFAULT_SCHEDULER_PORT,
                            dashboard_port=DEFAULT_DASHBOARD_PORT,
-                           nanny_port=DEFAULT_NANNY_PORT):
+                           nanny_port=DEFAULT_NANNY_PORT,
+                           drain_timeout=None,
+                           lifetime=None,
+                           lifetime_jitter=0,
+                           comm_profile=None,
+                           rank_weights=None,
+                           rank_site=None):
         job_config = job_kwargs.copy()
         input_files = []
 
@@ -281,32 +601,34 @@ class CoffeaCasaCluster(HTCondorCluster):
 
         dash_port = f":{dashboard_port}"
 
-        # Set dashboard link for Labextension
+        # Set dashboard link for Labextension (skipped when there is no
+        # Dask dashboard, e.g. for TaskVine workers)
         # Priority: DASK_DASHBOARD_LINK env > JupyterHub proxy > direct access
-        dashboard_link = os.environ.get("DASK_DASHBOARD_LINK")
-
-        if not dashboard_link:
-            # Check if running in JupyterHub (has JUPYTERHUB_SERVICE_PREFIX)
-            jupyterhub_prefix = os.environ.get("JUPYTERHUB_SERVICE_PREFIX")
-            if jupyterhub_prefix:
-                # JupyterHub proxy pattern: /user/<username>/proxy/<port>/status
-                # JUPYTERHUB_SERVICE_PREFIX typically ends with / (e.g., "/user/name/")
-                # Ensure it ends with / before appending
-                if not jupyterhub_prefix.endswith('/'):
-                    jupyterhub_prefix += '/'
-                dashboard_link = f"{jupyterhub_prefix}proxy/{dashboard_port}/status"
-            else:
-                # Try to construct direct access URL
-                external_hostname = os.environ.get("EXTERNAL_HOSTNAME")
-                if external_hostname:
-                    # Direct access with hostname (no port in URL for https)
-                    dashboard_link = f"https://{external_hostname}/status"
+        if dashboard_port:
+            dashboard_link = os.environ.get("DASK_DASHBOARD_LINK")
+
+            if not dashboard_link:
+                # Check if running in JupyterHub (has JUPYTERHUB_SERVICE_PREFIX)
+                jupyterhub_prefix = os.environ.get("JUPYTERHUB_SERVICE_PREFIX")
+                if jupyterhub_prefix:
+                    # JupyterHub proxy pattern: /user/<username>/proxy/<port>/status
+                    # JUPYTERHUB_SERVICE_PREFIX typically ends with / (e.g., "/user/name/")
+                    # Ensure it ends with / before appending
+                    if not jupyterhub_prefix.endswith('/'):
+                        jupyterhub_prefix += '/'
+                    dashboard_link = f"{jupyterhub_prefix}proxy/{dashboard_port}/status"
                 else:
-                    # Fall back to pod IP (may not be accessible from browser)
-                    dashboard_link = f"http://{external_ip}:{dashboard_port}/status"
+                    # Try to construct direct access URL
+                    external_hostname = os.environ.get("EXTERNAL_HOSTNAME")
+                    if external_hostname:
+                        # Direct access with hostname (no port in URL for https)
+                        dashboard_link = f"https://{external_hostname}/status"
+                    else:
+                        # Fall back to pod IP (may not be accessible from browser)
+                        dashboard_link = f"http://{external_ip}:{dashboard_port}/status"
 
-        dask.config.set({"distributed.dashboard.link": dashboard_link})
-        print(f"Dashboard will be available at: {dashboard_link}")
+            dask.config.set({"distributed.dashboard.link": dashboard_link})
+            print(f"Dashboard will be available at: {dashboard_link}")
 
         # Scheduler settings
         job_config["scheduler_options"] = merge_dicts(
@@ -352,8 +674,687 @@ class CoffeaCasaCluster(HTCondorCluster):
             ),
         )
 
+        job_config["job_extra_directives"] = merge_dicts(
+            cls._feature_directives(drain_timeout=drain_timeout,
+                                    lifetime=lifetime,
+                                    lifetime_jitter=lifetime_jitter,
+                                    comm_profile=comm_profile),
+            job_config["job_extra_directives"],
+        )
+
+        # Pilot jobs: the launcher starts one worker per process, each with
+        # its own forwarded ports
+        processes = job_config.get("processes") or cls._config("processes", 1) or 1
+        if processes > 1:
+            job_config["job_extra_directives"] = merge_dicts(
+                job_config["job_extra_directives"],
+                pilot_directives(processes, DEFAULT_CONTAINER_PORT, DEFAULT_NANNY_PORT),
+            )
+
+        # Prefer nodes that already hold the image, are close to the data or
+        # have fast scratch; an explicit rank directive takes precedence
+        rank = cls._rank(job_config["job_extra_directives"].get("docker_image"),
+                         rank_weights, rank_site)
+        if rank:
+            job_config["job_extra_directives"] = merge_dicts(
+                {"rank": rank},
+                job_config["job_extra_directives"],
+            )
+
         return job_config
 
+    @staticmethod
+    def _feature_directives(*, drain_timeout=None, lifetime=None, lifetime_jitter=0,
+                            comm_profile=None):
+        """Return the ClassAd directives of the drain, lifetime and comm features"""
+        directives = {}
+        # Graceful drain on eviction: the worker launcher traps the soft-kill
+        # signal and retires the worker within CoffeaCasaDrainTimeout seconds;
+        # HTCondor waits a little longer before the hard kill.
+        if drain_timeout:
+            directives.update({
+                "kill_sig": "SIGTERM",
+                "job_max_vacate_time": int(drain_timeout) + 15,
+                "+CoffeaCasaDrainTimeout": int(drain_timeout),
+            })
+        if lifetime:
+            directives.update({
+                "+DaskWorkerLifetime": int(lifetime),
+                "+DaskWorkerLifetimeStagger": int(lifetime_jitter or 0),
+            })
+        if comm_profile is not None:
+            directives.update(comm_classads(comm_profile))
+        return directives
+
+    @classmethod
+    def _rank(cls, image, rank_weights=None, rank_site=None):
+        """Return the job Rank, ``None`` when disabled"""
+        weights = cls._config("rank-weights", None)
+        if rank_weights is False or (weights is None and not rank_weights):
+            return None
+        return rank_expression(
+            image,
+            site=rank_site or cls._config("rank-site", None),
+            weights=merge_dicts(weights or {}, rank_weights or {}),
+        )
+
+    @classmethod
+    def _config(cls, key, default=None):
+        """Return ``jobqueue.coffea-casa.<key>`` from the Dask config"""
+        return dask.config.get(f"jobqueue.{cls.config_name}.{key}", default)
+
+    async def _start(self):
+        if self._lifetime and self._lifetime_replace_ahead:
+            self.periodic_callbacks["coffea-casa-lifetimes"] = PeriodicCallback(
+                self._check_lifetimes, 30000)
+        if self._burst_workers:
+            self.periodic_callbacks["coffea-casa-burst"] = PeriodicCallback(
+                self._check_burst, 10000)
+        if self._credential_refresh:
+            self._credentials = self._read_credentials()
+            self.periodic_callbacks["coffea-casa-credentials"] = PeriodicCallback(
+                self._check_credentials, self._credential_refresh * 1000)
+        if self._job_health_interval:
+            self.periodic_callbacks["coffea-casa-job-health"] = PeriodicCallback(
+                self._check_job_health, self._job_health_interval * 1000)
+        if self._memory_sizing == "apply":
+            self.periodic_callbacks["coffea-casa-task-memory"] = PeriodicCallback(
+                self._collect_task_memory, 30000)
+        if self._oom_retry_workers:
+            self.periodic_callbacks["coffea-casa-oom-retry"] = PeriodicCallback(
+                self._check_oom_retry, 10000)
+        await super()._start()
+        for name, plugin in self._worker_plugins.items():
+            await self.scheduler_comm.register_worker_plugin(
+                plugin=dumps(plugin), name=name, idempotent=False)
+        if self._oom_retry_workers:
+            plugin = OOMRetryPlugin(fraction=self._config("oom-memory-fraction", 0.8))
+            await self.scheduler_comm.register_scheduler_plugin(
+                plugin=dumps(plugin), name=plugin.name, idempotent=False)
+        if self._local_workers_requested:
+            await self._start_local_workers()
+
+    async def _start_local_workers(self):
+        """Start in-pod workers sized to the pod's cgroup limits"""
+        n, threads, memory = local_worker_budget(self._local_workers_requested)
+        nannies = [
+            Nanny(
+                self.scheduler_address,
+                nthreads=threads,
+                memory_limit=memory,
+                name=f"{LOCAL_WORKER_PREFIX}{i}",
+                security=self.security,
+            )
+            for i in range(n)
+        ]
+        await asyncio.gather(*nannies)
+        self._local_workers.update((nanny.name, nanny) for nanny in nannies)
+        logger.info("Started %d local worker(s) while HTCondor jobs are pending", n)
+
+    async def _retire_local_worker(self, name, nanny):
+        logger.info("Remote worker connected, retiring local worker %s", name)
+        with suppress(Exception):
+            await self.scheduler_comm.retire_workers(
+                names=[name], close_workers=True, remove=True)
+        await nanny.close()
+
+    @staticmethod
+    def _read_credentials():
+        """Return the current ``(token, proxy)`` file contents"""
+        def read(path):
+            try:
+                return Path(path).read_bytes() if path else None
+            except OSError:
+                return None
+
+        return read(bearer_token_path()), read(x509_user_proxy_path())
+
+    async def _check_credentials(self):
+        """Install renewed credentials on all workers"""
+        if self.status != Status.running:
+            return
+        credentials = self._read_credentials()
+        if credentials == self._credentials:
+            return
+        token, proxy = credentials
+        plugin = CredentialRefreshPlugin(token=token, proxy=proxy)
+        try:
+            # Replaces the previous version on running and future workers
+            await self.scheduler_comm.register_worker_plugin(
+                plugin=dumps(plugin), name=plugin.name, idempotent=False)
+        except Exception as e:
+            logger.warning("Could not push renewed credentials to workers: %s", e)
+            return
+        self._credentials = credentials
+        logger.info("Pushed renewed credentials to workers")
+
+    async def _check_burst(self):
+        """Start or retire burst pods depending on the idle HTCondor jobs"""
+        if self.status != Status.running:
+            return
+        loop = asyncio.get_running_loop()
+        if self._burst is None:
+            # Same scheduler address and image as the HTCondor workers
+            directives = self.new_spec["options"].get("job_extra_directives") or {}
+            self._burst = CoffeaCasaKubeBackend(
+                self.scheduler_spec["options"].get("contact_address")
+                or self.scheduler_address,
+                image=directives.get("docker_image"),
+                env=comm_environment(self._comm_profile) if self._comm_profile else None,
+            )
+
+        now = time.time()
+        connected = {w["name"] for w in self.scheduler_info["workers"].values()}
+        idle = {
+            name for name, job in self.workers.items()
+            if name in self.worker_spec
+            and connected.isdisjoint(self._job_worker_names(job))
+        }
+        for name in set(self._job_idle_since) - idle:
+            del self._job_idle_since[name]
+        ages = [now - self._job_idle_since.setdefault(name, now) for name in idle]
+
+        target = burst_target(ages, self._burst.start_latency,
+                              congested_after=self._burst_after,
+                              maximum=self._burst_workers)
+        pods = await loop.run_in_executor(None, self._burst.pods)
+        if target > len(pods):
+            await loop.run_in_executor(None, self._burst.create, target - len(pods))
+        elif target < len(pods):
+            # Pods whose worker has not connected yet go first
+            surplus = sorted(pods, key=lambda pod: pod in connected)[:len(pods) - target]
+            with suppress(Exception):
+                await self.scheduler_comm.retire_workers(
+                    names=[pod for pod in surplus if pod in connected],
+                    close_workers=True, remove=True)
+            await loop.run_in_executor(None, self._burst.delete, surplus)
+
+    async def _check_job_health(self):
+        """Remove held, failed and stuck jobs and resubmit them after a backoff"""
+        if self.status != Status.running:
+            return
+        now = time.time()
+        await self._resubmit_due(now)
+
+        jobs = {
+            job.job_id: (name, job) for name, job in self.workers.items()
+            if name in self.worker_spec and name not in self._expiring
+            and name not in self._job_retry and getattr(job, "job_id", None)
+            and job.job_id not in CoffeaCasaJob.removed
+        }
+        if not jobs:
+            return
+        connected = {w["name"] for w in self.scheduler_info["workers"].values()}
+        connected = {job_id for job_id, (_, job) in jobs.items()
+                     if not connected.isdisjoint(self._job_worker_names(job))}
+        try:
+            queue = await asyncio.get_running_loop().run_in_executor(
+                None, query_queue, cluster_constraint(self._cluster_id))
+        except Exception as e:
+            logger.debug("Could not query the HTCondor queue: %s", e)
+            return
+        unhealthy = {
+            job_id: reason for job_id, reason in unhealthy_jobs(
+                jobs, queue, connected, time.time(), idle_timeout=self._job_idle_timeout).items()
+            # Not replaced or scaled down while condor_q ran
+            if self.workers.get(jobs[job_id][0]) is jobs[job_id][1]
+            and job_id not in CoffeaCasaJob.removed
+        }
+        if not unhealthy:
+            return
+
+        # A job whose worker ran until the job ended is no failure
+        failed = {job_id for job_id in unhealthy
+                  if self._connected_jobs.isdisjoint(self._job_worker_names(jobs[job_id][1]))}
+        if failed:
+            self._job_failures += 1
+        delay = retry_delay(self._job_failures if failed else 0,
+                            self._job_retry_backoff, self._job_retry_backoff_max)
+        for job_id, reason in unhealthy.items():
+            name, job = jobs[job_id]
+            logger.log(logging.WARNING if job_id in failed else logging.INFO,
+                       "HTCondor job %s of %s %s, resubmitting it%s", job_id, name, reason,
+                       f" in {delay:.0f}s" if delay else "")
+            self.job_issues.append(
+                {"time": now, "job_id": job_id, "name": name, "reason": reason})
+            # The job stays in self.workers, holding its slot, until resubmitted
+            self._job_retry[name] = now + delay
+            self._connected_jobs.difference_update(self._job_worker_names(job))
+        closing = [jobs[job_id][1] for job_id in unhealthy]
+        await self._remove_jobs(closing)
+        for job in closing:
+            await job.close()
+        await self._resubmit_due(now)
+
+    async def _resubmit_due(self, now):
+        """Submit new jobs for the removed ones whose backoff has expired"""
+        due = [name for name, at in self._job_retry.items() if at <= now]
+        for name in due:
+            del self._job_retry[name]
+            self.workers.pop(name, None)
+        if due and self.status == Status.running:
+            await self._correct_state()
+
+    async def _check_oom_retry(self):
+        """Run larger-memory jobs while tasks that killed their workers are pending"""
+        if self.status != Status.running:
+            return
+        try:
+            events = await self.scheduler_comm.events(topic=OOM_RETRY_TOPIC)
+        except Exception as e:
+            logger.debug("Could not fetch OOM retry events: %s", e)
+            return
+        for timestamp, msg in events:
+            if timestamp > self._oom_events_seen and msg.get("action") == "retry":
+                self.oom_retries.append(dict(msg, time=timestamp))
+        if events:
+            self._oom_events_seen = events[-1][0]
+        pending = events[-1][1]["pending"] if events else 0
+
+        # Jobs whose workers connected and left (e.g. reached their lifetime)
+        connected = {w["name"] for w in self.scheduler_info["workers"].values()}
+        ended = [
+            name for name, job in self._oom_jobs.items()
+            if not self._connected_jobs.isdisjoint(self._job_worker_names(job))
+            and connected.isdisjoint(self._job_worker_names(job))
+        ]
+        closing = [self._oom_jobs.pop(name) for name in ended]
+
+        target = oom_jobs_target(pending, self._oom_retry_workers)
+        if target > len(self._oom_jobs):
+            memory = self._oom_retry_memory
+            if not memory:
+                regular = self.new_spec["options"].get("memory") or self._config("memory")
+                memory = f"{2 * parse_bytes(regular) // MIB}MiB"
+            jobs = [self._new_oom_job(memory) for _ in range(target - len(self._oom_jobs))]
+            logger.info("%d task(s) pending after killing their workers, starting %d job(s) "
+                        "with memory=%r for them", pending, len(jobs), memory)
+            await asyncio.gather(*jobs)
+            self._oom_jobs.update((job.name, job) for job in jobs)
+        elif target < len(self._oom_jobs):
+            # Jobs whose workers have not connected yet go first
+            names = sorted(self._oom_jobs, key=lambda name: not connected.isdisjoint(
+                self._job_worker_names(self._oom_jobs[name])))
+            closing += [self._oom_jobs.pop(name) for name in names[:len(self._oom_jobs) - target]]
+        closing = [job for job in closing if getattr(job, "job_id", None)]
+        if closing:
+            await self._remove_jobs(closing)
+            for job in closing:
+                await job.close()
+
+    def _new_oom_job(self, memory):
+        """Return a job like the others, with ``memory`` and the OOM retry resource"""
+        options = dict(self.new_spec["options"])
+        options["memory"] = memory
+        options["job_extra_directives"] = merge_dicts(
+            options.get("job_extra_directives") or {},
+            {"+DaskWorkerResources": f'"{OOM_RESOURCE}=1"'},
+        )
+        options["name"] = f"{OOM_JOB_PREFIX}{self._oom_job_index}"
+        self._oom_job_index += 1
+        return self.new_spec["cls"](self.scheduler.address, **options)
+
+    def recommend_memory(self):
+        """Return the ``memory`` per job fitted to the tasks of past runs and this one
+
+        ``None`` without recorded peaks or when ``memory_sizing`` is disabled.
+        """
+        return self.sync(self._recommend_memory)
+
+    async def _recommend_memory(self):
+        await self._collect_task_memory()
+        history = update_history(copy.deepcopy(self._memory_history),
+                                 self._task_memory, self._worker_threads)
+        return self._fit_memory(history)
+
+    def _fit_memory(self, history):
+        """Return the ``memory`` per job fitted to ``history``, e.g. ``"1792MiB"``"""
+        fitted = fit_memory(history, self._worker_threads,
+                            processes=self._worker_processes,
+                            headroom=self._config("memory-headroom", 1.25))
+        return None if fitted is None else f"{fitted // MIB}MiB"
+
+    async def _collect_task_memory(self):
+        """Merge the peaks reported by the workers since they started"""
+        if not self._memory_sizing:
+            return
+        try:
+            events = await self.scheduler_comm.events(topic=TASK_MEMORY_TOPIC)
+        except Exception as e:
+            logger.debug("Could not fetch task memory events: %s", e)
+            return
+        # Peaks only grow, so merging an event twice is harmless
+        merge_peaks(self._task_memory, [msg for _, msg in events], self._worker_threads)
+
+    def _refit_memory(self):
+        """Raise the ``memory`` of new jobs if this run's tasks need more"""
+        if self._memory_sizing != "apply" or self._memory_fixed or not self._task_memory:
+            return
+        history = update_history(copy.deepcopy(self._memory_history),
+                                 self._task_memory, self._worker_threads)
+        fitted = self._fit_memory(history)
+        options = self.new_spec["options"]
+        current = options.get("memory") or self._config("memory")
+        if fitted and (not current or parse_bytes(fitted) > parse_bytes(current)):
+            logger.info("Tasks need more memory, requesting memory=%r for new jobs", fitted)
+            options["memory"] = fitted
+
+    async def _close(self):
+        if self._memory_sizing:
+            # Before the workers and their last events are gone
+            await self._collect_task_memory()
+        # One condor_rm for all jobs, while the scheduler retires the workers
+        removal = self._remove_cluster_jobs()
+        local_workers, self._local_workers = self._local_workers, {}
+        await asyncio.gather(
+            *(self._retire_local_worker(name, nanny)
+              for name, nanny in local_workers.items()))
+        if self._burst is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._burst.close)
+        await super()._close()
+        await removal
+        if self._startup_times_changed:
+            with suppress(OSError):
+                save_startup_times(self._startup_times)
+        if self._memory_sizing and self._task_memory:
+            update_history(self._memory_history, self._task_memory, self._worker_threads)
+            with suppress(OSError):
+                save_history(self._memory_history)
+
+    def close(self, timeout=None, wait=True):
+        """Close the cluster, removing all of its jobs with a single condor_rm
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait for the cluster to close
+        wait : bool, default True
+            Wait for ``condor_rm`` to return. With ``wait=False`` it is left
+            running in the background and the kernel does not wait for the
+            schedd at all.
+        """
+        self._close_wait = wait
+        return super().close(timeout=timeout)
+
+    def _remove_cluster_jobs(self):
+        """Start removing every job of the cluster by constraint"""
+        jobs = [job for job in [*self.workers.values(), *self._oom_jobs.values()]
+                if getattr(job, "job_id", None)]
+        if not jobs:
+            return asyncio.sleep(0)
+        CoffeaCasaJob.removed.update(job.job_id for job in jobs)
+        return asyncio.get_running_loop().run_in_executor(None, partial(
+            remove_jobs, constraint=cluster_constraint(self._cluster_id),
+            cancel_command=jobs[0].cancel_command, wait=self._close_wait))
+
+    async def _remove_jobs(self, jobs):
+        """Retire the workers of ``jobs`` and remove the jobs with one condor_rm"""
+        names = [name for job in jobs for name in self._job_worker_names(job)]
+        job_ids = [job.job_id for job in jobs if job.job_id not in CoffeaCasaJob.removed]
+        CoffeaCasaJob.removed.update(job_ids)
+        remove = partial(
+            asyncio.get_running_loop().run_in_executor, None,
+            partial(remove_jobs, job_ids, cancel_command=jobs[0].cancel_command))
+
+        async def retire():
+            if self.scheduler.status == Status.running:
+                with suppress(Exception):
+                    await self.scheduler_comm.retire_workers(names=names)
+
+        if not job_ids:
+            await retire()
+        elif self._drain_timeout:
+            # condor_rm's soft-kill signal makes the workers drain anyway
+            await asyncio.gather(retire(), remove())
+        else:
+            await retire()
+            await remove()
+
+    async def _correct_state_internal(self):
+        # Jobs of the workers scaled down are removed in bulk rather than one
+        # condor_rm each; SpecCluster then only has new jobs to start.
+        to_close = {
+            name: job for name, job in self.workers.items()
+            if name not in self.worker_spec and getattr(job, "job_id", None)
+        }
+        if to_close:
+            await self._remove_jobs(list(to_close.values()))
+            for name, job in to_close.items():
+                await job.close()
+                del self.workers[name]
+                self._job_retry.pop(name, None)
+                self._connected_jobs.difference_update(self._job_worker_names(job))
+        await super()._correct_state_internal()
+
+    def profile(self, duration=30, **kwargs):
+        """Sample all workers for ``duration`` seconds and write one flamegraph
+
+        Takes the keyword arguments of ``coffea_casa.profiling.profile_workers``,
+        e.g. ``native=True`` or ``filename="analysis.svg"``.
+
+        Returns
+        -------
+        ClusterProfile
+        """
+        from distributed import Client
+
+        with Client(self, set_as_default=False) as client:
+            return profile_workers(client, duration, **kwargs)
+
+    def new_worker_spec(self):
+        """Return name and spec for the next job, with a staggered lifetime"""
+        spec = super().new_worker_spec()
+        if not (self._lifetime and self._lifetime_stagger):
+            return spec
+
+        (name, worker), = spec.items()
+        options = dict(worker["options"])
+        options["job_extra_directives"] = merge_dicts(
+            options.get("job_extra_directives") or {},
+            {"+DaskWorkerLifetime": staggered_lifetime(
+                self._lifetime_index, self._lifetime, self._lifetime_stagger)},
+        )
+        self._lifetime_index += 1
+        return {name: dict(worker, options=options)}
+
+    def scale(self, n=None, jobs=0, memory=None, cores=None, overprovision=None):
+        """Scale the cluster to ``n`` workers or ``jobs`` jobs
+
+        Parameters
+        ----------
+        n : int, optional
+            Target number of workers
+        jobs : int, optional
+            Target number of jobs
+        memory, cores : str or int, optional
+            Target memory or cores, as for ``SpecCluster.scale``
+        overprovision : bool or int, optional
+            On scale-up, submit this many jobs on top of the target, or with
+            ``True`` a surplus learned from the startup times of past jobs
+            (see ``coffea_casa.overprovision``), and remove the surplus jobs
+            still pending as soon as the target is connected. Defaults to
+            ``jobqueue.coffea-casa.overprovision`` (False).
+        """
+        # Jobs about to reach their lifetime already have a replacement in
+        # worker_spec; they must not count against the requested target.
+        expiring = len(self._expiring.intersection(self.worker_spec))
+        self._refit_memory()
+        if overprovision is None:
+            overprovision = self._config("overprovision", False)
+        if (n or jobs) and memory is None and cores is None:
+            target = jobs or math.ceil(n / self._worker_processes)
+            if target == self._overprovision_target:
+                # Scale-up still in progress, e.g. adapt() asking again
+                return
+            self._overprovision_target = None
+            new = target - (len(self.worker_spec) - expiring)
+            surplus = self._surplus_jobs(new, overprovision) if new > 0 else 0
+            if surplus:
+                logger.info("Submitting %d job(s) on top of %d, the surplus still pending "
+                            "is removed once %d are connected", surplus, target, target)
+                self._overprovision_target = target
+                return super().scale(jobs=target + surplus + expiring)
+        if n:
+            n += expiring
+        elif jobs:
+            jobs += expiring
+        return super().scale(n, jobs=jobs, memory=memory, cores=cores)
+
+    def _surplus_jobs(self, n, overprovision):
+        """Return the number of jobs to submit on top of ``n`` new ones"""
+        if overprovision is True:
+            return surplus_jobs(
+                n, self._startup_times,
+                confidence=self._config("overprovision-confidence", 0.9),
+                maximum=self._config("overprovision-max", 0.25))
+        return int(overprovision or 0)
+
+    async def _cancel_surplus(self):
+        """Remove the surplus pending jobs once the scale-up target is connected"""
+        target = self._overprovision_target
+        if target is None or self.status != Status.running:
+            return
+        connected = {w["name"] for w in self.scheduler_info["workers"].values()}
+        expiring = len(self._expiring.intersection(self.worker_spec))
+        pending = [
+            name for name in self.worker_spec if name not in self._expiring and (
+                name not in self.workers
+                or connected.isdisjoint(self._job_worker_names(self.workers[name])))
+        ]
+        if len(self.worker_spec) - expiring - len(pending) < target:
+            return
+        self._overprovision_target = None
+        # Latest submissions first
+        surplus = pending[::-1][:len(self.worker_spec) - expiring - target]
+        for name in surplus:
+            del self.worker_spec[name]
+        logger.info("%d worker(s) connected, removing %d surplus pending job(s)",
+                    target, len(surplus))
+        await self._correct_state()
+
+    def _job_lifetime(self, name):
+        directives = self.worker_spec[name]["options"].get("job_extra_directives") or {}
+        return directives.get("+DaskWorkerLifetime", self._lifetime)
+
+    async def _check_lifetimes(self):
+        """Submit replacement jobs ahead of workers reaching their lifetime"""
+        if self.status != Status.running:
+            return
+        now = time.time()
+        replaced = False
+        for name, job in list(self.workers.items()):
+            if name in self._expiring or name not in self.worker_spec:
+                continue
+            started = min((self._worker_started[w] for w in self._job_worker_names(job)
+                           if w in self._worker_started), default=None)
+            if started is None:
+                continue
+            if replacement_due(started, self._job_lifetime(name), now,
+                               jitter=self._lifetime_jitter,
+                               replace_ahead=self._lifetime_replace_ahead):
+                logger.info("Worker %s is about to reach its lifetime, "
+                            "submitting a replacement job", name)
+                self._expiring.add(name)
+                self.worker_spec.update(self.new_worker_spec())
+                replaced = True
+        if replaced:
+            await self._correct_state()
+
+    def _job_worker_name(self, job):
+        """Return the Dask worker name used by a submitted job"""
+        return f"htcondor--{job.job_id}--"
+
+    def _job_worker_names(self, job):
+        """Return the names of the Dask workers hosted by a submitted job"""
+        return worker_names(self._job_worker_name(job), self._worker_processes)
+
+    def _spec_name(self, worker_name):
+        """Map a Dask worker name back to the name of its job in ``self.workers``"""
+        for name, job in self.workers.items():
+            if (getattr(job, "job_id", None)
+                    and worker_name in self._job_worker_names(job)):
+                return name
+        return None
+
+    def _update_worker_status(self, op, msg):
+        if op == "add":
+            for address, worker in msg["workers"].items():
+                if worker["name"] not in self._worker_started:
+                    self._worker_started[worker["name"]] = time.time()
+                    if not (is_local_worker(worker["name"])
+                            or is_burst_worker(worker["name"])):
+                        # An HTCondor job delivered its worker
+                        self._connected_jobs.add(worker["name"])
+                        self._job_failures = 0
+                        self._record_startup(worker["name"])
+                    if self._burst is not None and is_burst_worker(worker["name"]):
+                        self._burst.worker_connected(worker["name"])
+                # Remote capacity connected: hand over from a local worker
+                if (self._local_workers
+                        and not is_local_worker(worker["name"])
+                        and address not in self.scheduler_info["workers"]):
+                    self._futures.add(asyncio.ensure_future(
+                        self._retire_local_worker(*self._local_workers.popitem())))
+        elif op == "remove" and msg in self.scheduler_info["workers"]:
+            worker_name = self.scheduler_info["workers"][msg]["name"]
+            self._worker_started.pop(worker_name, None)
+            self._futures.add(asyncio.ensure_future(self._worker_removed(worker_name)))
+        super()._update_worker_status(op, msg)
+
+    def _record_startup(self, worker_name):
+        """Record the startup time of the job of ``worker_name``"""
+        job = self.workers.get(self._spec_name(worker_name))
+        submitted = getattr(job, "submitted", None)
+        if submitted is not None:
+            # Once per job, at the first of its workers
+            job.submitted = None
+            self._startup_times.append(time.time() - submitted)
+            self._startup_times_changed = True
+        if self._overprovision_target is not None:
+            self._futures.add(asyncio.ensure_future(self._cancel_surplus()))
+
+    async def _worker_removed(self, worker_name):
+        """React to a worker leaving the scheduler"""
+        name = self._spec_name(worker_name)
+        if name is None:
+            return
+        if name in self._expiring:
+            if self._worker_processes > 1:
+                connected = {w["name"] for w in self.scheduler_info["workers"].values()}
+                if not connected.isdisjoint(self._job_worker_names(self.workers[name])):
+                    # Other workers of the pilot job are still retiring
+                    return
+            # Its replacement was submitted ahead of time
+            self._expiring.discard(name)
+            self.worker_spec.pop(name, None)
+            job = self.workers.pop(name, None)
+            if job is not None:
+                await job.close()
+            return
+        if name not in self.worker_spec:
+            return
+        if self._drain_timeout and await self._was_preempted(worker_name):
+            await self._replace_job(name, reason="preempted")
+
+    async def _was_preempted(self, worker_name):
+        """Whether ``worker_name`` announced a preemption drain"""
+        try:
+            events = await self.scheduler_comm.events(topic=PREEMPTION_TOPIC)
+        except Exception as e:
+            logger.debug("Could not fetch preemption events: %s", e)
+            return False
+        return any(msg.get("name") == worker_name for _, msg in events)
+
+    async def _replace_job(self, name, reason):
+        """Remove the job backing ``name`` and immediately submit a new one"""
+        job = self.workers.pop(name, None)
+        if job is None:
+            return
+        logger.info("Replacing %s job %s (%s)", name, job.job_id, reason)
+        await job.close()
+        if self.status == Status.running:
+            await self._correct_state()
+
 
 def security_obj():
     """Return the Dask Security object used by CoffeaCasa"""
@@ -361,7 +1362,7 @@ def security_obj():
     cert_file = str(CERT_FILE)
     key_file = str(KEY_FILE if KEY_FILE.is_file() else CERT_FILE)
 
-    return Security(
+    return CoffeaCasaSecurity(
         tls_ca_file=ca_file,
         tls_worker_cert=cert_file,
         tls_worker_key=key_file,
@@ -370,4 +1371,4 @@ def security_obj():
         tls_scheduler_cert=cert_file,
         tls_scheduler_key=key_file,
         require_encryption=True,
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,277 @@
+"""Comm compression profiles for workers behind slow links
+
+Workers in flocked or remote pools reach the scheduler in the notebook pod
+over links where bandwidth, not CPU, limits transfers. A comm profile sets
+the compression of Dask messages, the zstd level, the shard size of large
+frames and the offload threshold on the client, the scheduler and the
+workers alike::
+
+    cluster = CoffeaCasaCluster(comm_profile="wan")
+
+Dask only compresses a connection when both ends use the same compression,
+which is why a profile must reach every process. The scheduler and the
+client share the notebook process and get it through ``dask.config``; the
+HTCondor jobs get it as ``DaskComm*`` ClassAd attributes, turned into
+``DASK_DISTRIBUTED__COMM__*`` variables by the worker launcher.
+
+``benchmark_comm_profiles`` measures the link to the workers and the
+compression of a representative payload, and picks the profile
+transferring it fastest::
+
+    report = benchmark_comm_profiles(client, sample=output)
+    print(report)
+    cluster = CoffeaCasaCluster(comm_profile=report.best)
+"""
+import logging
+import time
+
+import dask
+from dask.utils import format_bytes, format_time, parse_bytes
+from distributed import wait
+from distributed.utils import ensure_memoryview
+
+logger = logging.getLogger(__name__)
+
+# Profile settings, and the Dask config key each one sets
+COMM_CONFIG_KEYS = {
+    "compression": "distributed.comm.compression",
+    "zstd-level": "distributed.comm.zstd.level",
+    "shard": "distributed.comm.shard",
+    "offload": "distributed.comm.offload",
+}
+
+COMM_PROFILES = {
+    # Dask defaults, for workers next to the notebook
+    "lan": {"compression": False, "zstd-level": 3, "shard": "64MiB", "offload": "10MiB"},
+    # Fast compression, and smaller frames compressed off the event loop
+    "wan": {"compression": "lz4", "zstd-level": 3, "shard": "16MiB", "offload": "1MiB"},
+    "wan-zstd": {"compression": "zstd", "zstd-level": 3, "shard": "16MiB", "offload": "1MiB"},
+    # Links of a few MB/s, where a stronger compression pays off
+    "wan-slow": {"compression": "zstd", "zstd-level": 9, "shard": "8MiB", "offload": "1MiB"},
+}
+
+# ClassAd attribute shipping each setting to the HTCondor jobs
+CLASSAD_ATTRIBUTES = {
+    "compression": "DaskCommCompression",
+    "zstd-level": "DaskCommZstdLevel",
+    "shard": "DaskCommShard",
+    "offload": "DaskCommOffload",
+}
+
+
+def comm_settings(profile):
+    """Return the settings of ``profile``, a profile name or a dict
+
+    A dict overrides the settings of its ``"base"`` profile (``"lan"`` by
+    default), e.g. ``{"base": "wan", "shard": "4MiB"}``.
+    """
+    if isinstance(profile, str):
+        try:
+            return dict(COMM_PROFILES[profile])
+        except KeyError:
+            raise ValueError(
+                f"Unknown comm profile {profile!r}, expected one of "
+                f"{', '.join(COMM_PROFILES)} or a dict"
+            ) from None
+    overrides = dict(profile)
+    settings = comm_settings(overrides.pop("base", "lan"))
+    unknown = set(overrides) - set(COMM_CONFIG_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown comm profile settings: {', '.join(sorted(unknown))}")
+    settings.update(overrides)
+    return settings
+
+
+def comm_config(profile):
+    """Return the Dask config of ``profile``"""
+    return {COMM_CONFIG_KEYS[key]: value for key, value in comm_settings(profile).items()}
+
+
+def apply_comm_profile(profile):
+    """Set ``profile`` for the comms of this process
+
+    Raises
+    ------
+    ValueError
+        If the compression library of the profile is not installed
+    """
+    from distributed.comm.tcp import TCP
+    from distributed.comm import utils
+    from distributed.protocol.compression import get_compression_settings
+
+    settings = comm_settings(profile)
+    dask.config.set(comm_config(settings))
+    get_compression_settings(COMM_CONFIG_KEYS["compression"])
+    # Both are read once, when distributed is imported
+    TCP.max_shard_size = parse_bytes(settings["shard"])
+    utils.OFFLOAD_THRESHOLD = parse_bytes(settings["offload"])
+    return settings
+
+
+def comm_classads(profile):
+    """Return the ClassAd attributes shipping ``profile`` to HTCondor jobs"""
+    classads = {}
+    for key, value in comm_settings(profile).items():
+        if key == "compression":
+            value = value or "False"
+        classads[f"+{CLASSAD_ATTRIBUTES[key]}"] = (
+            value if isinstance(value, int) else f'"{value}"')
+    return classads
+
+
+def comm_environment(profile):
+    """Return the ``DASK_*`` environment variables setting ``profile``"""
+    return {
+        "DASK_" + key.upper().replace(".", "__").replace("-", "_"): str(value)
+        for key, value in comm_config(profile).items()
+    }
+
+
+def _payload(nbytes, seed):
+    # Incompressible, so that no profile compresses it
+    import random
+    return random.Random(seed).randbytes(nbytes)
+
+
+def measure_link(client, nbytes="16MiB", repeat=3):
+    """Return the bandwidth (bytes/s) and round trip (s) from the workers
+
+    Incompressible payloads of ``nbytes`` are created on a worker and
+    gathered by the client, ``repeat`` times; the round trip is measured
+    with payloads of a few bytes.
+    """
+    def fetch(size, seed):
+        future = client.submit(_payload, size, seed, pure=False)
+        wait(future)
+        start = time.perf_counter()
+        future.result()
+        elapsed = time.perf_counter() - start
+        future.release()
+        return elapsed
+
+    nbytes = parse_bytes(nbytes)
+    rtt = min(fetch(8, seed) for seed in range(repeat))
+    elapsed = min(fetch(nbytes, seed) for seed in range(repeat))
+    return nbytes / max(elapsed - rtt, 1e-9), rtt
+
+
+class ProfileTiming:
+    """Estimated transfer of the sample with one profile"""
+    def __init__(self, profile, nbytes, compressed, compress_time, decompress_time,
+                 bandwidth, rtt):
+        self.profile = profile
+        self.name = profile if isinstance(profile, str) else "custom"
+        self.nbytes = nbytes
+        self.compressed = compressed
+        self.compress_time = compress_time
+        self.decompress_time = decompress_time
+        self.transfer_time = compressed / bandwidth
+        self.total_time = rtt + compress_time + self.transfer_time + decompress_time
+
+    @property
+    def ratio(self):
+        return self.compressed / self.nbytes if self.nbytes else 1.0
+
+
+class CommBenchmark:
+    """Comm profiles ranked by the time to transfer a sample over the link"""
+    def __init__(self, bandwidth, rtt, timings, unavailable):
+        self.bandwidth = bandwidth
+        self.rtt = rtt
+        self.timings = sorted(timings, key=lambda t: t.total_time)
+        self.unavailable = unavailable
+
+    @property
+    def best(self):
+        """The fastest profile"""
+        return self.timings[0].profile
+
+    def __repr__(self):
+        lines = [
+            f"Link: {format_bytes(self.bandwidth)}/s, round trip {format_time(self.rtt)}",
+            f"{'profile':<10}{'size':>12}{'ratio':>8}{'compress':>12}"
+            f"{'transfer':>12}{'total':>12}",
+        ]
+        for t in self.timings:
+            lines.append(
+                f"{t.name:<10}{format_bytes(t.compressed):>12}{t.ratio:>8.2f}"
+                f"{format_time(t.compress_time + t.decompress_time):>12}"
+                f"{format_time(t.transfer_time):>12}{format_time(t.total_time):>12}"
+            )
+        for name, reason in self.unavailable.items():
+            lines.append(f"{name:<10}unavailable: {reason}")
+        lines.append(f"Best: {self.best}")
+        return "\n".join(lines)
+
+
+def _compress_frames(frames, settings, repeat):
+    """Return the compressed size and the (de)compression times of ``frames``"""
+    from distributed.protocol.compression import compressions, maybe_compress
+
+    name = settings["compression"] or None
+    shard = parse_bytes(settings["shard"])
+    shards = []
+    for frame in map(ensure_memoryview, frames):
+        shards += [frame[i:i + shard] for i in range(0, max(frame.nbytes, 1), shard)]
+    best_compress = best_decompress = float("inf")
+    with dask.config.set(comm_config(settings)):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            out = [maybe_compress(s, compression=name) for s in shards]
+            best_compress = min(best_compress, time.perf_counter() - start)
+            start = time.perf_counter()
+            for codec, data in out:
+                if codec is not None:
+                    compressions[codec].decompress(data)
+            best_decompress = min(best_decompress, time.perf_counter() - start)
+    return sum(len(data) for _, data in out), best_compress, best_decompress
+
+
+def benchmark_comm_profiles(client=None, sample=None, *, profiles=None, bandwidth=None,
+                            rtt=None, link_bytes="16MiB", repeat=3):
+    """Rank comm profiles by the time to transfer ``sample`` over the link
+
+    The link to the workers is measured with ``measure_link`` unless
+    ``bandwidth`` (bytes/s or a string like ``"20MB"``) and ``rtt`` (s)
+    are given. The sample, e.g. the output of one chunk, is serialized and
+    compressed here with every profile; the transfer time of a profile is
+    estimated as compression, transfer of the compressed bytes and
+    decompression. Profiles whose compression library is not installed are
+    reported as unavailable.
+
+    Returns
+    -------
+    CommBenchmark
+    """
+    from distributed.protocol import serialize_bytelist
+    from distributed.protocol.compression import compressions
+
+    if sample is None:
+        raise ValueError("A sample payload is needed to compare the profiles")
+    if bandwidth is None or rtt is None:
+        if client is None:
+            raise ValueError("Either a client or both bandwidth and rtt are needed")
+        measured_bandwidth, measured_rtt = measure_link(client, link_bytes, repeat)
+        bandwidth = measured_bandwidth if bandwidth is None else bandwidth
+        rtt = measured_rtt if rtt is None else rtt
+    if isinstance(bandwidth, str):
+        bandwidth = parse_bytes(bandwidth)
+
+    # Raw frames: each profile compresses them once, with its own settings
+    frames = serialize_bytelist(sample, compression=False)
+    nbytes = sum(memoryview(f).nbytes for f in frames)
+
+    timings, unavailable = [], {}
+    for profile in profiles or COMM_PROFILES:
+        settings = comm_settings(profile)
+        codec = settings["compression"] or None
+        if codec is not None and codec not in compressions:
+            unavailable[str(profile)] = f"{codec} is not installed"
+            continue
+        compressed, compress_time, decompress_time = _compress_frames(
+            frames, settings, repeat)
+        timings.append(ProfileTiming(profile, nbytes, compressed, compress_time,
+                                     decompress_time, bandwidth, rtt))
+    if not timings:
+        raise RuntimeError("No comm profile can be used here")
+    return CommBenchmark(bandwidth, rtt, timings, unavailable)
@@ -0,0 +1,246 @@
+"""Streaming histogram fills to a histserv instance
+
+Instead of returning histograms from every task and gathering them at the
+end, tasks push their fills to a `histserv <https://github.com/pfackeldey/histserv>`_
+server while they run. The notebook can look at the histograms while they
+fill and never gathers them::
+
+    sink = HistSink("histserv.example.edu:50051")
+    sink.register("mass", hist.Hist.new.Reg(100, 0, 200, name="mass").Weight())
+    sink.attach(client)
+
+    def process(events):
+        fill("mass", mass=events.mass, weight=events.weight)
+
+    client.gather(client.map(process, chunks))
+    sink.flush(client)
+    sink.snapshot("mass").plot()
+
+On the workers, ``HistservSinkPlugin`` buffers the fills and sends them with
+one compressed ``fill_many`` request per histogram every ``batch_size``
+fills, every ``flush_interval`` and when the worker closes.
+
+Pushes are not idempotent across task attempts: a batch mixes the fills of
+whichever tasks ran on the worker, and only a retried histserv request is
+counted once. When a task that already pushed fills fails or loses its
+worker and is run again, those fills are counted twice; compare the
+snapshot with the gathered results where that matters.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from dask.utils import parse_timedelta
+from distributed import get_worker
+from distributed.diagnostics.plugin import WorkerPlugin
+
+logger = logging.getLogger(__name__)
+
+PLUGIN_NAME = "coffea-casa-histserv-sink"
+
+
+def _histserv():
+    try:
+        import histserv
+    except ImportError as e:
+        raise ImportError(
+            "Streaming histograms need histserv: pip install histserv"
+        ) from e
+    return histserv
+
+
+class HistservSinkPlugin(WorkerPlugin):
+    """Buffer histogram fills on a worker and push them to histserv
+
+    Parameters
+    ----------
+    connections : dict
+        ``{name: RemoteHist.get_connection_info()}`` of the histograms
+    batch_size : int, default 100
+        Number of buffered fills of one histogram that triggers a push
+    flush_interval : str, default "5s"
+        Buffered fills are pushed at least this often
+    compression : str or None, default "zstd"
+        histserv payload compression, ``"zstd"``, ``"lz4"`` or ``None``
+
+    Every push has a unique id, so that histserv counts a retried request
+    once; fills pushed by a task that the scheduler then runs again are
+    counted again.
+    """
+    name = PLUGIN_NAME
+
+    def __init__(self, connections, *, batch_size=100, flush_interval="5s",
+                 compression="zstd"):
+        self.connections = dict(connections)
+        self.batch_size = batch_size
+        self.flush_interval = parse_timedelta(flush_interval)
+        self.compression = compression
+
+    def setup(self, worker):
+        RemoteHist = _histserv().RemoteHist
+        self._remote = {
+            name: RemoteHist.from_connection_info(info)
+            for name, info in self.connections.items()
+        }
+        self._buffers = {name: [] for name in self._remote}
+        self._lock = threading.Lock()
+        self._batch = 0
+        self._prefix = f"{worker.name}-{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=PLUGIN_NAME)
+        self._thread.start()
+
+    def teardown(self, worker):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        for remote in self._remote.values():
+            remote.client.__exit__(None, None, None)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Could not push histogram fills to histserv: %s", e)
+
+    def fill(self, name, **kwargs):
+        """Buffer one fill of histogram ``name``"""
+        if name not in self._remote:
+            raise KeyError(f"Histogram {name!r} is not registered with the sink")
+        with self._lock:
+            buffer = self._buffers[name]
+            buffer.append(kwargs)
+            if len(buffer) < self.batch_size:
+                return
+            self._buffers[name] = []
+        self._push_or_keep(name, buffer)
+
+    def flush(self):
+        """Push all buffered fills
+
+        Each histogram is pushed on its own: the fills of one whose push
+        fails stay buffered for the next flush, and the first error is
+        raised once the others were pushed.
+        """
+        errors = []
+        for name in self._remote:
+            with self._lock:
+                buffer, self._buffers[name] = self._buffers[name], []
+            if not buffer:
+                continue
+            try:
+                self._push_or_keep(name, buffer)
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def _push_or_keep(self, name, fills):
+        try:
+            self._push(name, fills)
+        except Exception:
+            # Back in front of the fills buffered since
+            with self._lock:
+                self._buffers[name][:0] = fills
+            raise
+
+    def _push(self, name, fills):
+        with self._lock:
+            self._batch += 1
+            unique_id = f"{self._prefix}-{self._batch}"
+        # The unique id makes a retried request count only once; it is new for
+        # every push, so the fills of a rerun task are added again
+        self._remote[name].fill_many(fills, unique_id=unique_id,
+                                     compression=self.compression)
+
+
+def fill(name, **kwargs):
+    """Fill histogram ``name`` of the sink attached to the current worker
+
+    Takes the same keyword arguments as ``hist.Hist.fill``.
+    """
+    try:
+        plugin = get_worker().plugins[PLUGIN_NAME]
+    except (ValueError, KeyError) as e:
+        raise RuntimeError(
+            "fill() must run in a task on a cluster with an attached HistSink"
+        ) from e
+    plugin.fill(name, **kwargs)
+
+
+def _flush_worker(dask_worker):
+    plugin = dask_worker.plugins.get(PLUGIN_NAME)
+    if plugin is not None:
+        plugin.flush()
+
+
+class HistSink:
+    """Histograms filled on a histserv server by the workers of a cluster
+
+    Parameters
+    ----------
+    address : str
+        histserv address, ``host:port``
+    token : str, optional
+        Token scoping the histograms on the server; a random one by default
+    batch_size, flush_interval, compression
+        See ``HistservSinkPlugin``
+    """
+    def __init__(self, address, *, token=None, batch_size=100, flush_interval="5s",
+                 compression="zstd"):
+        self.client = _histserv().Client(address)
+        self.token = token or uuid.uuid4().hex
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.remote = {}
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.client.address!r}: {sorted(self.remote)}>"
+
+    def register(self, name, template):
+        """Create histogram ``name`` on the server from an empty ``hist.Hist``"""
+        self.remote[name] = self.client.init(template, token=self.token)
+        return self.remote[name]
+
+    def attach(self, client):
+        """Register the worker plugin pushing fills for all registered histograms"""
+        plugin = HistservSinkPlugin(
+            {name: remote.get_connection_info() for name, remote in self.remote.items()},
+            batch_size=self.batch_size,
+            flush_interval=self.flush_interval,
+            compression=self.compression,
+        )
+        return client.register_plugin(plugin)
+
+    def flush(self, client):
+        """Push the fills still buffered on the workers"""
+        client.run(_flush_worker)
+
+    def snapshot(self, name):
+        """Return the current content of histogram ``name`` as a ``hist.Hist``"""
+        return self.remote[name].snapshot(compression=self.compression).to_hist()
+
+    def watch(self, name, interval="5s", timeout=None):
+        """Yield snapshots of histogram ``name`` every ``interval``"""
+        interval = parse_timedelta(interval)
+        deadline = None if timeout is None else time.time() + parse_timedelta(timeout)
+        while deadline is None or time.time() < deadline:
+            yield self.snapshot(name)
+            time.sleep(interval)
+
+    def close(self, delete=True):
+        """Close the connection, deleting the histograms from the server"""
+        if delete:
+            for remote in self.remote.values():
+                remote.delete()
+        self.remote = {}
+        self.client.__exit__(None, None, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,321 @@
+"""Pre-pull the worker image on HTCondor execute nodes
+
+A Docker-universe worker landing on a node that has not run the analysis
+image yet first pulls several GB, the largest single term of a cold
+scale-up. Execute nodes advertise the coffea-casa images they hold, as
+``repo:tag@digest``, in ``CoffeaCasaImageDigests`` (see
+``scripts-extra/condor_startd_cron_image_digests``); ``warm_image`` resolves
+the digest the worker image tag points to, and submits one low-priority job
+per node that does not hold it yet. The job runs the image pinned to that
+digest, so HTCondor pulls it, and exits as soon as the container starts
+(``CoffeaCasaWorkerType = "warm"``).
+
+Run after publishing a new tag, e.g. from cron::
+
+    python -m coffea_casa.image_warming --if-changed
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import dask
+from dask.utils import parse_timedelta, tmpfile
+
+logger = logging.getLogger(__name__)
+
+DIGESTS_ATTRIBUTE = "CoffeaCasaImageDigests"
+
+DEFAULT_REGISTRY = "registry-1.docker.io"
+
+# Manifest types whose digest the Docker daemon records for a pulled image
+MANIFEST_TYPES = (
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.docker.distribution.manifest.v2+json",
+)
+
+STATE_FILE = os.path.join(os.path.expanduser("~"), ".coffea-casa", "warm-image.json")
+
+
+def parse_image(image):
+    """Split an image reference into ``(registry, repository, reference)``
+
+    Examples
+    --------
+    >>> parse_image("hub.opensciencegrid.org/coffea-casa/cc-analysis:2024.1")
+    ('hub.opensciencegrid.org', 'coffea-casa/cc-analysis', '2024.1')
+    >>> parse_image("python")
+    ('registry-1.docker.io', 'library/python', 'latest')
+    """
+    name, reference = image, "latest"
+    if "@" in name:
+        name, reference = name.split("@", 1)
+    elif ":" in name.rsplit("/", 1)[-1]:
+        name, reference = name.rsplit(":", 1)
+    first, _, rest = name.partition("/")
+    if rest and ("." in first or ":" in first or first == "localhost"):
+        registry, repository = first, rest
+    else:
+        registry, repository = DEFAULT_REGISTRY, name
+    if registry == DEFAULT_REGISTRY and "/" not in repository:
+        repository = f"library/{repository}"
+    return registry, repository, reference
+
+
+def image_name(image):
+    """Return ``image`` without its tag or digest"""
+    name = image.split("@", 1)[0]
+    if ":" in name.rsplit("/", 1)[-1]:
+        name = name.rsplit(":", 1)[0]
+    return name
+
+
+def _worker_image(image):
+    image = image or dask.config.get("jobqueue.coffea-casa.worker-image", None)
+    if not image:
+        raise ValueError("No image given and no jobqueue.coffea-casa.worker-image configured")
+    return image
+
+
+def _bearer_token(challenge, timeout):
+    """Return an anonymous token for a ``WWW-Authenticate: Bearer`` challenge"""
+    params = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+    realm = params.pop("realm")
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    with urllib.request.urlopen(f"{realm}?{query}", timeout=timeout) as response:
+        body = json.load(response)
+    return body.get("token") or body.get("access_token")
+
+
+def resolve_digest(image, timeout=10):
+    """Return the digest the tag of ``image`` points to in its registry"""
+    registry, repository, reference = parse_image(image)
+    if reference.startswith("sha256:"):
+        return reference
+    url = f"https://{registry}/v2/{repository}/manifests/{reference}"
+    headers = {"Accept": ", ".join(MANIFEST_TYPES)}
+    for _ in range(2):
+        request = urllib.request.Request(url, headers=headers, method="HEAD")
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.headers["Docker-Content-Digest"]
+        except urllib.error.HTTPError as e:
+            challenge = e.headers.get("WWW-Authenticate", "")
+            if e.code != 401 or not challenge.startswith("Bearer") or "Authorization" in headers:
+                raise
+            headers["Authorization"] = f"Bearer {_bearer_token(challenge, timeout)}"
+    raise RuntimeError(f"Could not resolve the digest of {image}")
+
+
+def _call(cmd):
+    logger.debug("Executing the following command to command line\n%s", " ".join(cmd))
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(
+            "Command exited with non-zero exit code.\n"
+            f"Exit code: {proc.returncode}\n"
+            f"Command:\n{' '.join(cmd)}\n"
+            f"stdout:\n{proc.stdout}\n"
+            f"stderr:\n{proc.stderr}\n"
+        )
+    return proc.stdout
+
+
+def node_images(constraint=None):
+    """Return ``{machine: digests}`` of the execute nodes
+
+    ``digests`` is the set of image digests the node advertises, ``None``
+    for nodes that do not run the startd cron script.
+    """
+    cmd = ["condor_status"]
+    if constraint:
+        cmd += ["-constraint", constraint]
+    out = _call(cmd + ["-af", "Machine", DIGESTS_ATTRIBUTE])
+    nodes = {}
+    for line in out.splitlines():
+        machine, _, digests = line.strip().partition(" ")
+        if not machine:
+            continue
+        if digests in ("", "undefined"):
+            nodes.setdefault(machine, None)
+        else:
+            # Partitionable and dynamic slots of a node advertise the same list
+            found = {d.strip().split("@")[-1] for d in digests.split(",")
+                     if d.strip() not in ("", "none")}
+            nodes[machine] = (nodes.get(machine) or set()) | found
+    return nodes
+
+
+class ImageInventory:
+    """Which execute nodes hold ``digest``
+
+    Attributes
+    ----------
+    warm : list of str
+        Nodes advertising the digest
+    cold : list of str
+        Nodes advertising other digests only
+    unknown : list of str
+        Nodes advertising no digests at all
+    submitted : list of str
+        Nodes ``warm_image`` submitted pull jobs for
+    """
+    def __init__(self, image, digest, nodes):
+        self.image = image
+        self.digest = digest
+        self.warm = sorted(m for m, d in nodes.items() if d is not None and digest in d)
+        self.cold = sorted(m for m, d in nodes.items() if d is not None and digest not in d)
+        self.unknown = sorted(m for m, d in nodes.items() if d is None)
+        self.submitted = []
+
+    def __repr__(self):
+        return (f"<ImageInventory {self.image}@{self.digest}: {len(self.warm)} warm, "
+                f"{len(self.cold)} cold, {len(self.unknown)} unknown>")
+
+
+def image_inventory(image=None, *, digest=None, constraint=None):
+    """Return the ``ImageInventory`` of ``image`` (the configured worker image)"""
+    image = _worker_image(image)
+    digest = digest or resolve_digest(image)
+    return ImageInventory(image, digest, node_images(constraint))
+
+
+def warm_job_script(image, digest, machines, *, priority=-20, expire=3600):
+    """Return the submit file of one pull job per machine in ``machines``"""
+    directives = {
+        "universe": "docker",
+        "docker_image": f"{image_name(image)}@{digest}",
+        "executable": "/bin/true",
+        "transfer_executable": "false",
+        "should_transfer_files": "YES",
+        "+CoffeaCasaWorkerType": '"warm"',
+        "+CoffeaCasaWarmDigest": f'"{digest}"',
+        "+AccountingGroup": dask.config.get(
+            "jobqueue.coffea-casa.job-extra-directives.+AccountingGroup",
+            '"cms.other.coffea.$ENV(HOSTNAME)"'),
+        "priority": priority,
+        "nice_user": "true",
+        "request_cpus": 1,
+        "request_memory": 128,
+        "request_disk": 1024,
+        "requirements": '(Machine == "$(Machine)")',
+        # A node busy for that long will pull with the next worker anyway
+        "periodic_remove": f"(JobStatus == 1) && (time() - QDate > {int(expire)})",
+    }
+    header = "\n".join(f"{k} = {v}" for k, v in directives.items())
+    return f"{header}\nqueue Machine in ({', '.join(machines)})\n"
+
+
+def warm_image(image=None, *, digest=None, constraint=None, include_unknown=True,
+               priority=-20, expire="1h", dry_run=False):
+    """Pre-pull ``image`` on the execute nodes that do not hold it yet
+
+    Parameters
+    ----------
+    image : str, optional
+        Image to warm; defaults to ``jobqueue.coffea-casa.worker-image``
+    digest : str, optional
+        Digest to warm, resolved from the registry if not given
+    constraint : str, optional
+        ClassAd constraint selecting the execute nodes
+    include_unknown : bool, default True
+        Also pull on nodes that do not advertise their images
+    priority : int, default -20
+        Job priority of the pull jobs; they are also nice-user jobs, so that
+        they only run on otherwise idle slots
+    expire : str, default "1h"
+        Pull jobs still idle after this long are removed
+    dry_run : bool, default False
+        Only return the inventory
+
+    Returns
+    -------
+    ImageInventory
+    """
+    inventory = image_inventory(image, digest=digest, constraint=constraint)
+    targets = inventory.cold + (inventory.unknown if include_unknown else [])
+    if targets and not dry_run:
+        with tmpfile(extension="sub") as fn:
+            with open(fn, "w") as f:
+                f.write(warm_job_script(inventory.image, inventory.digest, targets,
+                                        priority=priority, expire=parse_timedelta(expire)))
+            _call(shlex.split("condor_submit -spool") + [fn])
+        inventory.submitted = targets
+        logger.info("Submitted pull jobs of %s@%s on %d node(s)",
+                    inventory.image, inventory.digest, len(targets))
+    return inventory
+
+
+def _load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def warm_if_changed(image=None, *, state_file=STATE_FILE, **kwargs):
+    """Call ``warm_image`` when the tag of ``image`` points to a new digest
+
+    The last warmed digest of each image is recorded in ``state_file``.
+
+    Returns
+    -------
+    ImageInventory or None
+        ``None`` when the digest did not change
+    """
+    image = _worker_image(image)
+    digest = resolve_digest(image)
+    state = _load_state(state_file)
+    if state.get(image, {}).get("digest") == digest:
+        logger.debug("%s still points to %s", image, digest)
+        return None
+    inventory = warm_image(image, digest=digest, **kwargs)
+    if not kwargs.get("dry_run"):
+        state[image] = {"digest": digest, "time": time.time()}
+        os.makedirs(os.path.dirname(os.path.abspath(state_file)), exist_ok=True)
+        with open(state_file, "w") as f:
+            json.dump(state, f, indent=1)
+    return inventory
+
+
+def main(argv=None):
+    """Pre-pull the worker image on the execute nodes missing it"""
+    parser = argparse.ArgumentParser(prog="python -m coffea_casa.image_warming")
+    parser.add_argument("image", nargs="?", default=None,
+                        help="image to warm (default: jobqueue.coffea-casa.worker-image)")
+    parser.add_argument("--constraint", default=None, help="execute nodes to consider")
+    parser.add_argument("--if-changed", action="store_true",
+                        help="only when the tag points to a new digest")
+    parser.add_argument("--state-file", default=STATE_FILE)
+    parser.add_argument("--no-unknown", action="store_true",
+                        help="skip nodes that do not advertise their images")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    kwargs = dict(constraint=args.constraint, include_unknown=not args.no_unknown,
+                  dry_run=args.dry_run)
+    if args.if_changed:
+        inventory = warm_if_changed(args.image, state_file=args.state_file, **kwargs)
+        if inventory is None:
+            print("Digest unchanged, nothing to do")
+            return 0
+    else:
+        inventory = warm_image(args.image, **kwargs)
+    print(inventory)
+    if inventory.submitted:
+        print(f"Pull jobs submitted for: {', '.join(inventory.submitted)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
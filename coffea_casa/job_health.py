@@ -0,0 +1,123 @@
+"""Detection of worker jobs that will never provide a worker
+
+A job that goes on hold (image pull failure, spool transfer error, disk
+overrun), exits before its worker connects, or sits idle for too long
+still counts as requested capacity: the cluster never gets the worker and
+never asks for a replacement. ``CoffeaCasaCluster`` queries the jobs of the
+cluster with one ``condor_q`` per interval, removes those classified here
+and resubmits them after an exponential backoff.
+"""
+import logging
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# HTCondor JobStatus values
+JOB_IDLE = 1
+JOB_RUNNING = 2
+JOB_REMOVED = 3
+JOB_COMPLETED = 4
+JOB_HELD = 5
+
+QUERY_ATTRIBUTES = ("ClusterId", "ProcId", "JobStatus", "EnteredCurrentStatus",
+                    "HoldReasonCode", "HoldReason")
+
+
+def parse_queue(out):
+    """Parse ``condor_q -af:t`` output of ``QUERY_ATTRIBUTES``
+
+    Returns
+    -------
+    dict
+        ``{job_id: {"status", "since", "hold_code", "hold_reason"}}``
+    """
+    jobs = {}
+    for line in out.splitlines():
+        fields = line.split("\t")
+        if len(fields) != len(QUERY_ATTRIBUTES):
+            continue
+        cluster, proc, status, since, code, reason = (f.strip() for f in fields)
+        jobs[f"{cluster}.{proc}"] = {
+            "status": int(status),
+            "since": float(since) if since != "undefined" else None,
+            "hold_code": int(code) if code != "undefined" else None,
+            "hold_reason": reason if reason != "undefined" else None,
+        }
+    return jobs
+
+
+def query_queue(constraint, query_command="condor_q"):
+    """Return the jobs matching ``constraint``, see ``parse_queue``"""
+    cmd = [query_command, "-constraint", constraint, "-af:t", *QUERY_ATTRIBUTES]
+    logger.debug("Executing the following command to command line\n%s", " ".join(cmd))
+    proc = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(
+            "Command exited with non-zero exit code.\n"
+            f"Exit code: {proc.returncode}\n"
+            f"Command:\n{' '.join(cmd)}\n"
+            f"stdout:\n{proc.stdout}\n"
+            f"stderr:\n{proc.stderr}\n"
+        )
+    return parse_queue(proc.stdout)
+
+
+def unhealthy_jobs(job_ids, queue, connected, now, *, idle_timeout=None):
+    """Return ``{job_id: reason}`` of the jobs in ``job_ids`` to resubmit
+
+    Parameters
+    ----------
+    job_ids : iterable of str
+        Jobs of the cluster, as submitted
+    queue : dict
+        The jobs in the queue, see ``parse_queue``
+    connected : set of str
+        Jobs whose worker is connected to the scheduler
+    now : float
+        Current time
+    idle_timeout : float, optional
+        Idle jobs are resubmitted after this many seconds
+
+    Examples
+    --------
+    >>> queue = {"1.0": {"status": JOB_HELD, "since": 0, "hold_code": 34,
+    ...                  "hold_reason": "Docker job has gone over memory limit"},
+    ...          "2.0": {"status": JOB_IDLE, "since": 0, "hold_code": None,
+    ...                  "hold_reason": None}}
+    >>> unhealthy_jobs(["1.0", "2.0", "3.0"], queue, set(), 7200, idle_timeout=3600)
+    {'1.0': 'held: Docker job has gone over memory limit', '2.0': 'idle for 2h', '3.0': 'exited'}
+    """
+    unhealthy = {}
+    for job_id in job_ids:
+        if job_id in connected:
+            continue
+        job = queue.get(job_id)
+        if job is None or job["status"] in (JOB_REMOVED, JOB_COMPLETED):
+            unhealthy[job_id] = "exited"
+        elif job["status"] == JOB_HELD:
+            unhealthy[job_id] = f"held: {job['hold_reason'] or 'unknown reason'}"
+        elif (job["status"] == JOB_IDLE and idle_timeout and job["since"] is not None
+              and now - job["since"] > idle_timeout):
+            unhealthy[job_id] = f"idle for {_duration(now - job['since'])}"
+    return unhealthy
+
+
+def _duration(seconds):
+    if seconds >= 3600:
+        return f"{seconds / 3600:.3g}h"
+    if seconds >= 60:
+        return f"{seconds / 60:.3g}m"
+    return f"{seconds:.0f}s"
+
+
+def retry_delay(failures, base, maximum):
+    """Seconds to wait before resubmitting after ``failures`` consecutive failures
+
+    Examples
+    --------
+    >>> [retry_delay(n, 30, 600) for n in range(7)]
+    [0, 30, 60, 120, 240, 480, 600]
+    """
+    if failures <= 0:
+        return 0
+    return min(base * 2 ** (failures - 1), maximum)
@@ -0,0 +1,224 @@
+"""Per-chunk run journal to resume interrupted runs
+
+A long run loses all its progress when the kernel restarts, the notebook pod
+runs out of memory or most workers are evicted at once. ``RunJournal``
+durably records each completed ``(file, entry_start, entry_stop)`` chunk
+together with its pickled partial accumulator, in a local directory or any
+fsspec store such as ``s3://`` (``s3fs`` is installed in the images)::
+
+    journal = RunJournal("s3://my-bucket/runs/ttbar", storage_options={...})
+    output = run_chunks(client, processor, chunks, journal)
+
+A restarted ``run_chunks`` skips the chunks already in the journal and merges
+their stored partials into the result.
+
+Layout of the store::
+
+    <root>/chunks/<key>.pkl        one completed chunk and its partial result
+    <root>/compacted-<gen>.pkl     merged partials of all compacted chunks
+
+Compaction merges the chunk files into a new generation of the compacted
+snapshot before deleting them, so a crash at any point leaves a readable
+journal: chunk files already covered by the snapshot are ignored.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import posixpath
+import uuid
+
+import fsspec
+from distributed import as_completed
+
+from .reduction import accumulate
+
+logger = logging.getLogger(__name__)
+
+# Default number of newly recorded chunks between compactions
+DEFAULT_COMPACT_EVERY = 200
+
+
+def chunk_key(chunk):
+    """Return the journal key of a ``(file, entry_start, entry_stop)`` chunk"""
+    file, start, stop = chunk
+    return hashlib.sha1(f"{file}\0{start}\0{stop}".encode()).hexdigest()
+
+
+class RunJournal:
+    """Completed chunks and partial accumulators of one run
+
+    Parameters
+    ----------
+    url : str
+        Root of the journal, a local path or an fsspec URL (``s3://...``)
+    storage_options : dict, optional
+        Passed to fsspec, e.g. the S3 endpoint and credentials
+    """
+    def __init__(self, url, storage_options=None):
+        self.url = url
+        self.storage_options = storage_options or {}
+        self.fs, self.root = fsspec.core.url_to_fs(url, **self.storage_options)
+        self.local = "file" in self.fs.protocol
+        self.fs.makedirs(self._path("chunks"), exist_ok=True)
+
+    def __getstate__(self):
+        # Workers reopen the store from the URL
+        return {"url": self.url, "storage_options": self.storage_options}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.url!r}>"
+
+    def _path(self, *parts):
+        return posixpath.join(self.root, *parts)
+
+    def _write(self, path, data):
+        if self.local:
+            # Never leave a partially written file behind
+            tmp = f"{path}.tmp-{uuid.uuid4().hex}"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        else:
+            # Object store uploads are atomic
+            self.fs.pipe_file(path, data)
+
+    def _read(self, path):
+        return pickle.loads(self.fs.cat_file(path))
+
+    def _snapshots(self):
+        """Return ``{generation: path}`` of the compacted snapshots"""
+        snapshots = {}
+        self.fs.invalidate_cache()
+        for path in self.fs.ls(self.root, detail=False):
+            name = posixpath.basename(path)
+            if name.startswith("compacted-") and name.endswith(".pkl"):
+                snapshots[int(name[len("compacted-"):-len(".pkl")])] = path
+        return snapshots
+
+    def _snapshot(self):
+        """Return the generation and content of the latest snapshot"""
+        snapshots = self._snapshots()
+        if not snapshots:
+            return 0, {"keys": set(), "result": None}
+        generation = max(snapshots)
+        return generation, self._read(snapshots[generation])
+
+    def _chunk_files(self):
+        """Return ``{key: path}`` of the recorded chunk files"""
+        self.fs.invalidate_cache()
+        return {
+            posixpath.basename(path)[:-len(".pkl")]: path
+            for path in self.fs.ls(self._path("chunks"), detail=False)
+            if path.endswith(".pkl")
+        }
+
+    def record(self, chunk, result):
+        """Durably record that ``chunk`` completed with partial ``result``"""
+        data = pickle.dumps({"chunk": tuple(chunk), "result": result},
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        self._write(self._path("chunks", f"{chunk_key(chunk)}.pkl"), data)
+
+    def completed(self):
+        """Return the keys of all completed chunks"""
+        _, snapshot = self._snapshot()
+        return snapshot["keys"] | set(self._chunk_files())
+
+    def result(self):
+        """Return the merged partial accumulators of all completed chunks"""
+        _, snapshot = self._snapshot()
+        out = snapshot["result"]
+        for key, path in self._chunk_files().items():
+            if key not in snapshot["keys"]:
+                out = accumulate(out, self._read(path)["result"])
+        return out
+
+    def compact(self):
+        """Merge the chunk files into a new snapshot and delete them
+
+        Returns the number of chunk files compacted.
+        """
+        generation, snapshot = self._snapshot()
+        files = self._chunk_files()
+        new = {key: path for key, path in files.items() if key not in snapshot["keys"]}
+        if not new:
+            return 0
+        out = snapshot["result"]
+        for path in new.values():
+            out = accumulate(out, self._read(path)["result"])
+        data = pickle.dumps({"keys": snapshot["keys"] | set(new), "result": out},
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        self._write(self._path(f"compacted-{generation + 1}.pkl"), data)
+
+        # The new snapshot is durable: drop what it supersedes
+        self.fs.rm(list(files.values()))
+        for old, path in self._snapshots().items():
+            if old <= generation:
+                self.fs.rm(path)
+        logger.info("Compacted %d chunk(s) into generation %d", len(new), generation + 1)
+        return len(new)
+
+
+def _run_and_record(fn, chunk, journal):
+    journal.record(chunk, fn(chunk))
+
+
+def run_chunks(client, fn, chunks, journal, *, compact_every=DEFAULT_COMPACT_EVERY):
+    """Run ``fn`` on the chunks missing from ``journal`` and merge all results
+
+    With an object store the workers record their own results; with a local
+    journal the results are sent back and recorded by the notebook. Failed
+    chunks do not stop the others from being recorded; the first failure is
+    raised at the end, and running again retries only the missing chunks.
+
+    Parameters
+    ----------
+    client : distributed.Client
+    fn : callable
+        Called with one ``(file, entry_start, entry_stop)`` chunk, returns
+        a coffea accumulator
+    chunks : iterable of tuple
+        All chunks of the run
+    journal : RunJournal
+    compact_every : int, default 200
+        Compact the journal after this many newly recorded chunks (0 disables)
+
+    Returns
+    -------
+    The accumulator merged over all chunks
+    """
+    chunks = [tuple(chunk) for chunk in chunks]
+    done = journal.completed()
+    pending = [chunk for chunk in chunks if chunk_key(chunk) not in done]
+    logger.info("%d of %d chunk(s) already in %r", len(chunks) - len(pending),
+                len(chunks), journal)
+
+    if journal.local:
+        futures = {client.submit(fn, chunk, pure=False): chunk for chunk in pending}
+    else:
+        futures = {client.submit(_run_and_record, fn, chunk, journal, pure=False): chunk
+                   for chunk in pending}
+
+    recorded = 0
+    errors = []
+    for future in as_completed(futures):
+        if future.status == "error":
+            # Keep recording the other chunks: the run can be resumed
+            logger.error("Chunk %s failed: %s", futures[future], future.exception())
+            errors.append(future)
+            continue
+        if journal.local:
+            journal.record(futures[future], future.result())
+        future.release()
+        recorded += 1
+        if compact_every and recorded % compact_every == 0:
+            journal.compact()
+
+    if compact_every and recorded:
+        journal.compact()
+    if errors:
+        errors[0].result()
+    return journal.result()
@@ -0,0 +1,173 @@
+"""CoffeaCasaKubeBackend class: burst Dask worker pods on Kubernetes
+
+When the HTCondor pool is congested, jobs can sit idle for many minutes while
+the hub's own Kubernetes cluster has spare capacity. ``CoffeaCasaCluster``
+(``burst_workers=N``) then starts up to ``N`` worker pods from the analysis
+image and retires them again as the HTCondor workers connect.
+
+Notebooks have no Kubernetes rights: the pods are created, listed and deleted
+by the hub (``burst_workers.py`` in the Helm chart) on behalf of the user of
+the notebook's JupyterHub API token. The hub builds the pod spec, mounting the
+TLS material of the user's own ``jupyter-<user>`` secret, and bounds the
+number and size of each user's pods (``BURST_WORKERS_MAX``, 0 by default).
+"""
+import json
+import logging
+import os
+import time
+import urllib.parse
+import urllib.request
+import uuid
+
+import dask
+from dask.utils import parse_bytes, parse_timedelta
+
+logger = logging.getLogger(__name__)
+
+# Name prefix of burst worker pods, also used as their Dask worker name
+BURST_WORKER_PREFIX = "dask-burst-"
+
+# Weight of a new pod start-up measurement in the running average
+LATENCY_SMOOTHING = 0.3
+
+# Hub API route of the burst worker pods, see the chart's burst_workers.py
+_HUB_ROUTE = "/coffea-casa/burst-workers"
+
+
+def is_burst_worker(name):
+    return str(name).startswith(BURST_WORKER_PREFIX)
+
+
+def burst_target(pending_ages, start_latency, *, congested_after=0, maximum=0):
+    """Number of burst pods worth running for the pending HTCondor jobs
+
+    A job that has been idle for ``a`` seconds is expected to wait about as
+    long again, so a pod (ready after ``start_latency`` seconds) only helps
+    once ``a`` exceeds both ``congested_after`` and ``start_latency``.
+
+    Examples
+    --------
+    >>> burst_target([10, 90, 300, 600], 120, congested_after=60, maximum=5)
+    2
+    """
+    threshold = max(congested_after, start_latency)
+    return min(sum(age >= threshold for age in pending_ages), maximum)
+
+
+class CoffeaCasaKubeBackend:
+    """
+    Dask worker pods started next to the notebook pod, through the hub.
+
+    Pods are labelled with this backend's ``name`` so that they can be listed
+    and removed with a single request; the hub deletes pods that finished
+    (their worker exited) as it lists them. The time from pod creation to the
+    worker connecting is measured and kept as a running average in
+    ``start_latency``.
+    """
+    def __init__(self,
+                 scheduler_address,
+                 *,
+                 image=None,
+                 cores=None,
+                 memory=None,
+                 start_latency="60s",
+                 env=None,
+                 hub_api_url=None,
+                 hub_api_token=None):
+        """
+        Parameters
+        ----------
+        scheduler_address : str
+            Address the worker pods connect to
+        image : str, optional
+            Worker image; defaults to ``jobqueue.coffea-casa.worker-image``
+        cores, memory : optional
+            Resources per pod; default to the ``jobqueue.coffea-casa`` config
+        start_latency : str, default "60s"
+            Initial estimate of the pod start-up time, until measured
+        env : dict, optional
+            Extra Dask configuration (``DASK_*`` variables) of the workers
+        hub_api_url, hub_api_token : str, optional
+            JupyterHub API; default to ``$JUPYTERHUB_API_URL`` and
+            ``$JUPYTERHUB_API_TOKEN``
+        """
+        self.image = image or self._config("worker-image")
+        self.cores = cores or self._config("cores", 1)
+        self.memory = parse_bytes(memory or self._config("memory", "4GiB"))
+        self.scheduler_address = scheduler_address
+        self.env = dict(env or {})
+        self.hub_api_url = (hub_api_url or os.environ.get("JUPYTERHUB_API_URL", "")).rstrip("/")
+        self.hub_api_token = hub_api_token or os.environ.get("JUPYTERHUB_API_TOKEN")
+        self.name = f"{BURST_WORKER_PREFIX}{uuid.uuid4().hex[:8]}"
+        self.start_latency = parse_timedelta(start_latency)
+        self._created = {}
+
+    @staticmethod
+    def _config(key, default=None):
+        return dask.config.get(f"jobqueue.coffea-casa.{key}", default)
+
+    def _request(self, method, query=(), body=None):
+        """Send a request to the hub's burst worker API, return its JSON reply"""
+        query = urllib.parse.urlencode([("burst", self.name)] + list(query))
+        request = urllib.request.Request(
+            f"{self.hub_api_url}{_HUB_ROUTE}?{query}",
+            method=method,
+            data=None if body is None else json.dumps(body).encode(),
+            headers={"Authorization": f"token {self.hub_api_token}",
+                     "Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            content = response.read()
+        return json.loads(content) if content else {}
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name!r}: {len(self._created)} pods>"
+
+    def pods(self):
+        """Return the names of this backend's pods that are pending or running"""
+        pods = self._request("GET")["pods"]
+        for name in set(self._created) - set(pods):
+            del self._created[name]
+        return pods
+
+    def create(self, n):
+        """Create ``n`` worker pods and return their names"""
+        names = self._request("POST", body={
+            "count": n,
+            "scheduler_address": self.scheduler_address,
+            "image": self.image,
+            "cores": self.cores,
+            "memory": self.memory,
+            "env": self.env,
+        })["pods"]
+        now = time.time()
+        self._created.update(dict.fromkeys(names, now))
+        logger.info("Created %d burst worker pod(s)", len(names))
+        return names
+
+    def delete(self, names):
+        """Delete the given worker pods"""
+        for name in names:
+            self._created.pop(name, None)
+        try:
+            self._request("DELETE", [("name", name) for name in names])
+        except Exception as e:
+            logger.debug("Could not delete pods %s: %s", names, e)
+
+    def worker_connected(self, name):
+        """Record the start-up latency of the pod whose worker just connected"""
+        created = self._created.get(name)
+        if created is None:
+            return
+        latency = time.time() - created
+        self.start_latency += LATENCY_SMOOTHING * (latency - self.start_latency)
+        logger.info("Burst worker %s connected after %.0fs (average %.0fs)",
+                    name, latency, self.start_latency)
+
+    def close(self):
+        """Delete all of this backend's pods with a single request"""
+        self._created.clear()
+        try:
+            self._request("DELETE")
+        except Exception as e:
+            logger.warning("Could not delete burst worker pods: %s", e)
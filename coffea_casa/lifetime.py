@@ -0,0 +1,43 @@
+"""Staggered worker lifetimes
+
+Workers submitted together used to share the same hardcoded lifetime and
+therefore all retired within the same minute. Each job now gets its own
+lifetime, spread over ``[lifetime, lifetime + stagger)`` with a golden-ratio
+sequence so that any run of consecutively submitted jobs is evenly spread.
+The worker adds a random ``+/- jitter`` on top (``--lifetime-stagger``).
+"""
+from dask.utils import parse_timedelta
+
+# Golden ratio conjugate: consecutive multiples modulo 1 are evenly spread
+_GOLDEN = 0.6180339887498949
+
+
+def staggered_lifetime(index, lifetime, stagger=0):
+    """Return the lifetime, in seconds, of the ``index``-th submitted job
+
+    Parameters
+    ----------
+    index : int
+        Submission index of the job
+    lifetime : str or float
+        Base lifetime, e.g. ``"2h"`` or ``7200``
+    stagger : str or float, default 0
+        Width of the window the lifetimes are spread over
+
+    Examples
+    --------
+    >>> [staggered_lifetime(i, "1h", "10m") for i in range(3)]
+    [3600, 3970, 3741]
+    """
+    lifetime = parse_timedelta(lifetime)
+    stagger = parse_timedelta(stagger) or 0
+    return int(lifetime + stagger * ((index * _GOLDEN) % 1))
+
+
+def replacement_due(started, lifetime, now, *, jitter=0, replace_ahead=0):
+    """Whether a worker started at ``started`` should get a replacement job
+
+    The worker may retire as early as ``lifetime - jitter`` after it started;
+    the replacement is requested ``replace_ahead`` seconds before that.
+    """
+    return now >= started + lifetime - jitter - replace_ahead
@@ -0,0 +1,47 @@
+"""In-pod Dask workers bridging the wait for HTCondor jobs
+
+HTCondor workers only connect once their jobs have matched and their
+containers have started, which takes minutes on a busy pool. Meanwhile the
+notebook pod already has cores: ``CoffeaCasaCluster(local_workers=...)``
+starts a few workers inside the pod right away and retires them, one per
+remote worker, as HTCondor capacity connects.
+"""
+import math
+
+from dask.system import cpu_count
+from distributed.system import memory_limit
+
+# Name prefix of in-pod workers
+LOCAL_WORKER_PREFIX = "local-"
+
+
+def local_worker_budget(n_workers="auto", *, reserve_cores=1, memory_fraction=0.5,
+                        threads_per_worker=1):
+    """Return ``(n_workers, threads_per_worker, memory_limit)`` for in-pod workers
+
+    The CPU count and memory limit honor the pod's cgroup limits. Some cores
+    and memory are left to the notebook kernel and the scheduler.
+
+    Parameters
+    ----------
+    n_workers : int or "auto", default "auto"
+        Number of workers; ``"auto"`` uses all cores but ``reserve_cores``
+    reserve_cores : int, default 1
+        Cores left to the notebook kernel and the scheduler
+    memory_fraction : float, default 0.5
+        Fraction of the pod memory limit shared by the local workers
+    threads_per_worker : int, default 1
+        Threads per local worker
+    """
+    cores = max(cpu_count() - reserve_cores, 0)
+    if n_workers == "auto":
+        n_workers = cores // threads_per_worker
+    n_workers = min(int(n_workers), cores // threads_per_worker)
+    if n_workers <= 0:
+        return 0, threads_per_worker, 0
+    memory = math.floor(memory_limit() * memory_fraction / n_workers)
+    return n_workers, threads_per_worker, memory
+
+
+def is_local_worker(name):
+    return str(name).startswith(LOCAL_WORKER_PREFIX)
@@ -0,0 +1,117 @@
+"""Worker memory requests fitted to the peak memory of past tasks
+
+Jobs request a fixed ``memory`` (4GiB by default): analyses that need more
+are OOM-killed, those that need 800MB leave most of the slot unused.
+``TaskMemoryPlugin`` records, per task prefix, the peak memory of the
+worker process while tasks of that prefix run; ``CoffeaCasaCluster``
+collects the peaks from the scheduler's ``coffea-casa-task-memory`` events
+and, on close, adds them to ``~/.coffea-casa/task-memory.json``, which keeps
+the last ``RUNS_KEPT`` runs for each worker size (threads per worker, as
+peaks grow with concurrent tasks). Prefixes that none of these runs used
+are dropped, so that an analysis that is no longer run stops setting the fit.
+
+``fit_memory`` returns the smallest request holding the largest recorded
+peak of any prefix, plus ``headroom`` so that the worker stays below Dask's
+pause threshold. With ``jobqueue.coffea-casa.memory-sizing: apply`` the fit
+becomes the ``memory`` of the jobs of the next cluster; with ``propose`` it
+is only logged (and returned by ``CoffeaCasaCluster.recommend_memory()``).
+"""
+import json
+import math
+import os
+
+STATE_FILE = os.path.join(os.path.expanduser("~"), ".coffea-casa", "task-memory.json")
+
+# Scheduler event topic of TaskMemoryPlugin
+TASK_MEMORY_TOPIC = "coffea-casa-task-memory"
+
+# Runs of each task prefix kept in the history
+RUNS_KEPT = 5
+
+MIB = 2 ** 20
+
+
+def merge_peaks(peaks, events, nthreads):
+    """Update ``{prefix: peak}`` with the events of workers of ``nthreads`` threads
+
+    Examples
+    --------
+    >>> events = [{"nthreads": 1, "peaks": {"process": 900e6}},
+    ...           {"nthreads": 1, "peaks": {"process": 1.2e9, "sum": 3e8}},
+    ...           {"nthreads": 4, "peaks": {"process": 4e9}}]
+    >>> merge_peaks({}, events, 1)
+    {'process': 1200000000.0, 'sum': 300000000.0}
+    """
+    for msg in events:
+        if msg.get("nthreads") != nthreads:
+            continue
+        for prefix, peak in msg.get("peaks", {}).items():
+            peaks[prefix] = max(peaks.get(prefix, 0), peak)
+    return peaks
+
+
+def update_history(history, peaks, nthreads, runs_kept=RUNS_KEPT):
+    """Append the peaks of one run to ``history`` (modified in place)
+
+    Prefixes absent from the run get a 0 peak; those absent from the last
+    ``runs_kept`` runs are dropped.
+
+    Examples
+    --------
+    >>> history = update_history({}, {"old": 2 * MIB}, 1, runs_kept=2)
+    >>> history = update_history(history, {"new": MIB}, 1, runs_kept=2)
+    >>> history
+    {'1': {'old': [2097152, 0], 'new': [1048576]}}
+    >>> update_history(history, {"new": MIB}, 1, runs_kept=2)
+    {'1': {'new': [1048576, 1048576]}}
+    """
+    if not peaks:
+        return history
+    prefixes = history.setdefault(str(nthreads), {})
+    for prefix in list(prefixes) + [prefix for prefix in peaks if prefix not in prefixes]:
+        runs = (prefixes.get(prefix, []) + [int(peaks.get(prefix, 0))])[-runs_kept:]
+        if any(runs):
+            prefixes[prefix] = runs
+        else:
+            del prefixes[prefix]
+    return history
+
+
+def fit_memory(history, nthreads, *, processes=1, headroom=1.25, quantum=256 * MIB,
+               minimum=1024 * MIB):
+    """Return the memory request, in bytes, of a job of ``processes`` workers
+
+    ``None`` when nothing was recorded for workers of ``nthreads`` threads.
+
+    Examples
+    --------
+    >>> history = {"1": {"process": [900 * MIB, 1400 * MIB], "sum": [300 * MIB]}}
+    >>> fit_memory(history, 1) // MIB
+    1792
+    >>> fit_memory(history, 1, processes=4) // MIB
+    7168
+    >>> fit_memory(history, 2) is None
+    True
+    """
+    peaks = [max(runs) for runs in history.get(str(nthreads), {}).values() if runs]
+    if not peaks:
+        return None
+    worker = max(math.ceil(max(peaks) * headroom / quantum) * quantum, minimum)
+    return worker * processes
+
+
+def load_history(path=STATE_FILE):
+    """Return the recorded peaks, ``{nthreads: {prefix: [peak, ...]}}``"""
+    try:
+        with open(path) as f:
+            history = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return history if isinstance(history, dict) else {}
+
+
+def save_history(history, path=STATE_FILE):
+    """Record ``history`` in ``path``"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(history, f, indent=1)
@@ -0,0 +1,216 @@
+"""Shared cache of coffea preprocessing metadata
+
+``coffea.dataset_tools.preprocess`` opens every file of a fileset to read its
+entry count, ``TTree`` layout and step boundaries. For large datasets this
+takes minutes per run and floods XCache with metadata reads, although the
+files rarely change. ``MetadataCache`` keeps the per-file results in a store
+shared by the users of the facility, keyed by the file URL and its size and
+checksum (or modification time), and only preprocesses unknown or changed
+files. The dataset ``form`` returned with the files is kept once per
+distinct form, so that datasets served from the cache have it too::
+
+    cache = MetadataCache("s3://af-shared/coffea-preprocess")
+    available, updated = cache.preprocess(fileset, step_size=100_000)
+
+The store defaults to ``jobqueue.coffea-casa.metadata-cache``.
+"""
+import hashlib
+import json
+import logging
+import math
+import posixpath
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import dask
+import fsspec
+
+logger = logging.getLogger(__name__)
+
+# Per-file fields of coffea's preprocessing output kept in the cache
+CACHED_FIELDS = ("object_path", "num_entries", "uuid", "steps")
+
+
+def uniform_steps(num_entries, step_size):
+    """Return coffea's ``[start, stop]`` steps of a file without cluster alignment
+
+    Examples
+    --------
+    >>> uniform_steps(250, 100)
+    [[0, 125], [125, 250]]
+    """
+    n_steps = max(round(num_entries / step_size), 1)
+    actual = math.ceil(num_entries / n_steps)
+    return [[i * actual, min((i + 1) * actual, num_entries)] for i in range(n_steps)]
+
+
+def file_signature(url, storage_options=None):
+    """Return ``(size, checksum or mtime)`` of ``url`` from a single stat"""
+    fs, path = fsspec.core.url_to_fs(url, **(storage_options or {}))
+    info = fs.info(path)
+    version = (info.get("checksum") or info.get("ETag") or info.get("mtime")
+               or info.get("modified") or info.get("LastModified"))
+    return info.get("size"), None if version is None else str(version)
+
+
+class MetadataCache:
+    """Per-file preprocessing metadata in a shared fsspec store
+
+    Parameters
+    ----------
+    url : str, optional
+        Root of the cache, a local path or an fsspec URL; defaults to
+        ``jobqueue.coffea-casa.metadata-cache``
+    storage_options : dict, optional
+        Passed to fsspec for the cache store
+    file_storage_options : dict, optional
+        Passed to fsspec to stat the data files
+    stat_threads : int, default 32
+        Files stat-ed concurrently
+    """
+    def __init__(self, url=None, *, storage_options=None, file_storage_options=None,
+                 stat_threads=32):
+        url = url or dask.config.get("jobqueue.coffea-casa.metadata-cache", None)
+        if url is None:
+            raise ValueError(
+                "No metadata cache location: pass url or set "
+                "jobqueue.coffea-casa.metadata-cache"
+            )
+        self.url = url
+        self.fs, self.root = fsspec.core.url_to_fs(url, **(storage_options or {}))
+        self.file_storage_options = file_storage_options or {}
+        self.stat_threads = stat_threads
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.url!r}>"
+
+    @staticmethod
+    def key(url, object_path, signature):
+        """Return the cache key of a file in a given version"""
+        size, version = signature
+        return hashlib.sha1(f"{url}\0{object_path}\0{size}\0{version}".encode()).hexdigest()
+
+    def _path(self, key):
+        # Two-level layout keeps directory listings small
+        return posixpath.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Return the cached entry ``key`` or None"""
+        try:
+            return json.loads(self.fs.cat_file(self._path(key)))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key, entry):
+        """Store entry ``key``, readable by all users of the store"""
+        path = self._path(key)
+        self.fs.makedirs(posixpath.dirname(path), exist_ok=True)
+        data = json.dumps(entry).encode()
+        if "file" in self.fs.protocol:
+            # Readers never see a partially written entry
+            tmp = f"{path}.tmp-{uuid.uuid4().hex}"
+            self.fs.pipe_file(tmp, data)
+            self.fs.mv(tmp, path)
+        else:
+            self.fs.pipe_file(path, data)
+
+    def _signatures(self, urls):
+        def stat(url):
+            try:
+                return url, file_signature(url, self.file_storage_options)
+            except Exception as e:
+                logger.debug("Could not stat %s: %s", url, e)
+                return url, None
+
+        with ThreadPoolExecutor(self.stat_threads) as pool:
+            return dict(pool.map(stat, urls))
+
+    def lookup(self, url, object_path, signature, step_size=None, align_clusters=False):
+        """Return the cached coffea file entry for these steps, or None"""
+        entry = self._lookup(url, object_path, signature, step_size, align_clusters)
+        return None if entry is None else {field: entry[field] for field in CACHED_FIELDS}
+
+    def _lookup(self, url, object_path, signature, step_size, align_clusters):
+        if signature is None:
+            return None
+        entry = self.get(self.key(url, object_path, signature))
+        if entry is None:
+            return None
+        if entry["step_size"] != step_size or entry["align_clusters"] != align_clusters:
+            # Steps aligned to the clusters can only be reused as they are
+            if align_clusters or step_size is None:
+                return None
+            entry["steps"] = uniform_steps(entry["num_entries"], step_size)
+        return entry
+
+    def _put_form(self, form):
+        """Store a dataset form once and return its key"""
+        key = hashlib.sha1(json.dumps(form, sort_keys=True).encode()).hexdigest()
+        if not self.fs.exists(self._path(key)):
+            self.put(key, {"form": form})
+        return key
+
+    def preprocess(self, fileset, step_size=None, *, align_clusters=False,
+                   preprocess=None, **kwargs):
+        """Preprocess ``fileset``, reading unchanged files from the cache
+
+        Takes the arguments of ``coffea.dataset_tools.preprocess`` and returns
+        the same ``(available, updated)`` filesets. Only the files missing from
+        the cache, or changed since they were cached, are preprocessed.
+        """
+        if preprocess is None:
+            from coffea.dataset_tools import preprocess
+
+        files = {
+            url: (object_path if isinstance(object_path, str) else object_path["object_path"])
+            for dataset in fileset.values()
+            for url, object_path in dataset["files"].items()
+        }
+        signatures = self._signatures(files)
+
+        cached, form_keys, missing = {}, {}, {}
+        for name, dataset in fileset.items():
+            for url, object_path in dataset["files"].items():
+                entry = self._lookup(url, files[url], signatures[url],
+                                     step_size, align_clusters)
+                if entry is None:
+                    missing.setdefault(name, dict(dataset, files={}))["files"][url] = object_path
+                else:
+                    cached[url] = {field: entry[field] for field in CACHED_FIELDS}
+                    if entry.get("form_key"):
+                        form_keys.setdefault(name, entry["form_key"])
+        logger.info("Metadata cache: %d file(s) cached, %d to preprocess",
+                    len(cached), len(files) - len(cached))
+
+        if missing:
+            available, updated = preprocess(missing, step_size=step_size,
+                                            align_clusters=align_clusters, **kwargs)
+        else:
+            available, updated = {}, {}
+
+        # Cache what was just preprocessed
+        for dataset in updated.values():
+            form_key = None if dataset.get("form") is None else self._put_form(dataset["form"])
+            for url, entry in dataset["files"].items():
+                if entry.get("steps") is None or signatures.get(url) is None:
+                    continue
+                self.put(self.key(url, entry["object_path"], signatures[url]),
+                         dict({field: entry[field] for field in CACHED_FIELDS},
+                              step_size=step_size, align_clusters=align_clusters,
+                              url=url, form_key=form_key))
+
+        out_available, out_updated = {}, {}
+        for name, dataset in fileset.items():
+            for out, new in ((out_available, available), (out_updated, updated)):
+                fields = {k: v for k, v in new.get(name, {}).items() if k != "files"}
+                merged = dict(dataset, **fields)
+                if merged.get("form") is None and name in form_keys:
+                    merged["form"] = (self.get(form_keys[name]) or {}).get("form")
+                merged["files"] = {}
+                for url in dataset["files"]:
+                    if url in cached:
+                        merged["files"][url] = cached[url]
+                    elif url in new.get(name, {}).get("files", {}):
+                        merged["files"][url] = new[name]["files"][url]
+                out[name] = merged
+        return out_available, out_updated
@@ -0,0 +1,51 @@
+"""Retry of OOM-killed tasks on larger-memory workers
+
+A task that kills its worker by exhausting memory is retried by the
+scheduler on another worker of the same size, dies again and, after
+``distributed.scheduler.allowed-failures`` deaths, errs with
+``KilledWorker``, having taken several workers with it.
+
+``OOMRetryPlugin`` (a scheduler plugin registered by ``CoffeaCasaCluster``
+with ``oom_retry_workers``) watches tasks whose worker leaves while they
+run. When the worker's last reported memory was above ``oom_suspect``'s
+fraction of its limit, the task is restricted to workers with the
+``coffea-casa-bigmem`` resource, announced with a
+``coffea-casa-oom-retry`` event. The cluster keeps up to
+``oom_retry_workers`` jobs of ``oom_retry_memory`` whose workers advertise
+that resource while such tasks are pending, and removes them afterwards.
+"""
+
+# Scheduler event topic of OOMRetryPlugin
+OOM_RETRY_TOPIC = "coffea-casa-oom-retry"
+
+# Worker resource of the larger-memory jobs
+OOM_RESOURCE = "coffea-casa-bigmem"
+
+# Names of the larger-memory jobs of CoffeaCasaCluster
+OOM_JOB_PREFIX = "coffea-casa-bigmem-"
+
+
+def oom_suspect(process_memory, memory_limit, fraction=0.8):
+    """Whether a worker that died with ``process_memory`` ran out of memory
+
+    The worker's memory is only known as of its last heartbeat, so any
+    worker past ``fraction`` (by default Dask's pause threshold) of its
+    limit is suspected.
+
+    Examples
+    --------
+    >>> oom_suspect(3.5e9, 4e9), oom_suspect(1e9, 4e9), oom_suspect(8e9, None)
+    (True, False, False)
+    """
+    return bool(memory_limit) and process_memory >= fraction * memory_limit
+
+
+def oom_jobs_target(pending, maximum):
+    """Number of larger-memory jobs to run for ``pending`` restricted tasks
+
+    Examples
+    --------
+    >>> oom_jobs_target(0, 2), oom_jobs_target(1, 2), oom_jobs_target(5, 2)
+    (0, 1, 2)
+    """
+    return min(pending, maximum)
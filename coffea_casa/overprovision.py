@@ -0,0 +1,107 @@
+"""Over-provisioned scale-up
+
+The time until ``n`` workers are connected is the slowest of ``n`` job
+starts: a few jobs landing on a slow node or pulling the image hold up the
+whole scale-up. ``CoffeaCasaCluster.scale(n, overprovision=True)`` submits
+``n + k`` jobs and removes the surplus jobs still pending once ``n``
+workers have connected.
+
+``k`` is learned from the observed startup times (submission to worker
+connection) of the cluster's jobs, kept across sessions in
+``~/.coffea-casa/startup-times.json``: a start taking longer than
+``factor`` times the median is a straggler, and ``k`` is the smallest
+surplus with which ``n`` jobs start without straggling with probability
+``confidence``.
+"""
+import json
+import math
+import os
+import statistics
+
+STATE_FILE = os.path.join(os.path.expanduser("~"), ".coffea-casa", "startup-times.json")
+
+# Startup times kept
+MAX_SAMPLES = 200
+
+# Surplus, as a fraction of the new jobs, until enough startups were seen
+DEFAULT_FRACTION = 0.1
+
+
+def _binomial_tail(trials, successes, p):
+    """Return ``P(X >= successes)`` for ``X ~ Binomial(trials, p)``"""
+    if successes <= 0:
+        return 1.0
+    log_p, log_q = math.log(p), math.log1p(-p)
+    total = 0.0
+    for i in range(successes, trials + 1):
+        total += math.exp(math.lgamma(trials + 1) - math.lgamma(i + 1)
+                          - math.lgamma(trials - i + 1) + i * log_p + (trials - i) * log_q)
+    return total
+
+
+def straggler_fraction(times, factor=1.5):
+    """Return the fraction of ``times`` longer than ``factor`` times their median
+
+    Examples
+    --------
+    >>> straggler_fraction([30, 32, 35, 31, 240])
+    0.2
+    """
+    if not times:
+        return 0.0
+    threshold = factor * statistics.median(times)
+    return sum(t > threshold for t in times) / len(times)
+
+
+def surplus_jobs(n, times, *, confidence=0.9, maximum=0.25, factor=1.5, min_samples=10):
+    """Return the number of jobs to submit on top of ``n``
+
+    Parameters
+    ----------
+    n : int
+        Jobs needed
+    times : sequence of float
+        Observed startup times, in seconds
+    confidence : float, default 0.9
+        Probability that ``n`` of the ``n + k`` jobs start without straggling
+    maximum : float, default 0.25
+        Largest surplus, as a fraction of ``n`` (at least one job)
+    factor : float, default 1.5
+        Startups longer than ``factor`` times the median are stragglers
+    min_samples : int, default 10
+        Below this many startup times, ``DEFAULT_FRACTION`` of ``n`` is used
+
+    Examples
+    --------
+    >>> times = [30] * 18 + [300, 600]
+    >>> surplus_jobs(20, times), surplus_jobs(100, times), surplus_jobs(100, [30] * 20)
+    (4, 16, 0)
+    """
+    if n <= 0:
+        return 0
+    cap = max(1, math.ceil(maximum * n))
+    if len(times) < min_samples:
+        return min(cap, math.ceil(DEFAULT_FRACTION * n))
+    p = 1 - straggler_fraction(times, factor)
+    if p >= 1:
+        return 0
+    for k in range(cap + 1):
+        if _binomial_tail(n + k, n, p) >= confidence:
+            return k
+    return cap
+
+
+def load_startup_times(path=STATE_FILE):
+    """Return the startup times recorded in ``path``"""
+    try:
+        with open(path) as f:
+            return [float(t) for t in json.load(f)][-MAX_SAMPLES:]
+    except (OSError, ValueError, TypeError):
+        return []
+
+
+def save_startup_times(times, path=STATE_FILE):
+    """Record the last ``MAX_SAMPLES`` of ``times`` in ``path``"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump([round(t, 1) for t in list(times)[-MAX_SAMPLES:]], f)
@@ -0,0 +1,55 @@
+"""Pilot jobs hosting several Dask workers
+
+By default every Dask worker is its own Docker-universe job and pays the
+container start, sandbox transfer and environment setup, and one schedd
+transaction, by itself. With ``CoffeaCasaCluster(processes=M)`` (dask-jobqueue's
+option) one job of ``cores`` cores and ``memory`` memory hosts ``M``
+workers: the launcher (``prepare-env-cc-analysis.sh``) starts one worker per
+process, each with ``cores / M`` threads, ``memory / M`` memory and its own
+forwarded ``dask<i>``/``nanny<i>`` ports. The scheduler sees ``M``
+independent workers, HTCondor one job.
+
+Workers are named as ``dask worker --nworkers M`` names them:
+``htcondor--<job_id>---<i>``.
+"""
+
+
+def worker_names(name, processes=1):
+    """Return the names of the Dask workers of the job whose worker name is ``name``
+
+    Examples
+    --------
+    >>> worker_names("htcondor--7.0--")
+    ['htcondor--7.0--']
+    >>> worker_names("htcondor--7.0--", 2)
+    ['htcondor--7.0---0', 'htcondor--7.0---1']
+    """
+    if processes <= 1:
+        return [name]
+    return [f"{name}-{i}" for i in range(processes)]
+
+
+def service_name(service, index):
+    """Return the container service of the ``index``-th worker, e.g. ``"dask1"``"""
+    return f"{service}{index}" if index else service
+
+
+def pilot_directives(processes, container_port, nanny_port):
+    """Return the job directives forwarding the ports of ``processes`` workers
+
+    Examples
+    --------
+    >>> pilot_directives(2, 8786, 8001)  # doctest: +NORMALIZE_WHITESPACE
+    {'+DaskWorkerProcesses': 2, 'container_service_names': 'dask,nanny,dask1,nanny1',
+     'dask_container_port': 8786, 'nanny_container_port': 8001,
+     'dask1_container_port': 8787, 'nanny1_container_port': 8002}
+    """
+    directives = {
+        "+DaskWorkerProcesses": processes,
+        "container_service_names": ",".join(
+            service_name(s, i) for i in range(processes) for s in ("dask", "nanny")),
+    }
+    for i in range(processes):
+        directives[f"{service_name('dask', i)}_container_port"] = container_port + i
+        directives[f"{service_name('nanny', i)}_container_port"] = nanny_port + i
+    return directives
@@ -0,0 +1,77 @@
+"""Rank expressions steering worker jobs to well-suited execute nodes
+
+Without a ``Rank``, HTCondor places worker jobs on arbitrary matching
+nodes, including ones that must pull the analysis image first. The Rank
+built here prefers, without excluding any node, nodes that advertise:
+
+- the worker image: ``CoffeaCasaImageDigests`` lists ``repo:tag@digest`` of
+  the images the node holds (``scripts-extra/condor_startd_cron_image_digests``);
+  another tag of the same repository shares most layers and gets half the
+  weight;
+- the preferred site, e.g. the one of the XCache, in ``CoffeaCasaSite``;
+- fast scratch, ``CoffeaCasaScratchType`` ``"nvme"`` (``"ssd"`` gets half
+  the weight).
+
+Site and scratch type are static startd attributes set by the facility
+(``STARTD_ATTRS``). Weights are set with ``jobqueue.coffea-casa.rank-weights``
+or ``CoffeaCasaCluster(rank_weights=...)``.
+"""
+import re
+
+from .image_warming import DIGESTS_ATTRIBUTE, image_name
+
+SITE_ATTRIBUTE = "CoffeaCasaSite"
+SCRATCH_ATTRIBUTE = "CoffeaCasaScratchType"
+
+DEFAULT_RANK_WEIGHTS = {"image": 100, "site": 10, "scratch": 5}
+
+
+def _string(value):
+    """Return ``value`` as a ClassAd string literal"""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _if(condition, weight, otherwise=0):
+    return f"ifThenElse(({condition}) =?= true, {weight}, {otherwise})"
+
+
+def _listed(regex):
+    """Whether an entry of the node's image list matches ``regex``"""
+    return f"regexp({_string('(^|,)' + regex)}, TARGET.{DIGESTS_ATTRIBUTE})"
+
+
+def rank_expression(image=None, *, site=None, weights=None):
+    """Return the job ``Rank`` expression, or ``None`` when it has no terms
+
+    Parameters
+    ----------
+    image : str, optional
+        Worker image, e.g. ``"hub.opensciencegrid.org/coffea-casa/cc-analysis:2024.1"``
+    site : str, optional
+        Preferred value of the node's ``CoffeaCasaSite``
+    weights : dict, optional
+        Weights of the ``"image"``, ``"site"`` and ``"scratch"`` terms,
+        updating ``DEFAULT_RANK_WEIGHTS``; 0 drops a term
+
+    Examples
+    --------
+    >>> rank_expression(site="T2_US_Nebraska", weights={"image": 0, "scratch": 0})
+    'ifThenElse((TARGET.CoffeaCasaSite == "T2_US_Nebraska") =?= true, 10, 0)'
+    """
+    weights = dict(DEFAULT_RANK_WEIGHTS, **(weights or {}))
+    terms = []
+    if image and weights["image"]:
+        name = image_name(image)
+        if "@" in image:
+            exact = re.escape(f"{name}:") + "[^,@]*" + re.escape("@" + image.split("@", 1)[1])
+        else:
+            exact = re.escape(f"{name}:{image[len(name) + 1:] or 'latest'}@")
+        terms.append(_if(_listed(exact), weights["image"],
+                         _if(_listed(re.escape(f"{name}:")), weights["image"] / 2)))
+    if site and weights["site"]:
+        terms.append(_if(f"TARGET.{SITE_ATTRIBUTE} == {_string(site)}", weights["site"]))
+    if weights["scratch"]:
+        scratch = f"TARGET.{SCRATCH_ATTRIBUTE}"
+        terms.append(_if(f'{scratch} == "nvme"', weights["scratch"],
+                         _if(f'{scratch} == "ssd"', weights["scratch"] / 2)))
+    return " + ".join(terms) or None
@@ -1,3 +1,4 @@
+import contextlib
 import os
 import sys
 import zipfile
@@ -5,8 +6,12 @@ import logging
 import uuid
 import subprocess
 
-from distributed.diagnostics.plugin import NannyPlugin
-from dask.utils import tmpfile
+from distributed.diagnostics.plugin import NannyPlugin, SchedulerPlugin, WorkerPlugin
+from dask.utils import key_split, parse_bytes, parse_timedelta, tmpfile
+from tornado.ioloop import PeriodicCallback
+
+from .memory_sizing import TASK_MEMORY_TOPIC
+from .oom_retry import OOM_RESOURCE, OOM_RETRY_TOPIC, oom_suspect
 
 logger = logging.getLogger(__name__)
 
@@ -135,3 +140,252 @@ class DistributedEnvironmentPlugin(NannyPlugin):
             return
 
         return
+
+
+class MemoryLeakRestartPlugin(WorkerPlugin):
+    """A WorkerPlugin that recycles a worker whose unmanaged memory leaks.
+
+    The unmanaged memory (process memory minus the data held by the worker)
+    is sampled whenever the worker becomes idle between tasks. Once it has
+    grown by more than ``threshold`` since the first sample, the worker
+    retires gracefully and its nanny restarts it, so the HTCondor job itself
+    is kept.
+
+    Parameters
+    ----------
+    threshold: str or int
+        Allowed growth of unmanaged memory, e.g. ``"1GiB"``
+    Examples
+    --------
+    >>> client.register_plugin(MemoryLeakRestartPlugin("1GiB"))  # doctest: +SKIP
+    """
+
+    name = "coffea-casa-memory-leak-restart"
+
+    def __init__(self, threshold="1GiB"):
+        self.threshold = parse_bytes(threshold)
+
+    def setup(self, worker):
+        self.worker = worker
+        self.baseline = None
+        self.restarting = False
+
+    def transition(self, key, start, finish, **kwargs):
+        if start != "executing" or self.restarting:
+            return
+        state = self.worker.state
+        if state.executing_count:
+            return
+
+        unmanaged = self.worker.monitor.get_process_memory() - state.nbytes
+        if self.baseline is None:
+            self.baseline = unmanaged
+            return
+
+        if unmanaged - self.baseline > self.threshold:
+            self.restarting = True
+            logger.warning(
+                "Unmanaged memory grew by %d bytes between tasks; recycling worker %s",
+                unmanaged - self.baseline, self.worker.name)
+            self.worker.loop.add_callback(
+                self.worker.close_gracefully,
+                restart=True,
+                reason="coffea-casa-memory-leak",
+            )
+
+
+class TaskMemoryPlugin(WorkerPlugin):
+    """A WorkerPlugin that records the peak memory of each task prefix.
+
+    The worker's process memory is sampled every ``interval`` while tasks
+    execute; when a task finishes, the peak seen while it ran updates the
+    peak of its prefix. Peaks that grew are sent to the scheduler every
+    ``flush_interval`` as ``coffea-casa-task-memory`` events, from which
+    ``CoffeaCasaCluster`` fits the memory request of its jobs (see
+    ``coffea_casa.memory_sizing``). With several threads the process memory
+    includes the tasks running concurrently, as the request has to.
+
+    Parameters
+    ----------
+    interval: str or float
+        How often the process memory is sampled while tasks execute
+    flush_interval: str or float
+        How often grown peaks are sent to the scheduler
+    Examples
+    --------
+    >>> client.register_plugin(TaskMemoryPlugin())  # doctest: +SKIP
+    """
+
+    name = "coffea-casa-task-memory"
+
+    def __init__(self, interval="500ms", flush_interval="10s"):
+        self.interval = parse_timedelta(interval)
+        self.flush_interval = parse_timedelta(flush_interval)
+
+    def setup(self, worker):
+        self.worker = worker
+        self.running = {}
+        self.peaks = {}
+        self.changed = set()
+        self.callbacks = [
+            PeriodicCallback(self.sample, self.interval * 1000),
+            PeriodicCallback(self.flush, self.flush_interval * 1000),
+        ]
+        for callback in self.callbacks:
+            callback.start()
+
+    def teardown(self, worker):
+        for callback in self.callbacks:
+            callback.stop()
+        self.flush()
+
+    def transition(self, key, start, finish, **kwargs):
+        if finish == "executing":
+            self.running[key] = self.worker.monitor.get_process_memory()
+        elif start == "executing":
+            peak = max(self.running.pop(key, 0), self.worker.monitor.get_process_memory())
+            prefix = key_split(key)
+            if peak > self.peaks.get(prefix, 0):
+                self.peaks[prefix] = peak
+                self.changed.add(prefix)
+
+    def sample(self):
+        if not self.running:
+            return
+        memory = self.worker.monitor.get_process_memory()
+        for key, peak in self.running.items():
+            if memory > peak:
+                self.running[key] = memory
+
+    def flush(self):
+        if not self.changed:
+            return
+        peaks = {prefix: self.peaks[prefix] for prefix in self.changed}
+        self.changed = set()
+        self.worker.log_event(TASK_MEMORY_TOPIC, {
+            "worker": self.worker.name,
+            "nthreads": self.worker.state.nthreads,
+            "peaks": peaks,
+        })
+
+
+class OOMRetryPlugin(SchedulerPlugin):
+    """A SchedulerPlugin that moves tasks killing their worker to larger workers.
+
+    A task whose worker leaves while it runs, with its last reported memory
+    above ``fraction`` of its limit, is restricted to workers with the
+    ``resource`` resource before the scheduler reschedules it. Restricted
+    tasks are reported as ``coffea-casa-oom-retry`` events, with the number
+    still pending, from which ``CoffeaCasaCluster`` sizes its pool of
+    larger-memory jobs (see ``coffea_casa.oom_retry``).
+
+    Parameters
+    ----------
+    fraction: float
+        Fraction of the memory limit above which a dead worker is deemed
+        killed by its memory use
+    resource: str
+        Worker resource the tasks are restricted to
+    Examples
+    --------
+    >>> client.register_plugin(OOMRetryPlugin())  # doctest: +SKIP
+    """
+
+    name = "coffea-casa-oom-retry"
+
+    def __init__(self, fraction=0.8, resource=OOM_RESOURCE):
+        self.fraction = fraction
+        self.resource = resource
+
+    async def start(self, scheduler):
+        self.scheduler = scheduler
+        # The states outlive the workers' removal, with their last metrics
+        self.workers = dict(scheduler.workers)
+        self.processing = {}
+        self.pending = set()
+
+    def add_worker(self, scheduler, worker):
+        self.workers[worker] = scheduler.workers[worker]
+
+    def remove_worker(self, scheduler, worker, **kwargs):
+        # Called once the tasks of the worker have been rescheduled
+        self.workers.pop(worker, None)
+
+    def transition(self, key, start, finish, *args, **kwargs):
+        if finish == "processing":
+            ts = self.scheduler.tasks[key]
+            self.processing[key] = ts.processing_on.address
+            return
+        address = self.processing.pop(key, None) if start == "processing" else None
+        if finish in ("memory", "erred", "forgotten"):
+            if key in self.pending:
+                self.pending.discard(key)
+                self._log("done", key)
+            return
+        if address is None or address in self.scheduler.workers:
+            return
+        ws = self.workers.get(address)
+        ts = self.scheduler.tasks.get(key)
+        if (ws is None or ts is None or key in self.pending
+                or not oom_suspect(ws.memory.process, ws.memory_limit, self.fraction)):
+            return
+        # Before the task is released to waiting and assigned again
+        ts.resource_restrictions = {**(ts.resource_restrictions or {}), self.resource: 1}
+        self.pending.add(key)
+        logger.warning("Task %s was running on %s when it died at %d of %d bytes; "
+                       "retrying it on workers with the %s resource",
+                       key, ws.name, ws.memory.process, ws.memory_limit, self.resource)
+        self._log("retry", key, worker=ws.name, memory=ws.memory.process)
+
+    def _log(self, action, key, **msg):
+        self.scheduler.log_event(OOM_RETRY_TOPIC, dict(
+            msg, action=action, key=str(key), pending=len(self.pending)))
+
+
+def _replace_file(path, data, mode=0o600):
+    """Atomically replace ``path`` with ``data``: readers see the old or new file"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex}")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+
+
+class CredentialRefreshPlugin(WorkerPlugin):
+    """A WorkerPlugin that installs renewed credentials on running workers.
+
+    ``CoffeaCasaCluster`` registers a new instance, replacing the previous
+    one, whenever the bearer token or X.509 proxy in the notebook changes.
+    Workers joining later get the latest credentials too.
+
+    Parameters
+    ----------
+    token: bytes, optional
+        Bearer token, written to ``$BEARER_TOKEN_FILE``
+        (``/tmp/.xcache/access_token`` in the worker image)
+    proxy: bytes, optional
+        X.509 proxy, written to ``$X509_USER_PROXY`` or ``/tmp/x509up_u<uid>``
+    """
+
+    name = "coffea-casa-credentials"
+
+    def __init__(self, token=None, proxy=None):
+        self.token = token
+        self.proxy = proxy
+
+    def setup(self, worker):
+        if self.token is not None:
+            path = os.environ.get("BEARER_TOKEN_FILE", "/tmp/.xcache/access_token")
+            _replace_file(path, self.token)
+            logger.info("Installed renewed bearer token at %s", path)
+        if self.proxy is not None:
+            path = os.environ.get("X509_USER_PROXY", f"/tmp/x509up_u{os.geteuid()}")
+            _replace_file(path, self.proxy)
+            logger.info("Installed renewed X.509 proxy at %s", path)
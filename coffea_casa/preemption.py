@@ -0,0 +1,110 @@
+"""Graceful drain of Dask workers on HTCondor eviction and preemption
+
+When HTCondor preempts a slot it first sends the job its soft-kill signal and
+only hard-kills it after ``job_max_vacate_time`` seconds. The worker launcher
+(``prepare-env-cc-analysis.sh``) traps that signal and runs::
+
+    python -m coffea_casa.preemption <scheduler> <worker-name>... --timeout 60 ...
+
+which announces the preemption on the scheduler and asks it to retire the
+workers of the job gracefully, so that its in-memory keys are replicated to peers before
+the container goes away. ``CoffeaCasaCluster`` watches for the announcement
+and immediately submits a replacement job.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+from distributed.core import rpc
+from distributed.security import Security
+
+logger = logging.getLogger(__name__)
+
+# Scheduler event topic used by draining workers to announce a preemption
+PREEMPTION_TOPIC = "coffea-casa-preemption"
+
+# Seconds a preempted worker gets to hand its data over to its peers
+DEFAULT_DRAIN_TIMEOUT = 60
+
+
+async def drain_worker(scheduler_address, name, *, security=None,
+                       timeout=DEFAULT_DRAIN_TIMEOUT):
+    """Gracefully retire the worker called ``name`` from the scheduler.
+
+    Parameters
+    ----------
+    scheduler_address : str
+        Address of the Dask scheduler, e.g. ``tls://1.2.3.4:8786``
+    name : str or list of str
+        Name of the worker to retire (``htcondor--<job_id>--``), or the names
+        of the workers of a pilot job
+    security : distributed.Security, optional
+        Security object used to connect to the scheduler
+    timeout : float, default 60
+        Seconds to wait for the retirement to finish
+
+    Returns
+    -------
+    dict
+        The scheduler's ``retire_workers`` response (address -> worker info)
+    """
+    names = [name] if isinstance(name, str) else list(name)
+    security = security or Security()
+    async with rpc(scheduler_address,
+                   connection_args=security.get_connection_args("worker")) as scheduler:
+        for name in names:
+            await scheduler.log_event(
+                topic=PREEMPTION_TOPIC,
+                msg={"action": "drain", "name": name},
+            )
+        logger.info("Draining worker(s) %s before eviction", ", ".join(names))
+        return await asyncio.wait_for(
+            scheduler.retire_workers(
+                names=names,
+                close_workers=True,
+                remove=True,
+                stimulus_id=f"coffea-casa-preempted-{time.time()}",
+            ),
+            timeout,
+        )
+
+
+def main(argv=None):
+    """Command line entry point used by the worker launcher"""
+    parser = argparse.ArgumentParser(
+        prog="python -m coffea_casa.preemption",
+        description="Gracefully retire a Dask worker before HTCondor hard-kills it",
+    )
+    parser.add_argument("scheduler", help="Dask scheduler address")
+    parser.add_argument("names", nargs="+", metavar="name",
+                        help="Names of the workers to retire")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_DRAIN_TIMEOUT)
+    parser.add_argument("--tls-ca-file", default=None)
+    parser.add_argument("--tls-cert", default=None)
+    parser.add_argument("--tls-key", default=None)
+    args = parser.parse_args(argv)
+
+    if args.tls_ca_file and args.tls_cert:
+        security = Security(
+            tls_ca_file=args.tls_ca_file,
+            tls_worker_cert=args.tls_cert,
+            tls_worker_key=args.tls_key or args.tls_cert,
+            require_encryption=True,
+        )
+    else:
+        security = Security()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(drain_worker(args.scheduler, args.names,
+                                 security=security, timeout=args.timeout))
+    except Exception as e:
+        logger.error("Graceful drain of %s failed: %s", ", ".join(args.names), e)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
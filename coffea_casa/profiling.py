@@ -0,0 +1,258 @@
+"""Cluster-wide sampling profiler
+
+``CoffeaCasaCluster.profile`` answers "where is my analysis spending time"
+across all workers at once. Every worker samples the stacks of the threads
+running tasks for ``duration`` seconds; the samples travel back over the
+Dask comms and are merged into a single flamegraph in the notebook::
+
+    cluster.profile(duration=30, filename="analysis.svg")
+
+Sampling is done by a thread of the worker reading ``sys._current_frames()``
+(a few microseconds per sample). With ``native=True`` workers that have
+`py-spy <https://github.com/benfred/py-spy>`_ installed use it instead, which
+includes the C/C++ frames of compiled extensions; the others fall back to the
+Python sampler.
+
+Stacks are kept in the "folded" format of flamegraph.pl, one
+``root;...;leaf count`` line per stack: a filename ending in ``.svg`` gets a
+self-contained flamegraph, any other the folded stacks themselves (readable
+by flamegraph.pl or speedscope).
+"""
+import asyncio
+import ctypes
+import html
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+
+from dask.utils import parse_timedelta
+
+# prctl(2) option allowing another process to ptrace this one under Yama
+_PR_SET_PTRACER = 0x59616D61
+_PR_SET_PTRACER_ANY = -1
+
+
+def _frame_name(frame):
+    # Functions, not lines, as py-spy --nolineno
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename})"
+
+
+def _stack(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def sample_threads(thread_ids, duration, interval):
+    """Return the folded stacks of ``thread_ids()`` sampled every ``interval``"""
+    stacks = Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        frames = sys._current_frames()
+        for ident in thread_ids():
+            frame = frames.get(ident)
+            if frame is not None:
+                stacks[_stack(frame)] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def _set_ptracer(pid):
+    """Let process ``pid`` (any with -1, only ancestors with 0) ptrace this one"""
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.prctl(_PR_SET_PTRACER, pid, 0, 0, 0) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def sample_py_spy(duration, interval):
+    """Return the folded stacks of this process, including native frames"""
+    py_spy = shutil.which("py-spy")
+    if py_spy is None:
+        raise RuntimeError("py-spy is not installed")
+    rate = max(int(round(1 / interval)), 1)
+    # py-spy is not a descendant of the worker: let it attach while it runs
+    allowed = _set_ptracer(_PR_SET_PTRACER_ANY)
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "stacks.txt")
+        try:
+            proc = subprocess.run(
+                [py_spy, "record", "--pid", str(os.getpid()), "--duration", str(int(duration)),
+                 "--rate", str(rate), "--format", "raw", "--output", output,
+                 "--native", "--nolineno", "--nonblocking"],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+            )
+        finally:
+            if allowed:
+                _set_ptracer(0)
+        if proc.returncode != 0 or not os.path.exists(output):
+            raise RuntimeError(f"py-spy failed: {proc.stderr.strip()}")
+        with open(output) as f:
+            return parse_folded(f.read())
+
+
+def parse_folded(text):
+    """Return the ``{stack: count}`` of folded stacks"""
+    stacks = Counter()
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if stack and count.isdigit():
+            stacks[stack] += int(count)
+    return stacks
+
+
+def format_folded(stacks):
+    """Return folded stacks as text, most sampled first"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+async def _profile_worker(duration, interval, native, dask_worker):
+    """Sample a worker off its event loop; return ``(sampler, stacks, error)``"""
+    loop = asyncio.get_running_loop()
+    error = None
+    if native:
+        try:
+            stacks = await loop.run_in_executor(None, sample_py_spy, duration, interval)
+            return "py-spy", dict(stacks), None
+        except Exception as e:
+            error = str(e)
+
+    def task_threads():
+        return list(dask_worker.active_threads)
+
+    stacks = await loop.run_in_executor(None, sample_threads, task_threads, duration,
+                                        interval)
+    return "python", dict(stacks), error
+
+
+class ClusterProfile:
+    """Merged samples of a cluster-wide profile"""
+    def __init__(self, stacks, samplers, errors, duration, filename=None):
+        self.stacks = stacks
+        self.samplers = samplers
+        self.errors = errors
+        self.duration = duration
+        self.filename = filename
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def top(self, n=10):
+        """Return the ``n`` leaf frames with the most samples"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rpartition(";")[2]] += count
+        return leaves.most_common(n)
+
+    def __repr__(self):
+        return (f"<ClusterProfile: {len(self.samplers)} workers, {self.samples} samples "
+                f"over {self.duration}s, {self.filename or 'not written'}>")
+
+
+def profile_workers(client, duration=30, *, interval="10ms", native=False, workers=None,
+                    filename="dask-profile.svg"):
+    """Sample all workers at once and merge the samples into one flamegraph
+
+    Parameters
+    ----------
+    client : distributed.Client
+    duration : float or str, default 30
+        Sampling time, in seconds
+    interval : str, default "10ms"
+        Time between two samples
+    native : bool, default False
+        Use py-spy on the workers where it is installed, with native frames
+    workers : list of str, optional
+        Worker addresses to profile; all workers by default
+    filename : str or None, default "dask-profile.svg"
+        File written with the flamegraph (``.svg``) or the folded stacks
+
+    Returns
+    -------
+    ClusterProfile
+    """
+    duration = parse_timedelta(duration)
+    interval = parse_timedelta(interval)
+    results = client.run(_profile_worker, duration, interval, native, workers=workers)
+
+    stacks, samplers, errors = Counter(), {}, {}
+    for worker, (sampler, worker_stacks, error) in results.items():
+        stacks.update(worker_stacks)
+        samplers[worker] = sampler
+        if error:
+            errors[worker] = error
+    profile = ClusterProfile(stacks, samplers, errors, duration)
+    if filename:
+        if filename.endswith(".svg"):
+            data = flamegraph_svg(stacks, title=f"{len(results)} workers, {duration:g}s")
+        else:
+            data = format_folded(stacks)
+        with open(filename, "w") as f:
+            f.write(data)
+        profile.filename = filename
+    return profile
+
+
+def _color(name):
+    # Stable warm colours, as in flamegraph.pl
+    h = zlib.crc32(name.encode())
+    return f"rgb({205 + h % 50},{(h >> 8) % 180},{(h >> 16) % 55})"
+
+
+def flamegraph_svg(stacks, *, title="", width=1200, frame_height=16):
+    """Return a self-contained SVG flamegraph of folded ``stacks``"""
+    root = {"count": 0, "children": {}}
+    for stack, count in stacks.items():
+        root["count"] += count
+        node = root
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"count": 0, "children": {}})
+            node["count"] += count
+
+    def depth(node):
+        return 1 + max((depth(c) for c in node["children"].values()), default=0)
+
+    levels = depth(root)
+    height = (levels + 2) * frame_height
+    total = root["count"] or 1
+    rects = []
+
+    def draw(name, node, x, level):
+        w = node["count"] / total * width
+        if w < 0.3:
+            return
+        y = height - (level + 1) * frame_height
+        label = html.escape(name)
+        pct = 100 * node["count"] / total
+        chars = int(w / 7)
+        text = label if len(name) <= chars else html.escape(name[:max(chars - 2, 0)] + "..")
+        rects.append(
+            f'<g><title>{label} ({node["count"]} samples, {pct:.2f}%)</title>'
+            f'<rect x="{x:.2f}" y="{y}" width="{w:.2f}" height="{frame_height - 1}" '
+            f'fill="{_color(name)}" rx="2"/>'
+            + (f'<text x="{x + 3:.2f}" y="{y + frame_height - 4}">{text}</text>'
+               if chars > 2 else "")
+            + "</g>"
+        )
+        for child_name, child in sorted(node["children"].items()):
+            draw(child_name, child, x, level + 1)
+            x += child["count"] / total * width
+
+    draw("all", root, 0, 0)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="monospace" font-size="11">'
+        f'<text x="{width / 2}" y="{frame_height}" text-anchor="middle" font-size="14">'
+        f'{html.escape(title)}</text>'
+        + "".join(rects) + "</svg>\n"
+    )
@@ -0,0 +1,196 @@
+"""Tree reduction of coffea accumulators on the cluster
+
+Coffea processor outputs (dicts of ``hist.Hist``, cutflow counters, sets) are
+usually merged by ``client.gather`` followed by a sum in the notebook, or by a
+reduction whose fan-in is fixed by the executor. With hundreds of chunks the
+last merges pile up on a single process. ``tree_reduce`` merges the outputs
+on the workers instead, ``fan_in`` at a time, so that only one accumulator is
+ever transferred to the notebook::
+
+    futures = client.map(processor, chunks)
+    output, report = tree_reduce(client, futures, fan_in=8)
+    print(report)
+
+Each merge task copies its first input and adds the others to the copy in
+place (``h += other``), which adds the storage buffers without allocating a
+histogram per input. The inputs, held in worker memory, are never modified,
+so that a merge that fails half-way can be retried.
+"""
+import copy
+import sys
+import threading
+import time
+import uuid
+
+from dask.utils import format_bytes, format_time, parse_timedelta
+from distributed import wait
+
+# Default number of accumulators merged by one task
+DEFAULT_FAN_IN = 8
+
+
+def _is_histogram(obj):
+    # boost_histogram is necessarily imported when obj is a histogram
+    bh = sys.modules.get("boost_histogram")
+    return bh is not None and isinstance(obj, bh.Histogram)
+
+
+def accumulate(a, b):
+    """Merge accumulator ``b`` into ``a``, in place where possible
+
+    Dictionaries are merged key by key, sets are united, histograms are added
+    in place and anything else is summed, as in ``coffea.processor``. ``b`` is
+    left untouched: the values taken from it are copies.
+
+    Raises
+    ------
+    TypeError
+        If two histograms with different storage types are merged
+
+    Examples
+    --------
+    >>> accumulate({"cutflow": {"all": 10, "trigger": 4}}, {"cutflow": {"all": 5}, "n": 2})
+    {'cutflow': {'all': 15, 'trigger': 4}, 'n': 2}
+    """
+    if a is None:
+        return copy.deepcopy(b)
+    if b is None:
+        return a
+    if isinstance(a, dict):
+        for key, value in b.items():
+            a[key] = accumulate(a.get(key), value)
+        return a
+    if isinstance(a, set):
+        a |= b
+        return a
+    if _is_histogram(a):
+        if a.storage_type != b.storage_type:
+            raise TypeError(
+                f"Cannot merge histograms with {a.storage_type.__name__} and "
+                f"{b.storage_type.__name__} storage"
+            )
+        a += b
+        return a
+    return a + b
+
+
+def merge(*accumulators):
+    """Merge several accumulators into a copy of the first one"""
+    out = None
+    for acc in accumulators:
+        out = accumulate(out, acc)
+    return out
+
+
+class _MemorySampler:
+    """Poll the scheduler for the process memory of the workers"""
+    def __init__(self, client, interval):
+        self.client = client
+        self.interval = interval
+        self.peak_worker = 0
+        self.peak_total = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="coffea-casa-reduction-memory")
+
+    @staticmethod
+    def _sample(dask_scheduler):
+        memory = [ws.memory.process for ws in dask_scheduler.workers.values()]
+        return max(memory, default=0), sum(memory)
+
+    def _run(self):
+        while True:
+            try:
+                worker, total = self.client.run_on_scheduler(self._sample)
+            except Exception:
+                worker, total = 0, 0
+            self.peak_worker = max(self.peak_worker, worker)
+            self.peak_total = max(self.peak_total, total)
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+
+
+class ReductionReport:
+    """Wall time and peak memory of a ``tree_reduce`` merge phase"""
+    def __init__(self, inputs, fan_in, levels, merges, wall_time,
+                 peak_worker_memory, peak_total_memory):
+        self.inputs = inputs
+        self.fan_in = fan_in
+        self.levels = levels
+        self.merges = merges
+        self.wall_time = wall_time
+        self.peak_worker_memory = peak_worker_memory
+        self.peak_total_memory = peak_total_memory
+
+    def __repr__(self):
+        return (
+            f"<ReductionReport: {self.inputs} inputs, fan-in {self.fan_in}, "
+            f"{self.levels} levels, {self.merges} merges, "
+            f"wall time {format_time(self.wall_time)}, "
+            f"peak worker memory {format_bytes(self.peak_worker_memory)}, "
+            f"peak cluster memory {format_bytes(self.peak_total_memory)}>"
+        )
+
+
+def tree_reduce(client, futures, *, fan_in=DEFAULT_FAN_IN, sample_interval="500ms",
+                gather=True):
+    """Merge accumulators on the workers with a tree of fixed fan-in
+
+    The merge phase starts once all ``futures`` have finished; its wall time
+    and the peak process memory of the workers during it are reported.
+
+    Parameters
+    ----------
+    client : distributed.Client
+        Client of the cluster holding the accumulators
+    futures : list of distributed.Future
+        Accumulators to merge, e.g. from ``client.map(processor, chunks)``
+    fan_in : int, default 8
+        Number of accumulators merged by one task
+    sample_interval : str, default "500ms"
+        How often worker memory is sampled during the merge
+    gather : bool, default True
+        Return the merged accumulator instead of its future
+
+    Returns
+    -------
+    result, ReductionReport
+    """
+    if fan_in < 2:
+        raise ValueError(f"fan_in must be at least 2, got {fan_in}")
+    futures = list(futures)
+    if not futures:
+        raise ValueError("Nothing to reduce")
+    wait(futures)
+
+    token = uuid.uuid4().hex[:8]
+    levels = merges = 0
+    sampler = _MemorySampler(client, parse_timedelta(sample_interval))
+    start = time.time()
+    with sampler:
+        layer = futures
+        while len(layer) > 1:
+            layer = [
+                client.submit(merge, *layer[i:i + fan_in], pure=False,
+                              key=f"coffea-casa-merge-{token}-{levels}-{i // fan_in}")
+                for i in range(0, len(layer), fan_in)
+            ]
+            merges += len(layer)
+            levels += 1
+        result, = layer
+        wait(result)
+        if gather:
+            result = result.result()
+    wall_time = time.time() - start
+
+    report = ReductionReport(len(futures), fan_in, levels, merges, wall_time,
+                             sampler.peak_worker, sampler.peak_total)
+    return result, report
@@ -0,0 +1,69 @@
+"""Bulk removal of HTCondor worker jobs
+
+dask-jobqueue removes each job with its own ``condor_rm``, run on the event
+loop: closing a cluster of 200 workers takes minutes and costs the schedd
+one transaction per job. Here the jobs of a scale-down are removed with one
+``condor_rm`` listing all of their ids, and all the jobs of a cluster with
+one ``condor_rm -constraint`` on the ``CoffeaCasaClusterId`` attribute that
+``CoffeaCasaCluster`` sets on its jobs.
+"""
+import logging
+import shlex
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_ID_ATTRIBUTE = "CoffeaCasaClusterId"
+
+# Job ids per condor_rm call, well below the argument length limits
+MAX_JOB_IDS = 1000
+
+
+def cluster_constraint(cluster_id):
+    """Return the constraint matching the jobs of the cluster ``cluster_id``"""
+    return f'{CLUSTER_ID_ATTRIBUTE} == "{cluster_id}"'
+
+
+def removal_commands(job_ids=(), *, constraint=None, cancel_command="condor_rm"):
+    """Return the ``condor_rm`` command lines removing ``job_ids`` or ``constraint``"""
+    command = shlex.split(cancel_command)
+    if constraint is not None:
+        return [command + ["-constraint", constraint]]
+    job_ids = list(dict.fromkeys(job_ids))
+    return [command + job_ids[i:i + MAX_JOB_IDS]
+            for i in range(0, len(job_ids), MAX_JOB_IDS)]
+
+
+def remove_jobs(job_ids=(), *, constraint=None, cancel_command="condor_rm", wait=True):
+    """Remove ``job_ids``, or the jobs matching ``constraint``, in bulk
+
+    The ``condor_rm`` calls run concurrently. With ``wait=False`` they are
+    left running in their own session, so that they outlive the caller (e.g.
+    a notebook kernel being shut down).
+
+    Returns
+    -------
+    bool
+        Whether all calls succeeded; ``None`` when not waited for
+    """
+    procs = []
+    output = subprocess.PIPE if wait else subprocess.DEVNULL
+    for cmd in removal_commands(job_ids, constraint=constraint, cancel_command=cancel_command):
+        logger.debug("Executing the following command to command line\n%s", " ".join(cmd))
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=output,
+                                    stderr=output, text=True, start_new_session=not wait)
+        except OSError as e:
+            logger.warning("Could not remove HTCondor jobs: %s", e)
+            return False
+        procs.append((cmd, proc))
+    if not wait:
+        return None
+    ok = True
+    for cmd, proc in procs:
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+            # condor_rm also fails when some of the jobs are already gone
+            logger.debug("%s exited with %d:\n%s%s", cmd[0], proc.returncode, out, err)
+            ok = False
+    return ok
@@ -0,0 +1,175 @@
+"""Dask scheduler in a separate process of the notebook pod
+
+By default the scheduler of ``CoffeaCasaCluster`` runs in the event loop of
+the Jupyter kernel, so that heavy work in the notebook (plotting, merging
+outputs) delays worker heartbeats and task assignment. With
+``CoffeaCasaCluster(scheduler_process=True)`` the scheduler runs in its own
+process instead, with the same ports, contact address and TLS material, and
+the cluster object talks to it over the Dask comms.
+
+The child inherits the Dask config of the kernel (including settings made
+with ``dask.config.set``) and exits when the kernel goes away.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import dask
+from dask.utils import parse_timedelta
+from distributed.core import Status
+from distributed.deploy.spec import ProcessInterface
+
+logger = logging.getLogger(__name__)
+
+_CHILD = "import sys; from coffea_casa.scheduler_process import main; sys.exit(main())"
+
+# How often the child checks that the kernel which started it is alive
+PARENT_CHECK_INTERVAL = 5
+
+
+class SchedulerProcess(ProcessInterface):
+    """``SpecCluster`` scheduler running in a child process
+
+    Takes the keyword arguments of ``distributed.Scheduler``; they must be
+    JSON serializable, except ``security`` whose TLS files are passed on.
+
+    Parameters
+    ----------
+    start_timeout : str, default "60s"
+        Time the scheduler gets to start listening
+    """
+    def __init__(self, *, security=None, start_timeout="60s", **options):
+        self.security = security
+        self.options = {k: v for k, v in options.items() if v is not None}
+        self.start_timeout = parse_timedelta(start_timeout)
+        self.process = None
+        self.contact_address = options.get("contact_address")
+        self._tmpdir = None
+        super().__init__()
+
+    def _tls_options(self):
+        """Return the TLS files of the scheduler, writing in-memory PEM to files"""
+        if self.security is None:
+            return {}
+        tls = self.security.get_tls_config_for_role("scheduler")
+        out = {"require_encryption": bool(self.security.require_encryption)}
+        for key in ("ca_file", "cert", "key"):
+            value = tls.get(key)
+            if value and value.lstrip().startswith("-----BEGIN"):
+                path = Path(self._tmpdir.name) / f"{key}.pem"
+                path.write_text(value)
+                path.chmod(0o600)
+                value = str(path)
+            if value:
+                out[key] = value
+        return out
+
+    def spec(self, scheduler_file):
+        """Return the JSON spec passed to the child"""
+        spec = {"options": self.options, "tls": self._tls_options(),
+                "scheduler_file": str(scheduler_file), "parent": os.getpid()}
+        try:
+            return json.dumps(spec)
+        except TypeError as e:
+            raise TypeError(
+                f"Scheduler options must be JSON serializable to run the scheduler "
+                f"in a separate process: {e}"
+            ) from None
+
+    async def start(self):
+        self._tmpdir = tempfile.TemporaryDirectory(prefix="coffea-casa-scheduler-")
+        scheduler_file = Path(self._tmpdir.name) / "scheduler.json"
+        try:
+            spec = self.spec(scheduler_file)
+        except TypeError:
+            await self.close()
+            raise
+        env = dict(os.environ)
+        env["DASK_INTERNAL_INHERIT_CONFIG"] = dask.config.serialize(dask.config.global_config)
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", _CHILD, spec], env=env, start_new_session=True)
+
+        deadline = time.monotonic() + self.start_timeout
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError(
+                    f"Scheduler process exited with code {self.process.returncode}")
+            try:
+                self.address = json.loads(scheduler_file.read_text())["address"]
+                break
+            except (OSError, ValueError, KeyError):
+                pass
+            if time.monotonic() > deadline:
+                await self.close()
+                raise RuntimeError(
+                    f"Scheduler process did not start within {self.start_timeout}s")
+            await asyncio.sleep(0.1)
+        logger.info("Scheduler process %d listening at %s", self.process.pid, self.address)
+        await super().start()
+
+    async def close(self):
+        """Stop the child, which was normally terminated through its comm"""
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            deadline = time.monotonic() + 10
+            while self.process.poll() is None and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+            if self.process.poll() is None:
+                self.process.kill()
+                self.process.wait()
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
+            self._tmpdir = None
+        await super().close()
+
+    def __repr__(self):
+        pid = self.process.pid if self.process is not None else None
+        return f"<{type(self).__name__}: {self.address}, pid={pid}, status={self.status.name}>"
+
+
+async def _run(spec):
+    from distributed import Scheduler
+
+    from .tls import CoffeaCasaSecurity
+
+    tls = spec["tls"]
+    security = None
+    if tls:
+        security = CoffeaCasaSecurity(
+            tls_ca_file=tls.get("ca_file"),
+            tls_scheduler_cert=tls.get("cert"),
+            tls_scheduler_key=tls.get("key"),
+            require_encryption=tls.get("require_encryption", False),
+        )
+    parent = spec["parent"]
+    async with Scheduler(security=security, scheduler_file=spec["scheduler_file"],
+                         **spec["options"]) as scheduler:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, lambda: asyncio.ensure_future(scheduler.close()))
+
+        async def watch_parent():
+            # Do not outlive the kernel: its jobs would keep the pod busy
+            while scheduler.status not in (Status.closing, Status.closed):
+                if os.getppid() != parent:
+                    logger.warning("Kernel process %d is gone, closing scheduler", parent)
+                    await scheduler.close()
+                    return
+                await asyncio.sleep(PARENT_CHECK_INTERVAL)
+
+        watcher = asyncio.ensure_future(watch_parent())
+        await scheduler.finished()
+        watcher.cancel()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    asyncio.run(_run(json.loads(argv[0])))
+    return 0
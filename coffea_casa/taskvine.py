@@ -0,0 +1,317 @@
+"""CoffeaCasaVineCluster class: TaskVine workers submitted to HTCondor
+
+TaskVine workers transfer files peer-to-peer and cache them on the execute
+node, which matters for large reductions. The workers run in the same
+analysis image as the Dask workers; the image entrypoint starts
+``vine_worker`` instead of ``dask worker`` when the job ClassAd has
+``CoffeaCasaWorkerType = "taskvine"`` (see ``worker-args.sh``).
+"""
+import argparse
+import logging
+import math
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import uuid
+
+import dask
+from dask.utils import parse_bytes, parse_timedelta, tmpfile
+
+from .coffea_casa import CERT_FILE, KEY_FILE, CoffeaCasaCluster, merge_dicts
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANAGER_PORT = 8786
+
+# HTCondor JobStatus values
+JOB_IDLE = 1
+JOB_RUNNING = 2
+JOB_HELD = 5
+
+
+class CoffeaCasaVineCluster:
+    """
+    TaskVine workers on HTCondor in CMS facilities.
+
+    Exposes the same ``scale``/``adapt``/``close`` API as
+    ``CoffeaCasaCluster``. Workers are submitted in batches (one
+    ``condor_submit`` with ``queue N`` per batch) and tagged with
+    ``+CoffeaCasaVineCluster`` so that they can be queried and removed with a
+    single HTCondor call.
+
+    Examples
+    --------
+    >>> cluster = CoffeaCasaVineCluster()  # doctest: +SKIP
+    >>> cluster.adapt(maximum=200)  # doctest: +SKIP
+    >>> dask.compute(out, scheduler=cluster.manager.get)  # doctest: +SKIP
+    """
+    config_name = "coffea-casa"
+    submit_command = "condor_submit -spool"
+    cancel_command = "condor_rm"
+    query_command = "condor_q"
+
+    def __init__(self,
+                 *,
+                 manager=None,
+                 port=DEFAULT_MANAGER_PORT,
+                 cores=None,
+                 memory=None,
+                 disk=None,
+                 batch_size=50,
+                 worker_timeout="5m",
+                 security=None,
+                 force_tcp=False,
+                 worker_image=None,
+                 **job_kwargs):
+        """
+        Parameters
+        ----------
+        manager : ndcctools.taskvine.Manager or str, optional
+            TaskVine manager the workers connect to. A ``DaskVine`` manager
+            listening on ``port`` is created if not given. A ``"host:port"``
+            string submits workers for an external manager (no ``adapt``).
+        port : int, default 8786
+            Port of the manager created when ``manager`` is not given
+        cores, memory, disk : optional
+            Resources per worker; default to the ``jobqueue.coffea-casa``
+            config
+        batch_size : int, default 50
+            Maximum number of workers submitted per ``condor_submit`` call
+        worker_timeout : str, default "5m"
+            Workers exit after being idle (or disconnected) this long
+        security : distributed.Security, optional
+            Security object providing the TLS material shipped to workers
+        force_tcp : bool, default False
+            Do not use SSL between the manager and the workers
+        worker_image : str, optional
+            Docker image for workers
+        **job_kwargs
+            ``job_extra_directives`` merged into the HTCondor submit file
+        """
+        self.name = f"vine-{uuid.uuid4().hex[:10]}"
+        self.cores = cores or self._config("cores", 1)
+        self.memory = parse_bytes(memory or self._config("memory", "4GiB"))
+        self.disk = parse_bytes(disk or self._config("disk", "2GiB"))
+        self.batch_size = batch_size
+        self.worker_timeout = parse_timedelta(worker_timeout)
+
+        job_config = CoffeaCasaCluster._modify_job_kwargs(
+            job_kwargs,
+            security=security,
+            force_tcp=force_tcp,
+            worker_image=worker_image,
+            scheduler_port=port,
+            dashboard_port=None,
+            drain_timeout=0,
+        )
+        self.ssl = job_config["protocol"] == "tls://"
+
+        if manager is None:
+            manager = self._create_manager(port)
+        if isinstance(manager, str):
+            self.manager = None
+            host, _, port = manager.rpartition(":")
+        else:
+            self.manager = manager
+            port = manager.port
+
+        directives = job_config["job_extra_directives"]
+        if isinstance(manager, str) and host:
+            directives["+DaskSchedulerAddress"] = f'"{job_config["protocol"]}{host}:{port}"'
+        else:
+            directives["+DaskSchedulerAddress"] = re.sub(
+                r":\d+\"$", f':{port}"', directives["+DaskSchedulerAddress"])
+
+        self.job_extra_directives = merge_dicts(
+            directives,
+            {
+                "+CoffeaCasaWorkerType": '"taskvine"',
+                "+CoffeaCasaVineCluster": f'"{self.name}"',
+                "+CoffeaCasaVineTimeout": int(self.worker_timeout),
+                "+DaskWorkerCores": self.cores,
+                "+JobMaxSuspendTime": 0,
+                "request_cpus": self.cores,
+                "request_memory": self.memory // 2**20,
+                "request_disk": self.disk // 2**10,
+            },
+        )
+
+        self._adapt_thread = None
+        self._adapt_stop = threading.Event()
+
+    @classmethod
+    def _config(cls, key, default=None):
+        return dask.config.get(f"jobqueue.{cls.config_name}.{key}", default)
+
+    def _create_manager(self, port):
+        try:
+            from ndcctools.taskvine import DaskVine
+        except ImportError as e:
+            raise ImportError(
+                "CoffeaCasaVineCluster needs TaskVine: "
+                "conda install -c conda-forge ndcctools"
+            ) from e
+
+        ssl = None
+        if self.ssl:
+            ssl = (str(KEY_FILE if KEY_FILE.is_file() else CERT_FILE), str(CERT_FILE))
+        return DaskVine(port=port, name=self.name, ssl=ssl)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name!r}: {len(self.jobs())} jobs>"
+
+    def job_script(self, n=1):
+        """Return the HTCondor submit file used to submit ``n`` workers"""
+        header = "\n".join(f"{k} = {v}" for k, v in self.job_extra_directives.items())
+        return (
+            f"{header}\n"
+            "executable = /bin/echo\n"
+            'arguments = "worker command built by prepare-env-cc-analysis.sh"\n'
+            f"queue {n}\n"
+        )
+
+    @staticmethod
+    def _call(cmd):
+        logger.debug("Executing the following command to command line\n%s", " ".join(cmd))
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(
+                "Command exited with non-zero exit code.\n"
+                f"Exit code: {proc.returncode}\n"
+                f"Command:\n{' '.join(cmd)}\n"
+                f"stdout:\n{proc.stdout}\n"
+                f"stderr:\n{proc.stderr}\n"
+            )
+        return proc.stdout
+
+    @property
+    def _constraint(self):
+        return f'CoffeaCasaVineCluster == "{self.name}"'
+
+    def _submit(self, n):
+        """Submit ``n`` workers, in batches of at most ``batch_size``"""
+        job_ids = []
+        while n > 0:
+            batch = min(n, self.batch_size)
+            with tmpfile(extension="sub") as fn:
+                with open(fn, "w") as f:
+                    f.write(self.job_script(batch))
+                out = self._call(shlex.split(self.submit_command) + [fn])
+            match = re.search(r"submitted to cluster (\d+)", out)
+            if match is None:
+                raise ValueError(f"Could not parse cluster id from:\n{out}")
+            job_ids += [f"{match.group(1)}.{i}" for i in range(batch)]
+            n -= batch
+        logger.info("Submitted %d TaskVine worker(s)", len(job_ids))
+        return job_ids
+
+    def jobs(self):
+        """Return ``{job_id: JobStatus}`` of this cluster's queued workers"""
+        out = self._call(
+            [self.query_command, "-constraint", self._constraint,
+             "-af", "ClusterId", "ProcId", "JobStatus"]
+        )
+        jobs = {}
+        for line in out.splitlines():
+            fields = line.split()
+            if len(fields) == 3:
+                jobs[f"{fields[0]}.{fields[1]}"] = int(fields[2])
+        return jobs
+
+    def scale(self, n):
+        """Scale to ``n`` idle or running worker jobs"""
+        jobs = {j: s for j, s in self.jobs().items() if s in (JOB_IDLE, JOB_RUNNING)}
+        if n > len(jobs):
+            self._submit(n - len(jobs))
+        elif n < len(jobs):
+            # Idle jobs first, newest first: they have not started yet
+            surplus = sorted(
+                jobs,
+                key=lambda j: (jobs[j] != JOB_IDLE, [-int(x) for x in j.split(".")]),
+            )[:len(jobs) - n]
+            self._call([self.cancel_command] + surplus)
+
+    def _adaptive_target(self, minimum, maximum):
+        stats = self.manager.stats
+        tasks = stats.tasks_waiting + stats.tasks_on_workers
+        target = math.ceil(tasks / self.cores)
+        return max(minimum, min(maximum, target))
+
+    def adapt(self, minimum=0, maximum=math.inf, interval="5s", wait_count=3):
+        """Scale with the manager's waiting and running task count
+
+        Scale-up is immediate; a scale-down is only applied after the lower
+        target was seen for ``wait_count`` consecutive intervals.
+        """
+        if self.manager is None:
+            raise ValueError("adapt() needs a TaskVine manager, not an address")
+        self.stop_adapt()
+        interval = parse_timedelta(interval)
+        self._adapt_stop.clear()
+
+        def loop():
+            current, lower = None, 0
+            while not self._adapt_stop.wait(interval):
+                try:
+                    target = self._adaptive_target(minimum, maximum)
+                    if current is None or target >= current:
+                        lower = 0
+                    else:
+                        lower += 1
+                        if lower < wait_count:
+                            continue
+                    if target != current:
+                        self.scale(target)
+                    current, lower = target, 0
+                except Exception as e:
+                    logger.warning("TaskVine adaptive scaling failed: %s", e)
+
+        self._adapt_thread = threading.Thread(target=loop, name=f"{self.name}-adapt", daemon=True)
+        self._adapt_thread.start()
+
+    def stop_adapt(self):
+        if self._adapt_thread is not None:
+            self._adapt_stop.set()
+            self._adapt_thread.join()
+            self._adapt_thread = None
+
+    def close(self):
+        """Remove all of this cluster's worker jobs with a single call"""
+        self.stop_adapt()
+        try:
+            self._call([self.cancel_command, "-constraint", self._constraint])
+        except RuntimeError as e:
+            # condor_rm fails when there is nothing left to remove
+            logger.debug("%s", e)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main(argv=None):
+    """Submit TaskVine workers for an already running manager"""
+    parser = argparse.ArgumentParser(prog="python -m coffea_casa.taskvine")
+    parser.add_argument("workers", type=int, nargs="?", default=1)
+    parser.add_argument("--manager", required=True, help="Manager address, host:port")
+    parser.add_argument("--cores", type=int, default=None)
+    parser.add_argument("--memory", default=None)
+    parser.add_argument("--disk", default=None)
+    parser.add_argument("--worker-image", default=None)
+    args = parser.parse_args(argv)
+
+    cluster = CoffeaCasaVineCluster(
+        manager=args.manager, cores=args.cores, memory=args.memory,
+        disk=args.disk, worker_image=args.worker_image,
+    )
+    cluster.scale(args.workers)
+    print(f"Submitted {args.workers} worker(s) as {cluster.name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""TLS session resumption for Dask connections
+
+Every new connection between workers, and between workers and the scheduler,
+normally performs a full TLS handshake with certificate verification on both
+sides. Servers already hand out TLS session tickets; this module makes the
+connecting side reuse them, so that reconnecting to a known peer costs an
+abbreviated handshake:
+
+- ``CoffeaCasaSecurity`` (returned by ``security_obj()``) enables resumption
+  for the scheduler and the client in the notebook;
+- workers load this module as a preload (``--preload coffea_casa.tls``),
+  which enables it for their outgoing connections.
+"""
+import logging
+import ssl
+import threading
+import weakref
+
+from distributed.security import Security
+
+logger = logging.getLogger(__name__)
+
+# {context: {peer: latest resumable session}}
+_sessions = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+class ResumingSSLSocket(ssl.SSLSocket):
+    """Client socket offering the latest session ticket of its peer"""
+
+    _resume_peer = None
+    _ticket_saved = False
+
+    def do_handshake(self, block=False):
+        if not self.server_side and self._resume_peer is None:
+            try:
+                self._resume_peer = self.getpeername()[:2]
+            except OSError:
+                self._resume_peer = ()
+            session = _session_for(self.context, self._resume_peer)
+            if session is not None:
+                self.session = session
+        return super().do_handshake(block)
+
+    def read(self, len=1024, buffer=None):
+        data = super().read(len, buffer)
+        # TLS 1.3 tickets arrive after the handshake, with the first records
+        if self._resume_peer and not self._ticket_saved:
+            session = self.session
+            if session is not None and session.has_ticket:
+                with _lock:
+                    _sessions.setdefault(self.context, {})[self._resume_peer] = session
+                self._ticket_saved = True
+        return data
+
+
+def _session_for(context, peer):
+    """Return a resumable session for ``peer``, if one was seen"""
+    with _lock:
+        return _sessions.get(context, {}).get(peer)
+
+
+def enable_session_resumption(context):
+    """Make ``context`` issue session tickets and reuse them when connecting
+
+    The context is modified in place, so that every component sharing it
+    (e.g. a worker's connection pool) benefits.
+    """
+    if context is None:
+        return context
+    context.options &= ~ssl.OP_NO_TICKET
+    if context.protocol == ssl.PROTOCOL_TLS_SERVER:
+        # Server contexts issue tickets (client contexts raise on this)
+        context.num_tickets = max(context.num_tickets, 2)
+    context.sslsocket_class = ResumingSSLSocket
+    return context
+
+
+class CoffeaCasaSecurity(Security):
+    """``distributed.Security`` whose TLS contexts resume sessions"""
+
+    def get_connection_args(self, role):
+        args = super().get_connection_args(role)
+        enable_session_resumption(args.get("ssl_context"))
+        return args
+
+    def get_listen_args(self, role):
+        args = super().get_listen_args(role)
+        enable_session_resumption(args.get("ssl_context"))
+        return args
+
+
+def dask_setup(worker):
+    """Worker preload: resume TLS sessions on outgoing connections"""
+    enable_session_resumption(worker.connection_args.get("ssl_context"))
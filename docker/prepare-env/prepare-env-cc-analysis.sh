@@ -10,6 +10,12 @@ source "$SCRIPT_DIR/worker-args.sh" || {
     exit 1
 }
 
+# Pull job of coffea_casa.image_warming: starting the container was the point
+if [ -n "${_CONDOR_JOB_AD:-}" ] && [ "$(cc_worker_type "$_CONDOR_JOB_AD")" = "warm" ]; then
+    echo "Worker image $(ad_get "$_CONDOR_JOB_AD" CoffeaCasaWarmDigest) is on $(hostname)"
+    exit 0
+fi
+
 ########################################
 # Conda init
 ########################################
@@ -44,19 +50,20 @@ if [[ ! -v COFFEA_CASA_SIDECAR ]]; then
         # worker-args.sh, which is sourced above. If the port never becomes
         # defined (e.g. host-networked node), we proceed anyway and
         # cc_build_worker_command falls back to the container port.
+        # Pilot jobs (DaskWorkerProcesses > 1) wait for the ports of all
+        # of their workers.
         echo "Waiting for a defined dask_HostPort / nanny_HostPort (up to 30s)..."
+        _ports=1
         for _i in $(seq 1 30); do
-            _dh=$(ad_get "$_CONDOR_JOB_AD" dask_HostPort)
-            _nh=$(ad_get "$_CONDOR_JOB_AD" nanny_HostPort)
-            if [ -n "$_dh" ] && [ "$_dh" != "undefined" ] \
-               && [ -n "$_nh" ] && [ "$_nh" != "undefined" ]; then
-                echo "Got dask_HostPort=$_dh nanny_HostPort=$_nh, proceeding..."
+            if cc_worker_ports_defined "$_CONDOR_JOB_AD"; then
+                echo "Got dask_HostPort=$(ad_get "$_CONDOR_JOB_AD" dask_HostPort)" \
+                     "nanny_HostPort=$(ad_get "$_CONDOR_JOB_AD" nanny_HostPort), proceeding..."
+                _ports=0
                 break
             fi
             sleep 1
         done
-        if [ -z "$_dh" ] || [ "$_dh" = "undefined" ] \
-           || [ -z "$_nh" ] || [ "$_nh" = "undefined" ]; then
+        if [ "$_ports" != 0 ]; then
             echo "WARNING: dask_HostPort/nanny_HostPort still undefined after 30s;" \
                  "falling back to the container port (host-networked node?)." 1>&2
         fi
@@ -124,9 +131,49 @@ if [[ ! -v COFFEA_CASA_SIDECAR ]]; then
             exit 1
         fi
 
-        HTCONDOR_COMMAND=$(cc_build_worker_command "$_CONDOR_JOB_AD" "$@")
-        echo "$HTCONDOR_COMMAND" 1>&2
-        exec $HTCONDOR_COMMAND
+        PROCESSES=$(cc_worker_processes "$_CONDOR_JOB_AD")
+        DRAIN_TIMEOUT=$(cc_worker_drain_timeout "$_CONDOR_JOB_AD")
+        if [ "$PROCESSES" = 1 ] && [ -z "$DRAIN_TIMEOUT" ]; then
+            HTCONDOR_COMMAND=$(cc_build_worker_command "$_CONDOR_JOB_AD")
+            echo "$HTCONDOR_COMMAND" 1>&2
+            exec $HTCONDOR_COMMAND
+        fi
+
+        # Keep the launcher in the foreground: it hosts the workers of a pilot
+        # job and traps HTCondor's soft-kill signal.
+        WORKER_PIDS=()
+        for ((_w = 0; _w < PROCESSES; _w++)); do
+            HTCONDOR_COMMAND=$(cc_build_worker_command "$_CONDOR_JOB_AD" "$_w")
+            echo "$HTCONDOR_COMMAND" 1>&2
+            $HTCONDOR_COMMAND &
+            WORKER_PIDS+=($!)
+        done
+        if [ -n "$DRAIN_TIMEOUT" ]; then
+            # Graceful drain: retire the workers through the scheduler
+            # (replicating their keys to peers) and only then stop them.
+            DRAIN_COMMAND=$(cc_build_drain_command "$_CONDOR_JOB_AD" "$DRAIN_TIMEOUT")
+            _cc_drain() {
+                trap - TERM INT
+                echo "Soft-kill received, draining workers: $DRAIN_COMMAND" 1>&2
+                timeout "$DRAIN_TIMEOUT" $DRAIN_COMMAND
+                kill -TERM "${WORKER_PIDS[@]}" 2>/dev/null
+            }
+            trap _cc_drain TERM INT
+        else
+            trap 'kill -TERM "${WORKER_PIDS[@]}" 2>/dev/null' TERM INT
+        fi
+        # `wait` returns early when a trapped signal arrives; keep waiting
+        # until every worker has actually exited.
+        WORKER_RC=0
+        for _pid in "${WORKER_PIDS[@]}"; do
+            _rc=0
+            while kill -0 "$_pid" 2>/dev/null; do
+                wait "$_pid"
+                _rc=$?
+            done
+            [ "$_rc" -ne 0 ] && WORKER_RC=$_rc
+        done
+        exit $WORKER_RC
     fi
 else
     exec "$@"
@@ -1,20 +1,257 @@
+"""Opt-in continuous profiling of the Python processes of the image
+
+This module runs at the start of every Python process of the image: Jupyter
+kernels, Dask workers, but also every ``pip`` call and short command line
+tool. It therefore does nothing but classify the process from its command
+line, and only processes selected by the policy are profiled, a few seconds
+after they start, from a background thread:
+
+- ``PYROSCOPE_PROFILE``: comma separated kinds of processes to profile,
+  among ``server`` (Jupyter server), ``kernel``, ``scheduler``, ``worker``
+  and ``other``, or ``all``/``none`` (default ``server,kernel``);
+- ``PYROSCOPE_SAMPLE_RATE``: samples per second (default 100);
+- ``PYROSCOPE_START_DELAY``: seconds before profiling starts (default 10), so
+  that processes exiting before then pay nothing;
+- ``PYROSCOPE_SERVER_ADDRESS``: the Pyroscope server;
+- ``PYROSCOPE_SINK_DIR``: directory where the folded stacks of the process
+  are written when the server cannot be reached or pyroscope is not
+  installed (empty by default: without a server, nothing is profiled). This
+  pure-Python sampler holds the GIL while it walks the stacks, so prefer a
+  low ``PYROSCOPE_SAMPLE_RATE`` with it.
+
+The cost of this module at interpreter start is kept in ``STARTUP_SECONDS``.
+"""
 import os
-import socket
+import sys
+import time
 
-try:
+_start = time.perf_counter()
+
+DEFAULT_PROFILE = "server,kernel"
+DEFAULT_SERVER = "http://pyroscope.monitoring.svc.cluster.local:4040"
+KINDS = ("server", "kernel", "scheduler", "worker", "other")
+
+# Distinct stacks kept by FileSink, later ones are counted together
+MAX_STACKS = 10000
+OTHER_STACKS = "(other stacks)"
+
+# Program markers of each kind of process, first match wins
+_MARKERS = (
+    ("kernel", ("ipykernel",)),
+    ("server", ("jupyterhub-singleuser", "jupyter-lab", "jupyter-server",
+                "jupyter-notebook", "jupyter_server")),
+    ("scheduler", ("dask-scheduler", "dask scheduler", "scheduler_process")),
+    ("worker", ("dask-worker", "dask worker", "dask_worker", "dask-spec", "dask spec",
+                "coffea_casa.preemption")),
+)
+
+# Leaf frames of threads waiting, not running (as pyroscope's gil_only)
+_IDLE = {"wait (threading.py)", "select (selectors.py)", "_worker (thread.py)",
+         "get (queue.py)", "accept (socket.py)", "run_forever (base_events.py)"}
+
+
+def _program(argv):
+    """Return the module, code or script run by the interpreter ``argv``"""
+    args = iter(argv[1:])
+    for arg in args:
+        if arg in ("-m", "-c"):
+            return next(args, "")
+        if arg in ("-W", "-X"):
+            next(args, None)
+        elif not arg.startswith("-"):
+            # Scripts, with the subcommand of e.g. "dask worker"
+            return " ".join([os.path.basename(arg)] + [next(args, "")]).strip()
+    return ""
+
+
+def _argv():
+    """Return the command line of the interpreter"""
+    if hasattr(sys, "orig_argv"):
+        return sys.orig_argv
+    # Python < 3.10: sys.argv is not set up yet for "-m" at this point
+    try:
+        with open("/proc/self/cmdline", "rb") as f:
+            return [arg.decode(errors="replace") for arg in f.read().split(b"\0") if arg]
+    except OSError:
+        return [sys.executable] + sys.argv
+
+
+def process_kind(argv=None, environ=os.environ):
+    """Return the kind of this process, from its command line"""
+    argv = _argv() if argv is None else argv
+    if "--multiprocessing-fork" in argv:
+        # Worker processes of a nanny, pools of a kernel
+        return environ.get("PYROSCOPE_PROCESS_KIND", "other")
+    program = _program(argv)
+    for kind, markers in _MARKERS:
+        if any(marker in program for marker in markers):
+            return kind
+    return "other"
+
+
+def policy(environ=os.environ):
+    """Return the kinds of processes to profile and the sample rate"""
+    kinds = {k.strip() for k in environ.get("PYROSCOPE_PROFILE", DEFAULT_PROFILE).split(",")}
+    if "all" in kinds:
+        kinds = set(KINDS)
+    try:
+        rate = int(environ.get("PYROSCOPE_SAMPLE_RATE", 100))
+    except ValueError:
+        rate = 100
+    return kinds & set(KINDS), max(rate, 1)
+
+
+def _reachable(address, timeout=1.0):
+    """Return whether the server at ``address`` accepts connections"""
+    import socket
+    from urllib.parse import urlsplit
+
+    url = urlsplit(address)
+    port = url.port or (443 if url.scheme == "https" else 80)
+    try:
+        socket.create_connection((url.hostname, port), timeout=timeout).close()
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def _tags(kind):
+    import socket
+
+    return {
+        "user": os.getenv("JUPYTERHUB_USER", "unknown"),
+        "pod": socket.gethostname(),
+        "namespace": os.getenv("NAMESPACE", "default"),
+        "process": kind,
+    }
+
+
+def _start_pyroscope(kind, rate, address):
     import pyroscope
 
     pyroscope.configure(
-        application_name="jupyter.singleuser",
-        server_address=os.getenv("PYROSCOPE_SERVER_ADDRESS", "http://pyroscope.monitoring.svc.cluster.local:4040"),
-        sample_rate=100,
+        application_name="jupyter.singleuser" if kind in ("server", "kernel") else f"dask.{kind}",
+        server_address=address,
+        sample_rate=rate,
         oncpu=True,
         gil_only=True,
-        tags={
-            "user": os.getenv("JUPYTERHUB_USER", "unknown"),
-            "pod": socket.gethostname(),
-            "namespace": os.getenv("NAMESPACE", "default"),
-        },
+        tags=_tags(kind),
     )
+
+
+class FileSink:
+    """Sample the threads of this process into a file of folded stacks
+
+    The file is rewritten every ``flush_interval`` seconds and at exit, in
+    the format of ``coffea_casa.profiling`` (one ``root;...;leaf count``
+    line per stack). Past ``max_stacks`` distinct stacks, new ones are
+    counted as ``OTHER_STACKS``.
+    """
+    def __init__(self, path, rate, flush_interval=60, max_stacks=MAX_STACKS):
+        self.path = path
+        self.interval = 1 / rate
+        self.flush_interval = flush_interval
+        self.max_stacks = max_stacks
+        self.stacks = {}
+        self._stop = False
+
+    def sample(self, own_ident=None):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                frame = frame.f_back
+            if names and names[0] not in _IDLE:
+                stack = ";".join(reversed(names))
+                if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+                    stack = OTHER_STACKS
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def flush(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            for stack, count in sorted(self.stacks.items(), key=lambda s: -s[1]):
+                f.write(f"{stack} {count}\n")
+        os.replace(tmp, self.path)
+
+    def run(self):
+        import threading
+
+        own = threading.get_ident()
+        next_flush = time.monotonic() + self.flush_interval
+        while not self._stop:
+            self.sample(own)
+            if time.monotonic() >= next_flush:
+                self.flush()
+                next_flush += self.flush_interval
+            time.sleep(self.interval)
+
+    def close(self):
+        self._stop = True
+        if self.stacks:
+            self.flush()
+
+
+def _start_file_sink(kind, rate, directory):
+    import atexit
+    import threading
+
+    os.makedirs(directory, exist_ok=True)
+    sink = FileSink(os.path.join(directory, f"{kind}-{os.getpid()}.folded"), rate)
+    atexit.register(sink.close)
+    threading.Thread(target=sink.run, name="pyroscope-file-sink", daemon=True).start()
+    return sink
+
+
+def activate(kind, rate, environ=os.environ):
+    """Start profiling this process; return where the samples go"""
+    address = environ.get("PYROSCOPE_SERVER_ADDRESS", DEFAULT_SERVER)
+    reason = "server unreachable"
+    if _reachable(address):
+        try:
+            _start_pyroscope(kind, rate, address)
+            return address
+        except Exception as e:
+            reason = str(e)
+    directory = environ.get("PYROSCOPE_SINK_DIR", "")
+    if not directory:
+        return None
+    _start_file_sink(kind, rate, directory)
+    print(f"[pyroscope] {reason}, writing samples to {directory}", file=sys.stderr)
+    return directory
+
+
+def _bootstrap():
+    kind = process_kind()
+    kinds, rate = policy()
+    if kind not in kinds:
+        return
+    import threading
+
+    # Inherited by multiprocessing children only, see process_kind
+    os.environ.setdefault("PYROSCOPE_PROCESS_KIND", kind)
+    try:
+        delay = float(os.environ.get("PYROSCOPE_START_DELAY", 10))
+    except ValueError:
+        delay = 10.0
+
+    def start():
+        try:
+            activate(kind, rate)
+        except Exception as e:
+            print(f"[pyroscope] skipped: {e}", file=sys.stderr)
+
+    timer = threading.Timer(delay, start)
+    timer.daemon = True
+    timer.start()
+
+
+try:
+    _bootstrap()
 except Exception as e:
-    print(f"[pyroscope] skipped: {e}")
\ No newline at end of file
+    print(f"[pyroscope] skipped: {e}", file=sys.stderr)
+
+STARTUP_SECONDS = time.perf_counter() - _start
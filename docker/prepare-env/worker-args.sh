@@ -15,17 +15,85 @@ _is_unset() { [ -z "$1" ] || [ "$1" = "undefined" ]; }
 
 cc_worker_cpus() { local c; c=$(ad_get "$1" DaskWorkerCores); echo "${c:-1}"; }
 
+# Dask workers hosted by the job (CoffeaCasaCluster(processes=M)). Worker i
+# gets 1/M of the job's cores and memory and its own dask<i>/nanny<i> ports
+# (plain dask/nanny for the first one).
+cc_worker_processes() {
+    local p; p=$(ad_get "$1" DaskWorkerProcesses)
+    _is_unset "$p" && p=1
+    echo "$p"
+}
+
+_cc_service() { if [ "${2:-0}" -gt 0 ]; then echo "$1$2"; else echo "$1"; fi; }
+
+cc_worker_threads() {
+    local t; t=$(( $(cc_worker_cpus "$1") / $(cc_worker_processes "$1") ))
+    [ "$t" -lt 1 ] && t=1
+    echo "$t"
+}
+
+# Same naming as `dask worker --nworkers M`: "<name>-<i>"
 cc_worker_name() {
     local name; name=$(ad_get "$1" DaskWorkerName)
     [ -z "$name" ] && name="dask-worker-$(hostname)-$$"
+    if [ -n "${2:-}" ] && [ "$(cc_worker_processes "$1")" -gt 1 ]; then
+        name="$name-$2"
+    fi
     echo "$name"
 }
 
+cc_worker_names() {
+    local i names=""
+    for ((i = 0; i < $(cc_worker_processes "$1"); i++)); do
+        names="$names $(cc_worker_name "$1" "$i")"
+    done
+    echo "${names# }"
+}
+
 cc_worker_memory_limit() {
-    local bytes mb
+    local bytes mb p
+    p=$(cc_worker_processes "$1")
     bytes=$(ad_get "$1" DaskWorkerMemory)
-    if [ -n "$bytes" ]; then echo "$bytes"; return 0; fi
-    mb=$(ad_get "$1" RequestMemory); echo "${mb:-2048}MB"
+    if [ -n "$bytes" ]; then
+        if [ "$p" -gt 1 ]; then echo $((bytes / p)); else echo "$bytes"; fi
+        return 0
+    fi
+    mb=$(ad_get "$1" RequestMemory); echo "$(( ${mb:-2048} / p ))MB"
+}
+
+# Lifetime (seconds) after which the worker retires gracefully, and the random
+# +/- jitter dask applies on top. CoffeaCasaCluster staggers DaskWorkerLifetime
+# per job so that workers submitted together do not all retire together.
+cc_worker_lifetime() {
+    local l; l=$(ad_get "$1" DaskWorkerLifetime)
+    _is_unset "$l" && l=7200
+    echo "$l"
+}
+
+cc_worker_lifetime_stagger() {
+    local s; s=$(ad_get "$1" DaskWorkerLifetimeStagger)
+    _is_unset "$s" && s=0
+    echo "$s"
+}
+
+# Dask comm settings of the cluster's comm profile (DaskComm* attributes), as
+# an `env` prefix of the worker command; empty when the job has none.
+cc_worker_comm_env() {
+    local ad_file=$1 out="" attr var val
+    for attr in Compression:COMPRESSION ZstdLevel:ZSTD__LEVEL Shard:SHARD Offload:OFFLOAD; do
+        var=${attr#*:}
+        val=$(ad_get "$ad_file" "DaskComm${attr%%:*}")
+        _is_unset "$val" || out="$out DASK_DISTRIBUTED__COMM__${var}=${val}"
+    done
+    if [ -n "$out" ]; then echo "env${out} "; fi
+}
+
+# Dask worker resources, e.g. "coffea-casa-bigmem=1" for the jobs that retry
+# tasks which killed their workers; empty when the job has none.
+cc_worker_resources() {
+    local r; r=$(ad_get "$1" DaskWorkerResources)
+    _is_unset "$r" && r=""
+    echo "$r"
 }
 
 # Advertise the startd's IP (known-good behavior), fall back to RemoteHost host part.
@@ -38,8 +106,11 @@ cc_worker_host() {
 
 # Only the attributes the worker truly cannot start without. HostPort is optional.
 cc_worker_validate() {
-    local ad_file=$1 missing="" v val
-    for v in dask_ContainerPort nanny_ContainerPort DaskSchedulerAddress; do
+    local ad_file=$1 missing="" v val i vars="DaskSchedulerAddress"
+    for ((i = 0; i < $(cc_worker_processes "$ad_file"); i++)); do
+        vars="$vars $(_cc_service dask "$i")_ContainerPort $(_cc_service nanny "$i")_ContainerPort"
+    done
+    for v in $vars; do
         val=$(ad_get "$ad_file" "$v"); _is_unset "$val" && missing="$missing $v"
     done
     val=$(cc_worker_host "$ad_file"); _is_unset "$val" && missing="$missing host"
@@ -47,24 +118,94 @@ cc_worker_validate() {
     return 0
 }
 
-cc_build_worker_command() {
+# Whether HTCondor has filled in the forwarded port of every dask/nanny service
+cc_worker_ports_defined() {
+    local i service val
+    for ((i = 0; i < $(cc_worker_processes "$1"); i++)); do
+        for service in dask nanny; do
+            val=$(ad_get "$1" "$(_cc_service "$service" "$i")_HostPort")
+            _is_unset "$val" && return 1
+        done
+    done
+    return 0
+}
+
+# Seconds the worker gets to retire gracefully after HTCondor's soft-kill
+# signal. Empty means "no graceful drain": the launcher simply execs the worker.
+cc_worker_drain_timeout() {
+    local t; t=$(ad_get "$1" CoffeaCasaDrainTimeout)
+    { _is_unset "$t" || [ "$t" = "0" ]; } && t=""
+    echo "$t"
+}
+
+# Command run by the launcher's signal trap: asks the scheduler to retire the
+# workers of the job so their keys are replicated to peers before the hard kill.
+cc_build_drain_command() {
+    local ad_file=$1 timeout=$2
+    local names sched
+    names=$(cc_worker_names "$ad_file")
+    sched=$(ad_get "$ad_file" DaskSchedulerAddress)
+
+    echo "/opt/conda/bin/python -m coffea_casa.preemption $sched $names \
+--timeout $timeout \
+--tls-ca-file ${PATH_CA_FILE:-} \
+--tls-cert ${FILE_CERT:-} \
+--tls-key ${FILE_KEY:-}"
+}
+
+cc_worker_type() { local t; t=$(ad_get "$1" CoffeaCasaWorkerType); echo "${t:-dask}"; }
+
+# TaskVine worker (CoffeaCasaVineCluster). DaskSchedulerAddress holds the
+# manager address; a tls:// scheme means the manager expects SSL.
+cc_build_vine_worker_command() {
     local ad_file=$1
-    local name cpus mem host port nanny nannyc containerp sched
-    name=$(cc_worker_name "$ad_file")
+    local cpus mem disk sched hostport timeout ssl=""
     cpus=$(cc_worker_cpus "$ad_file")
+    mem=$(ad_get "$ad_file" RequestMemory)
+    disk=$(ad_get "$ad_file" RequestDisk)
+    sched=$(ad_get "$ad_file" DaskSchedulerAddress)
+    timeout=$(ad_get "$ad_file" CoffeaCasaVineTimeout)
+    _is_unset "$timeout" && timeout=300
+    _is_unset "$disk" && disk=8388608
+
+    case "$sched" in tls://*) ssl="--ssl " ;; esac
+    hostport=${sched#*://}
+
+    echo "/opt/conda/bin/vine_worker ${ssl}\
+--cores $cpus \
+--memory ${mem:-2048} \
+--disk $((disk / 1024)) \
+--timeout $timeout \
+${hostport%:*} ${hostport##*:}"
+}
+
+# Command of the INDEX-th (default 0) Dask worker of the job
+cc_build_worker_command() {
+    local ad_file=$1 index=${2:-0}
+    if [ "$(cc_worker_type "$ad_file")" = "taskvine" ]; then
+        cc_build_vine_worker_command "$ad_file"
+        return
+    fi
+    local name cpus mem host port nanny nannyc containerp sched lifetime stagger commenv resources
+    name=$(cc_worker_name "$ad_file" "$index")
+    cpus=$(cc_worker_threads "$ad_file")
     mem=$(cc_worker_memory_limit "$ad_file")
     host=$(cc_worker_host "$ad_file")
-    port=$(ad_get "$ad_file" dask_HostPort)
-    nanny=$(ad_get "$ad_file" nanny_HostPort)
-    nannyc=$(ad_get "$ad_file" nanny_ContainerPort)
-    containerp=$(ad_get "$ad_file" dask_ContainerPort)
+    port=$(ad_get "$ad_file" "$(_cc_service dask "$index")_HostPort")
+    nanny=$(ad_get "$ad_file" "$(_cc_service nanny "$index")_HostPort")
+    nannyc=$(ad_get "$ad_file" "$(_cc_service nanny "$index")_ContainerPort")
+    containerp=$(ad_get "$ad_file" "$(_cc_service dask "$index")_ContainerPort")
     sched=$(ad_get "$ad_file" DaskSchedulerAddress)
+    lifetime=$(cc_worker_lifetime "$ad_file")
+    stagger=$(cc_worker_lifetime_stagger "$ad_file")
+    commenv=$(cc_worker_comm_env "$ad_file")
+    resources=$(cc_worker_resources "$ad_file")
 
     # No forwarded host port -> the container port is what's reachable.
     _is_unset "$port"  && port=$containerp
     _is_unset "$nanny" && nanny=$nannyc
 
-    echo "/opt/conda/bin/python -m distributed.cli.dask_worker $sched \
+    echo "${commenv}/opt/conda/bin/python -m distributed.cli.dask_worker $sched \
 --name $name \
 --tls-ca-file ${PATH_CA_FILE:-} \
 --tls-cert ${FILE_CERT:-} \
@@ -75,8 +216,10 @@ cc_build_worker_command() {
 --nanny-port $nannyc \
 --death-timeout 60 \
 --protocol tls \
---lifetime 7200 \
+--preload coffea_casa.tls \
+--lifetime ${lifetime}s \
+--lifetime-stagger ${stagger}s \
 --listen-address tls://0.0.0.0:$containerp \
 --nanny-contact-address tls://$host:$nanny \
---contact-address tls://$host:$port"
+--contact-address tls://$host:$port${resources:+ --resources $resources}"
 }
\ No newline at end of file
@@ -3,9 +3,14 @@ from coffea.nanoevents.methods import base, vector
 from coffea.nanoevents import transforms
 
 class AGCSchema(BaseSchema):
-    def __init__(self, base_form):
-        super().__init__(base_form)
-        self._form["contents"] = self._build_collections(self._form["contents"])
+    def __init__(self, base_form, *args, **kwargs):
+        super().__init__(base_form, *args, **kwargs)
+        if "fields" in self._form:
+            # coffea >= 2023: fields and contents are parallel lists
+            output = self._build_collections(dict(zip(self._form["fields"], self._form["contents"])))
+            self._form["fields"], self._form["contents"] = list(output), list(output.values())
+        else:
+            self._form["contents"] = self._build_collections(self._form["contents"])
         
     def _build_collections(self, branch_forms):
         names = set([k.split('_')[0] for k in branch_forms.keys() if not (k.startswith('number'))])
@@ -27,8 +32,8 @@ class AGCSchema(BaseSchema):
         output['PV'] = zip_forms({k[len('PV')+1:]: branch_forms[k] for k in branch_forms if (k.startswith('PV_') & ('npvs' not in k))}, 'PV', offsets=transforms.counts2offsets_form(branch_forms['nPV_x']))
         return output
         
-    @property
-    def behavior(self):
+    @classmethod
+    def behavior(cls):
         behavior = {}
         behavior.update(base.behavior)
         behavior.update(vector.behavior)
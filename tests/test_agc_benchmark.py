@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.agc.report import compare
+
+
+def result(flavour, rate, **extra):
+    return {
+        "flavour": flavour,
+        "versions": {"coffea": "0.7.31" if flavour == "0.7" else "2026.7.0"},
+        "files": 4, "events": 400_000, "chunksize": 100_000,
+        "events_per_second_per_core": rate,
+        "bytes_read": 64 * 2**20,
+        "peak_worker_memory": 900 * 2**20,
+        "peak_total_memory": 3600 * 2**20,
+        "merge_time": 0.25,
+        "wall_time": 12.0,
+        **extra,
+    }
+
+
+def test_compare_orders_flavours_against_baseline():
+    table = compare([result("0.7", 50_000), result("full", 80_000), result("noml", 100_000)])
+    lines = table.splitlines()
+    assert [line.split()[0] for line in lines[1:]] == ["noml", "full", "0.7"]
+    assert "vs noml" in lines[0]
+    assert lines[2].split()[3] == "0.80"
+    assert "64 MiB" in lines[1] and "Warning" not in table
+
+
+def test_compare_warns_about_different_datasets():
+    table = compare([result("noml", 100_000), result("dak", 90_000, events=100)],
+                    baseline="dak")
+    assert "vs dak" in table.splitlines()[0]
+    assert "different datasets" in table
+
+
+def test_synthesized_files_follow_agc_schema(tmp_path):
+    uproot = pytest.importorskip("uproot")
+    ak = pytest.importorskip("awkward")
+    from benchmarks.agc.synthesize import synthesize_dataset
+
+    [path] = synthesize_dataset(tmp_path, files=1, events=1000, seed=3)
+    tree = uproot.open(path)["events"]
+    assert tree.num_entries == 1000
+    for branch in ("numbermuon", "muon_e", "muon_ch", "numGenPart", "nPV_x", "PV_npvs",
+                   "met_pt"):
+        assert branch in tree
+    muon_pt = tree["muon_pt"].array()
+    assert ak.all(tree["numbermuon"].array() == ak.num(muon_pt))
+    # Reused, not regenerated
+    assert synthesize_dataset(tmp_path, files=1, events=1000, seed=3) == [path]
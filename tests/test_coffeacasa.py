@@ -75,6 +75,42 @@ def mock_security():
     return mock_sec
 
 
+@pytest.fixture
+def make_cluster(mock_environment):
+    """Build running clusters whose HTCondorCluster.__init__ is patched out
+
+    The attributes that SpecCluster would set up are given the state of a
+    running cluster without workers.
+    """
+    from distributed.core import Status
+
+    clusters = []
+    with patch("coffea_casa.coffea_casa.security_obj") as mock_sec_obj, \
+         patch("coffea_casa.coffea_casa.HTCondorCluster.__init__") as mock_init:
+
+        mock_sec_obj.return_value = MagicMock(spec=Security)
+        mock_sec_obj.return_value.get_connection_args.return_value = {"require_encryption": False}
+        mock_init.return_value = None
+
+        def make_cluster(**kwargs):
+            cluster = CoffeaCasaCluster(worker_image="dummy", **kwargs)
+            cluster.status = Status.running
+            cluster.workers = {}
+            cluster.worker_spec = {}
+            cluster.new_spec = {"cls": CoffeaCasaJob, "options": mock_init.call_args[1]}
+            cluster.scheduler = MagicMock(status=Status.running)
+            cluster.scheduler_comm = MagicMock()
+            cluster.scheduler_info = {"workers": {}}
+            cluster._futures = set()
+            clusters.append(cluster)
+            return cluster
+
+        yield make_cluster
+
+    for cluster in clusters:
+        cluster.status = Status.closed
+
+
 # ===== Tests for helper functions =====
 
 def test_bearer_token_path_from_env(monkeypatch, tmp_path):
@@ -479,4 +515,593 @@ def test_x509_proxy_detected(mock_environment, tmp_path):
         job_kwargs = mock_init.call_args[1]
         directives = job_kwargs.get("job_extra_directives", {})
         
-        assert directives.get("use_x509userproxy") is True
\ No newline at end of file
+        assert directives.get("use_x509userproxy") is True
+
+
+# ===== Tests for graceful drain on eviction =====
+
+def test_drain_directives_set_by_default(mock_environment):
+    """Test that the soft-kill grace period is advertised to the worker"""
+    with patch("coffea_casa.coffea_casa.security_obj") as mock_sec_obj, \
+         patch("coffea_casa.coffea_casa.HTCondorCluster.__init__") as mock_init:
+
+        mock_sec_obj.return_value = MagicMock(spec=Security)
+        mock_sec_obj.return_value.get_connection_args.return_value = {"require_encryption": False}
+        mock_init.return_value = None
+
+        CoffeaCasaCluster(worker_image="dummy", drain_timeout=30)
+
+        directives = mock_init.call_args[1]["job_extra_directives"]
+        assert directives["+CoffeaCasaDrainTimeout"] == 30
+        assert directives["kill_sig"] == "SIGTERM"
+        assert directives["job_max_vacate_time"] > 30
+
+
+def test_drain_disabled(mock_environment):
+    """Test that drain_timeout=0 leaves the job directives untouched"""
+    with patch("coffea_casa.coffea_casa.security_obj") as mock_sec_obj, \
+         patch("coffea_casa.coffea_casa.HTCondorCluster.__init__") as mock_init:
+
+        mock_sec_obj.return_value = MagicMock(spec=Security)
+        mock_sec_obj.return_value.get_connection_args.return_value = {"require_encryption": False}
+        mock_init.return_value = None
+
+        CoffeaCasaCluster(worker_image="dummy", drain_timeout=0)
+
+        directives = mock_init.call_args[1]["job_extra_directives"]
+        assert "+CoffeaCasaDrainTimeout" not in directives
+        assert "job_max_vacate_time" not in directives
+
+
+def test_preempted_worker_is_replaced(make_cluster):
+    """Test that a drained worker's job is removed and resubmitted"""
+    import asyncio
+    from coffea_casa.preemption import PREEMPTION_TOPIC
+
+    job = MagicMock(job_id="123.0")
+    job.close = MagicMock(side_effect=lambda: asyncio.sleep(0))
+
+    cluster = make_cluster(drain_timeout=60)
+    cluster.workers = {"CoffeaCasaCluster-0": job}
+    cluster.worker_spec = {"CoffeaCasaCluster-0": {}}
+
+    async def events(topic):
+        assert topic == PREEMPTION_TOPIC
+        return ((0.0, {"action": "drain", "name": "htcondor--123.0--"}),)
+
+    cluster.scheduler_comm.events = events
+    cluster._correct_state = MagicMock(side_effect=lambda: asyncio.sleep(0))
+
+    asyncio.run(cluster._worker_removed("htcondor--123.0--"))
+
+    job.close.assert_called_once()
+    cluster._correct_state.assert_called_once()
+    assert "CoffeaCasaCluster-0" not in cluster.workers
+    assert "CoffeaCasaCluster-0" in cluster.worker_spec
+
+
+# ===== Tests for worker lifetimes =====
+
+def test_lifetime_directives(mock_environment):
+    """Test that lifetime and jitter are advertised in the job ClassAd"""
+    with patch("coffea_casa.coffea_casa.security_obj") as mock_sec_obj, \
+         patch("coffea_casa.coffea_casa.HTCondorCluster.__init__") as mock_init:
+
+        mock_sec_obj.return_value = MagicMock(spec=Security)
+        mock_sec_obj.return_value.get_connection_args.return_value = {"require_encryption": False}
+        mock_init.return_value = None
+
+        CoffeaCasaCluster(worker_image="dummy", lifetime="1h", lifetime_jitter="2m")
+
+        directives = mock_init.call_args[1]["job_extra_directives"]
+        assert directives["+DaskWorkerLifetime"] == 3600
+        assert directives["+DaskWorkerLifetimeStagger"] == 120
+
+
+def test_comm_profile_directives(mock_environment):
+    """Test that the profile is advertised in the job ClassAd"""
+    import dask
+    from coffea_casa.comm_profiles import comm_classads
+
+    with patch("coffea_casa.coffea_casa.security_obj") as mock_sec_obj, \
+         patch("coffea_casa.coffea_casa.HTCondorCluster.__init__") as mock_init, \
+         patch("coffea_casa.coffea_casa.apply_comm_profile") as mock_apply, \
+         dask.config.set({"jobqueue.coffea-casa.comm-profile": "wan-slow"}):
+
+        mock_sec_obj.return_value = MagicMock(spec=Security)
+        mock_sec_obj.return_value.get_connection_args.return_value = {"require_encryption": False}
+        mock_init.return_value = None
+
+        CoffeaCasaCluster(worker_image="dummy")
+
+        mock_apply.assert_called_once_with("wan-slow")
+        directives = mock_init.call_args[1]["job_extra_directives"]
+        assert directives == {**directives, **comm_classads("wan-slow")}
+        assert directives["+DaskCommCompression"] == '"zstd"'
+        assert directives["+DaskCommZstdLevel"] == 9
+
+
+def test_scheduler_process_option(mock_environment):
+    """Test that scheduler_process runs the scheduler out of the kernel"""
+    from coffea_casa.scheduler_process import SchedulerProcess
+
+    with patch("coffea_casa.coffea_casa.security_obj") as mock_sec_obj, \
+         patch("coffea_casa.coffea_casa.HTCondorCluster.__init__") as mock_init:
+
+        mock_sec_obj.return_value = MagicMock(spec=Security)
+        mock_sec_obj.return_value.get_connection_args.return_value = {"require_encryption": False}
+        mock_init.return_value = None
+
+        CoffeaCasaCluster(worker_image="dummy")
+        assert "scheduler_cls" not in mock_init.call_args[1]
+
+        CoffeaCasaCluster(worker_image="dummy", scheduler_process=True)
+        assert mock_init.call_args[1]["scheduler_cls"] is SchedulerProcess
+        options = mock_init.call_args[1]["scheduler_options"]
+        assert options["port"] == 8786
+
+
+def test_staggered_lifetimes_are_spread():
+    """Test that consecutive jobs get distinct lifetimes within the window"""
+    from coffea_casa.lifetime import staggered_lifetime
+
+    lifetimes = [staggered_lifetime(i, "2h", "20m") for i in range(20)]
+    assert all(7200 <= lt < 8400 for lt in lifetimes)
+    assert len(set(lifetimes)) == 20
+    # Any batch of jobs covers most of the window
+    assert max(lifetimes[:5]) - min(lifetimes[:5]) > 600
+
+
+def test_expiring_worker_is_dropped_after_replacement(make_cluster):
+    """Test that a worker retired at its lifetime is not resubmitted"""
+    import asyncio
+
+    job = MagicMock(job_id="7.0")
+    job.close = MagicMock(side_effect=lambda: asyncio.sleep(0))
+
+    cluster = make_cluster()
+    cluster.workers = {"CoffeaCasaCluster-0": job}
+    cluster.worker_spec = {"CoffeaCasaCluster-0": {}, "CoffeaCasaCluster-1": {}}
+    # Its replacement, CoffeaCasaCluster-1, was submitted ahead of its lifetime
+    cluster._expiring.add("CoffeaCasaCluster-0")
+
+    asyncio.run(cluster._worker_removed("htcondor--7.0--"))
+
+    job.close.assert_called_once()
+    assert cluster.worker_spec == {"CoffeaCasaCluster-1": {}}
+    assert not cluster._expiring
+
+
+def test_local_worker_budget(monkeypatch):
+    """Test that local workers fit in the pod's cgroup limits"""
+    from coffea_casa import local_workers
+
+    monkeypatch.setattr(local_workers, "cpu_count", lambda: 4)
+    monkeypatch.setattr(local_workers, "memory_limit", lambda: 8 * 2**30)
+
+    assert local_workers.local_worker_budget("auto") == (3, 1, 4 * 2**30 // 3)
+    assert local_workers.local_worker_budget(10)[0] == 3
+    assert local_workers.local_worker_budget(2, threads_per_worker=2)[0] == 1
+
+    monkeypatch.setattr(local_workers, "cpu_count", lambda: 1)
+    assert local_workers.local_worker_budget("auto") == (0, 1, 0)
+
+
+def test_remote_worker_retires_local_worker(make_cluster):
+    """Test that one local worker is retired per connecting HTCondor worker"""
+    import asyncio
+
+    async def run():
+        cluster = make_cluster(local_workers=2)
+        # As started by _start_local_workers
+        cluster._local_workers.update({"local-0": MagicMock(), "local-1": MagicMock()})
+        cluster.scheduler_info = {"workers": {"tcp://pod:1": {"name": "local-0"},
+                                              "tcp://pod:2": {"name": "local-1"}}}
+        cluster._retire_local_worker = MagicMock(side_effect=lambda *a: asyncio.sleep(0))
+
+        def msg():
+            return {"workers": {"tcp://node:1": {"name": "htcondor--7.0--"}}}
+
+        cluster._update_worker_status("add", msg())
+        # A repeated update for the same worker does not retire another one
+        cluster._update_worker_status("add", msg())
+        await asyncio.gather(*cluster._futures)
+        return cluster
+
+    cluster = asyncio.run(run())
+    cluster._retire_local_worker.assert_called_once()
+    assert len(cluster._local_workers) == 1
+
+
+def test_credential_plugin_replaces_files_atomically(monkeypatch, tmp_path):
+    """Test that renewed credentials replace the worker's token and proxy"""
+    from coffea_casa.plugin import CredentialRefreshPlugin
+
+    token_file = tmp_path / ".xcache" / "access_token"
+    proxy_file = tmp_path / "x509up"
+    monkeypatch.setenv("BEARER_TOKEN_FILE", str(token_file))
+    monkeypatch.setenv("X509_USER_PROXY", str(proxy_file))
+    proxy_file.write_bytes(b"old proxy")
+
+    CredentialRefreshPlugin(token=b"new token", proxy=b"new proxy").setup(MagicMock())
+
+    assert token_file.read_bytes() == b"new token"
+    assert proxy_file.read_bytes() == b"new proxy"
+    assert oct(token_file.stat().st_mode & 0o777) == "0o600"
+    assert sorted(p.name for p in tmp_path.rglob("*") if p.is_file()) == ["access_token", "x509up"]
+
+
+def test_renewed_token_is_pushed_once(make_cluster, monkeypatch, tmp_path):
+    """Test that a changed token is registered as a worker plugin"""
+    import asyncio
+    from distributed.protocol.pickle import loads
+
+    token = tmp_path / "token"
+    token.write_bytes(b"v1")
+    monkeypatch.setenv("BEARER_TOKEN_FILE", str(token))
+    monkeypatch.setenv("X509_USER_PROXY", str(tmp_path / "missing"))
+
+    async def register_worker_plugin(**kwargs):
+        pushed.append(kwargs)
+
+    pushed = []
+    cluster = make_cluster(credential_refresh="1m")
+    cluster.scheduler_comm = MagicMock(register_worker_plugin=register_worker_plugin)
+    # As read by _start
+    cluster._credentials = cluster._read_credentials()
+
+    asyncio.run(cluster._check_credentials())
+    assert pushed == []
+
+    token.write_bytes(b"v2")
+    asyncio.run(cluster._check_credentials())
+    asyncio.run(cluster._check_credentials())
+    assert len(pushed) == 1
+    assert pushed[0]["name"] == "coffea-casa-credentials"
+    assert loads(pushed[0]["plugin"]).token == b"v2"
+
+
+# ===== Tests for bulk job removal =====
+
+def test_jobs_are_tagged_with_cluster_id(mock_environment):
+    """Test that all jobs carry the attribute used for bulk removal"""
+    with patch("coffea_casa.coffea_casa.security_obj") as mock_sec_obj, \
+         patch("coffea_casa.coffea_casa.HTCondorCluster.__init__") as mock_init:
+
+        mock_sec_obj.return_value = MagicMock(spec=Security)
+        mock_sec_obj.return_value.get_connection_args.return_value = {"require_encryption": False}
+        mock_init.return_value = None
+
+        cluster = CoffeaCasaCluster(worker_image="dummy")
+
+        directives = mock_init.call_args[1]["job_extra_directives"]
+        assert directives["+CoffeaCasaClusterId"] == f'"{cluster._cluster_id}"'
+
+
+def test_removal_commands():
+    """Test that job ids are removed in as few condor_rm calls as possible"""
+    from coffea_casa import removal
+
+    assert removal.removal_commands(["1.0", "2.0", "1.0"]) == [["condor_rm", "1.0", "2.0"]]
+    with patch.object(removal, "MAX_JOB_IDS", 2):
+        commands = removal.removal_commands([f"{i}.0" for i in range(5)], cancel_command="condor_rm -name s")
+    assert [len(c) for c in commands] == [5, 5, 4]
+    assert removal.removal_commands(constraint=removal.cluster_constraint("abc")) == [
+        ["condor_rm", "-constraint", 'CoffeaCasaClusterId == "abc"']]
+
+
+def test_scale_down_removes_jobs_in_one_call(make_cluster):
+    """Test that surplus jobs are retired and removed with a single condor_rm"""
+    import asyncio
+
+    jobs = {f"CoffeaCasaCluster-{i}": MagicMock(job_id=f"{50 + i}.0", cancel_command="condor_rm")
+            for i in range(4)}
+    for job in jobs.values():
+        job.close = MagicMock(side_effect=lambda: asyncio.sleep(0))
+
+    retired = []
+
+    async def retire_workers(names):
+        retired.extend(names)
+
+    cluster = make_cluster(drain_timeout=60)
+    cluster.workers = dict(jobs)
+    cluster.worker_spec = {"CoffeaCasaCluster-0": {}}
+    cluster.scheduler_comm = MagicMock(retire_workers=retire_workers)
+
+    with patch("coffea_casa.coffea_casa.remove_jobs") as mock_remove, \
+         patch("coffea_casa.coffea_casa.HTCondorCluster._correct_state_internal",
+               side_effect=lambda: asyncio.sleep(0)):
+        asyncio.run(cluster._correct_state_internal())
+
+    mock_remove.assert_called_once_with(["51.0", "52.0", "53.0"], cancel_command="condor_rm")
+    assert sorted(retired) == ["htcondor--51.0--", "htcondor--52.0--", "htcondor--53.0--"]
+    assert list(cluster.workers) == ["CoffeaCasaCluster-0"]
+    assert {"51.0", "52.0", "53.0"} <= CoffeaCasaJob.removed
+    assert "50.0" not in CoffeaCasaJob.removed
+
+
+def test_held_job_is_resubmitted_after_backoff(make_cluster):
+    """Test that a held job is removed, reported and resubmitted with backoff"""
+    import asyncio
+
+    jobs = {f"CoffeaCasaCluster-{i}": MagicMock(job_id=f"{60 + i}.0", cancel_command="condor_rm")
+            for i in range(2)}
+    for job in jobs.values():
+        job.close = MagicMock(side_effect=lambda: asyncio.sleep(0))
+    queue = {
+        "60.0": {"status": 2, "since": 0, "hold_code": None, "hold_reason": None},
+        "61.0": {"status": 5, "since": 0, "hold_code": 26,
+                 "hold_reason": "Error from slot1@node: disk quota exceeded"},
+    }
+
+    cluster = make_cluster(drain_timeout=0, job_health_interval="30s")
+    cluster.workers = dict(jobs)
+    cluster.worker_spec = dict.fromkeys(jobs, {})
+    cluster.scheduler_comm = MagicMock(retire_workers=lambda names: asyncio.sleep(0))
+    cluster._correct_state = MagicMock(side_effect=lambda: asyncio.sleep(0))
+    cluster.scheduler_info = {"workers": {"tcp://a": {"name": "htcondor--60.0--"}}}
+
+    with patch("coffea_casa.coffea_casa.query_queue", return_value=queue), \
+         patch("coffea_casa.coffea_casa.remove_jobs") as mock_remove, \
+         patch("coffea_casa.coffea_casa.time.time", return_value=1000):
+        asyncio.run(cluster._check_job_health())
+
+    mock_remove.assert_called_once_with(["61.0"], cancel_command="condor_rm")
+    assert cluster.job_issues[0]["reason"] == "held: Error from slot1@node: disk quota exceeded"
+    # Still holding its slot until the backoff expires
+    assert cluster._job_retry == {"CoffeaCasaCluster-1": 1030}
+    assert "CoffeaCasaCluster-1" in cluster.workers
+    cluster._correct_state.assert_not_called()
+
+    asyncio.run(cluster._resubmit_due(1031))
+    assert list(cluster.workers) == ["CoffeaCasaCluster-0"]
+    cluster._correct_state.assert_called_once()
+
+
+def test_overprovisioned_scale_up_cancels_surplus(make_cluster):
+    """Test that surplus jobs still pending are removed once the target connects"""
+    import asyncio
+
+    cluster = make_cluster()
+
+    with patch("coffea_casa.coffea_casa.HTCondorCluster.scale") as mock_scale:
+        cluster.scale(3, overprovision=2)
+        mock_scale.assert_called_once_with(jobs=5)
+        # e.g. adapt() asking for the same target during the scale-up
+        cluster.scale(3)
+        mock_scale.assert_called_once()
+
+    cluster.worker_spec = {f"CoffeaCasaCluster-{i}": {} for i in range(5)}
+    cluster.workers = {name: MagicMock(job_id=f"7.{i}")
+                       for i, name in enumerate(cluster.worker_spec)}
+    cluster.scheduler_info = {"workers": {
+        f"tcp://{i}": {"name": f"htcondor--7.{i}--"} for i in (0, 2)}}
+    cluster._correct_state = MagicMock(side_effect=lambda: asyncio.sleep(0))
+
+    asyncio.run(cluster._cancel_surplus())
+    cluster._correct_state.assert_not_called()
+
+    cluster.scheduler_info["workers"]["tcp://3"] = {"name": "htcondor--7.3--"}
+    asyncio.run(cluster._cancel_surplus())
+    assert list(cluster.worker_spec) == [
+        "CoffeaCasaCluster-0", "CoffeaCasaCluster-2", "CoffeaCasaCluster-3"]
+    assert cluster._overprovision_target is None
+    cluster._correct_state.assert_called_once()
+
+
+# ===== Tests for pilot jobs =====
+
+def test_pilot_job_directives(mock_environment):
+    """Test that a job hosting several workers forwards ports for each of them"""
+    with patch("coffea_casa.coffea_casa.security_obj") as mock_sec_obj, \
+         patch("coffea_casa.coffea_casa.HTCondorCluster.__init__") as mock_init:
+
+        mock_sec_obj.return_value = MagicMock(spec=Security)
+        mock_sec_obj.return_value.get_connection_args.return_value = {"require_encryption": False}
+        mock_init.return_value = None
+
+        cluster = CoffeaCasaCluster(worker_image="dummy", cores=8, processes=4)
+        directives = mock_init.call_args[1]["job_extra_directives"]
+        assert directives["+DaskWorkerProcesses"] == 4
+        assert directives["container_service_names"] == (
+            "dask,nanny,dask1,nanny1,dask2,nanny2,dask3,nanny3")
+        assert directives["dask3_container_port"] == 8789
+        assert directives["nanny3_container_port"] == 8004
+        assert cluster._worker_processes == 4
+
+        CoffeaCasaCluster(worker_image="dummy")
+        assert "+DaskWorkerProcesses" not in mock_init.call_args[1]["job_extra_directives"]
+
+
+def test_pilot_workers_map_to_their_job(make_cluster):
+    """Test that all workers of a pilot job are retired with it"""
+    import asyncio
+
+    jobs = {f"CoffeaCasaCluster-{i}": MagicMock(job_id=f"8.{i}", cancel_command="condor_rm")
+            for i in range(2)}
+    for job in jobs.values():
+        job.close = MagicMock(side_effect=lambda: asyncio.sleep(0))
+    retired = []
+
+    async def retire_workers(names):
+        retired.extend(names)
+
+    cluster = make_cluster(cores=2, processes=2, drain_timeout=0)
+    cluster.workers = dict(jobs)
+    cluster.worker_spec = {"CoffeaCasaCluster-0": {}}
+    cluster.scheduler_comm = MagicMock(retire_workers=retire_workers)
+
+    assert cluster._spec_name("htcondor--8.1---1") == "CoffeaCasaCluster-1"
+    with patch("coffea_casa.coffea_casa.remove_jobs") as mock_remove, \
+         patch("coffea_casa.coffea_casa.HTCondorCluster._correct_state_internal",
+               side_effect=lambda: asyncio.sleep(0)):
+        asyncio.run(cluster._correct_state_internal())
+
+    mock_remove.assert_called_once_with(["8.1"], cancel_command="condor_rm")
+    assert retired == ["htcondor--8.1---0", "htcondor--8.1---1"]
+
+
+# ===== Tests for placement preferences =====
+
+def test_rank_directive(mock_environment):
+    """Test that jobs rank nodes holding the worker image first"""
+    with patch("coffea_casa.coffea_casa.security_obj") as mock_sec_obj, \
+         patch("coffea_casa.coffea_casa.HTCondorCluster.__init__") as mock_init:
+
+        mock_sec_obj.return_value = MagicMock(spec=Security)
+        mock_sec_obj.return_value.get_connection_args.return_value = {"require_encryption": False}
+        mock_init.return_value = None
+
+        CoffeaCasaCluster(worker_image="registry.example/casa:1")
+        assert "rank" not in mock_init.call_args[1]["job_extra_directives"]
+
+        CoffeaCasaCluster(worker_image="registry.example/casa:1", rank_site="T2_US_Nebraska",
+                          rank_weights={"site": 10})
+        rank = mock_init.call_args[1]["job_extra_directives"]["rank"]
+        assert "registry\\\\.example/casa:1@" in rank
+        assert '"T2_US_Nebraska"' in rank
+
+        CoffeaCasaCluster(worker_image="dummy", rank_weights=False)
+        assert "rank" not in mock_init.call_args[1]["job_extra_directives"]
+
+        CoffeaCasaCluster(worker_image="dummy", job_extra_directives={"rank": "Memory"})
+        assert mock_init.call_args[1]["job_extra_directives"]["rank"] == "Memory"
+
+
+# ===== Tests for memory right-sizing =====
+
+def test_task_memory_plugin_records_peaks_per_prefix():
+    """Test that the peak process memory while a task runs is reported for its prefix"""
+    from uuid import uuid4
+    from coffea_casa.plugin import TaskMemoryPlugin
+
+    key = ("process-" + uuid4().hex, 0)
+    worker = MagicMock()
+    worker.name = "htcondor--1.0--"
+    worker.state.nthreads = 1
+    plugin = TaskMemoryPlugin()
+    plugin.worker, plugin.running, plugin.peaks, plugin.changed = worker, {}, {}, set()
+
+    worker.monitor.get_process_memory.return_value = 500
+    plugin.transition(key, "ready", "executing")
+    worker.monitor.get_process_memory.return_value = 2000
+    plugin.sample()
+    worker.monitor.get_process_memory.return_value = 800
+    plugin.transition(key, "executing", "memory")
+    plugin.flush()
+    plugin.flush()
+
+    worker.log_event.assert_called_once_with("coffea-casa-task-memory", {
+        "worker": "htcondor--1.0--", "nthreads": 1, "peaks": {"process": 2000}})
+
+
+def test_memory_sizing_applies_the_fitted_request(mock_environment):
+    """Test that the fitted memory is requested unless memory is given"""
+    history = {"1": {"process": [1400 * 2 ** 20]}}
+    with patch("coffea_casa.coffea_casa.security_obj") as mock_sec_obj, \
+         patch("coffea_casa.coffea_casa.load_history", return_value=history), \
+         patch("coffea_casa.coffea_casa.HTCondorCluster.__init__") as mock_init:
+
+        mock_sec_obj.return_value = MagicMock(spec=Security)
+        mock_sec_obj.return_value.get_connection_args.return_value = {"require_encryption": False}
+        mock_init.return_value = None
+
+        cluster = CoffeaCasaCluster(worker_image="dummy", cores=1, memory_sizing="apply")
+        assert mock_init.call_args[1]["memory"] == "1792MiB"
+        assert "coffea-casa-task-memory" in cluster._worker_plugins
+
+        CoffeaCasaCluster(worker_image="dummy", cores=1, memory="8GiB", memory_sizing="apply")
+        assert mock_init.call_args[1]["memory"] == "8GiB"
+
+        CoffeaCasaCluster(worker_image="dummy", cores=1, memory_sizing="propose")
+        assert "memory" not in mock_init.call_args[1]
+
+        with pytest.raises(ValueError):
+            CoffeaCasaCluster(worker_image="dummy", memory_sizing="always")
+
+
+# ===== Tests for OOM retries on larger workers =====
+
+def test_oom_killed_task_is_restricted_to_larger_workers():
+    """Test that only tasks of workers dying near their memory limit are moved"""
+    import asyncio
+    from types import SimpleNamespace
+    from coffea_casa.plugin import OOMRetryPlugin
+
+    full = SimpleNamespace(address="tls://a", name="htcondor--1.0--", memory_limit=4e9,
+                           memory=SimpleNamespace(process=3.9e9))
+    calm = SimpleNamespace(address="tls://b", name="htcondor--2.0--", memory_limit=4e9,
+                           memory=SimpleNamespace(process=1e9))
+    heavy = SimpleNamespace(processing_on=full, resource_restrictions=None)
+    light = SimpleNamespace(processing_on=calm, resource_restrictions=None)
+    scheduler = MagicMock(workers={"tls://a": full, "tls://b": calm},
+                          tasks={"heavy": heavy, "light": light})
+    plugin = OOMRetryPlugin()
+    asyncio.run(plugin.start(scheduler))
+
+    plugin.transition("heavy", "waiting", "processing")
+    plugin.transition("light", "waiting", "processing")
+    scheduler.workers.clear()
+    plugin.transition("heavy", "processing", "released")
+    plugin.transition("light", "processing", "released")
+
+    assert heavy.resource_restrictions == {"coffea-casa-bigmem": 1}
+    assert light.resource_restrictions is None
+    scheduler.log_event.assert_called_once_with("coffea-casa-oom-retry", {
+        "action": "retry", "key": "heavy", "worker": "htcondor--1.0--",
+        "memory": 3.9e9, "pending": 1})
+
+    big = SimpleNamespace(address="tls://c", name="htcondor--3.0--", memory_limit=8e9,
+                          memory=SimpleNamespace(process=5e9))
+    scheduler.workers["tls://c"] = big
+    heavy.processing_on = big
+    plugin.transition("heavy", "waiting", "processing")
+    plugin.transition("heavy", "processing", "memory")
+    assert scheduler.log_event.call_args[0][1]["pending"] == 0
+
+
+def test_larger_memory_jobs_follow_pending_oom_retries(make_cluster):
+    """Test that larger-memory jobs run while OOM retries are pending"""
+    import asyncio
+
+    class Job:
+        def __init__(self, scheduler, name, **options):
+            self.name, self.options, self.job_id = name, options, None
+            self.closed = False
+
+        def __await__(self):
+            self.job_id = f"9.{self.name[-1]}"
+            return asyncio.sleep(0).__await__()
+
+        async def close(self):
+            self.closed = True
+
+    events = []
+
+    async def get_events(topic):
+        return list(events)
+
+    cluster = make_cluster(oom_retry_workers=2)
+    cluster.scheduler.address = "tls://1.2.3.4:8786"
+    cluster.scheduler_comm = MagicMock(events=get_events)
+    cluster.new_spec = {"cls": Job, "options": {"memory": "4GiB", "job_extra_directives": {}}}
+    cluster._remove_jobs = MagicMock(side_effect=lambda jobs: asyncio.sleep(0))
+
+    events.extend([(1.0, {"action": "retry", "key": "a", "pending": 1}),
+                   (2.0, {"action": "retry", "key": "b", "pending": 2}),
+                   (3.0, {"action": "retry", "key": "c", "pending": 3})])
+    asyncio.run(cluster._check_oom_retry())
+    jobs = list(cluster._oom_jobs.values())
+    assert len(jobs) == 2
+    assert jobs[0].options["memory"] == "8192MiB"
+    assert jobs[0].options["job_extra_directives"] == {
+        "+DaskWorkerResources": '"coffea-casa-bigmem=1"'}
+    assert [r["key"] for r in cluster.oom_retries] == ["a", "b", "c"]
+
+    events.append((4.0, {"action": "done", "key": "a", "pending": 0}))
+    asyncio.run(cluster._check_oom_retry())
+    assert cluster._oom_jobs == {}
+    assert all(job.closed for job in jobs)
+    cluster._remove_jobs.assert_called_once_with(jobs)
+    assert len(cluster.oom_retries) == 3
@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+
+import dask
+import numpy as np
+import pytest
+from distributed.comm.tcp import TCP
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from coffea_casa.comm_profiles import (
+    apply_comm_profile,
+    benchmark_comm_profiles,
+    comm_environment,
+    comm_settings,
+)
+
+
+def test_profile_overrides():
+    """Test that a dict profile overrides its base profile"""
+    settings = comm_settings({"base": "wan", "shard": "4MiB"})
+    assert settings == {"compression": "lz4", "zstd-level": 3, "shard": "4MiB",
+                        "offload": "1MiB"}
+    with pytest.raises(ValueError, match="Unknown comm profile"):
+        comm_settings("satellite")
+    with pytest.raises(ValueError, match="level"):
+        comm_settings({"level": 3})
+
+
+def test_environment_matches_dask_config():
+    """Test that the worker environment sets the same config as the profile"""
+    env = comm_environment("wan-slow")
+    config = dask.config.collect_env(env)
+    assert config["distributed"]["comm"] == {
+        "compression": "zstd", "zstd": {"level": 9}, "shard": "8MiB", "offload": "1MiB",
+    }
+    assert dask.config.collect_env(comm_environment("lan"))["distributed"]["comm"][
+        "compression"] is False
+
+
+def test_apply_comm_profile():
+    """Test that the settings read when distributed is imported follow the profile"""
+    from distributed.comm import utils
+
+    shard, offload = TCP.max_shard_size, utils.OFFLOAD_THRESHOLD
+    try:
+        with dask.config.set({}):
+            apply_comm_profile({"shard": "8MiB", "offload": "2MiB"})
+            assert dask.config.get("distributed.comm.shard") == "8MiB"
+            assert TCP.max_shard_size == 8 * 2**20
+            assert utils.OFFLOAD_THRESHOLD == 2 * 2**20
+    finally:
+        TCP.max_shard_size, utils.OFFLOAD_THRESHOLD = shard, offload
+
+
+def test_benchmark_ranks_profiles():
+    """Test that the benchmark estimates the transfer of the sample"""
+    sample = {"mass": np.zeros(2**20), "pt": np.arange(1000.0)}
+    report = benchmark_comm_profiles(sample=sample, bandwidth="10MB", rtt=0.05,
+                                     profiles=["lan", "wan", "wan-zstd"], repeat=1)
+    lan = next(t for t in report.timings if t.name == "lan")
+    assert lan.compressed == lan.nbytes > 8 * 2**20
+    assert lan.total_time == pytest.approx(0.05 + lan.nbytes / 10e6, rel=0.05)
+    assert len(report.timings) + len(report.unavailable) == 3
+    assert report.best in ("lan", "wan", "wan-zstd")
+    assert "Best:" in repr(report)
+    # All zeros compress well: a compressing profile wins when installed
+    if len(report.timings) > 1:
+        assert report.best != "lan"
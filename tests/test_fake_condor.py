@@ -0,0 +1,105 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.condor.fake import (
+    HELD,
+    IDLE,
+    RUNNING,
+    UNDEFINED,
+    FakeCondor,
+    evaluate,
+    job_ads,
+    lookup,
+)
+
+SUBMIT = """#!/usr/bin/env condor_submit
+executable = /bin/sleep
+arguments = 30
+MY.JobId = "$(ClusterId).$(ProcId)"
+MY.DaskWorkerName = "htcondor--$F(MY.JobId)--"
++CoffeaCasaDrainTimeout = 0
+kill_sig = SIGTERM
+job_max_vacate_time = 2
+Queue {count}
+"""
+
+
+def submit(count=1):
+    out = subprocess.run(["condor_submit", "-spool"], input=SUBMIT.format(count=count),
+                         capture_output=True, text=True, check=True)
+    return out.stdout
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_classad_expressions():
+    ad = {"RequestMemory": "2048", "Cores": "ifThenElse(isUndefined(X), 4, X)",
+          "Name": '"htcondor--1.0--"'}
+    assert evaluate("RequestMemory / 1024 * Cores", ad) == 8
+    assert evaluate('MY.Name == "HTCONDOR--1.0--" && Cores >= 4', ad) is True
+    assert evaluate("Missing =?= undefined", ad) is True
+    assert lookup(ad, "Missing") is UNDEFINED
+
+
+def test_submit_file_macros():
+    [first, second] = job_ads(SUBMIT.format(count=2), cluster=7)
+    assert lookup(second, "DaskWorkerName") == "htcondor--7.1--"
+    assert lookup(first, "Cmd") == "/bin/sleep"
+    assert lookup(first, "JobStatus") == IDLE
+
+
+def test_submit_query_remove():
+    with FakeCondor(queue_delay=0.2, seed=0) as condor:
+        assert "3 job(s) submitted to cluster 1." in submit(3)
+        wait_for(lambda: set(condor.jobs().values()) == {RUNNING})
+        out = subprocess.run(["condor_q", "-constraint", "ProcId > 0", "-af",
+                              "DaskWorkerName", "JobStatus"],
+                             capture_output=True, text=True, check=True).stdout
+        assert out.split("\n")[:2] == ["htcondor--1.1-- 2", "htcondor--1.2-- 2"]
+
+        subprocess.run(["condor_rm", "1.1"], check=True, capture_output=True)
+        wait_for(lambda: set(condor.jobs()) == {"1.0", "1.2"})
+        assert [c["argv"] for c in condor.commands("condor_rm")] == [["1.1"]]
+        events = [(e["job"], e["event"]) for e in condor.history()]
+        assert ("1.1", "removed") in events
+
+
+def test_hold_and_release():
+    with FakeCondor(hold_fraction=1.0, hold_reason="gone over memory") as condor:
+        submit()
+        wait_for(lambda: condor.jobs() == {"1.0": HELD})
+        assert lookup(condor.ads()["1.0"], "HoldReason") == "gone over memory"
+
+        condor.update(hold_fraction=0.0)
+        subprocess.run(["condor_release", "1"], check=True, capture_output=True)
+        wait_for(lambda: condor.jobs() == {"1.0": RUNNING})
+
+
+def test_eviction_requeues_the_job():
+    with FakeCondor(evict_fraction=1.0, evict_after=0.3, queue_delay=0.5) as condor:
+        submit()
+        wait_for(lambda: any(e["event"] == "evict" for e in condor.history()))
+        assert condor.jobs() == {"1.0": IDLE}
+        wait_for(lambda: lookup(condor.ads()["1.0"], "NumJobStarts") == 2)
+
+
+def test_rm_without_jobs_fails():
+    with FakeCondor():
+        out = subprocess.run(["condor_rm"], capture_output=True, text=True)
+        assert out.returncode == 1
+
+
+def test_unknown_settings():
+    with pytest.raises(TypeError, match="queue_dealy"):
+        FakeCondor(queue_dealy=1)
@@ -0,0 +1,98 @@
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+histserv = pytest.importorskip("histserv")
+hist = pytest.importorskip("hist")
+
+from coffea_casa.histsink import HistSink, HistservSinkPlugin, fill
+
+
+@pytest.fixture(scope="module")
+def histserv_address():
+    """A local histserv process"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    proc = subprocess.Popen([sys.executable, "-m", "histserv", "--port", str(port)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    address = f"127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                with histserv.Client(address) as client:
+                    client.stats(timeout=1)
+                break
+            except Exception:
+                if time.time() > deadline or proc.poll() is not None:
+                    raise
+                time.sleep(0.2)
+        yield address
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def process(i):
+    fill("x", x=[i % 10] * 3, weight=[0.5] * 3)
+    fill("cat", x=[i % 10], dataset=f"ds{i % 2}")
+
+
+def test_fills_are_streamed_without_gather(histserv_address):
+    """Test that worker fills end up on the server, batched per histogram"""
+    from distributed import Client, LocalCluster
+
+    with HistSink(histserv_address, batch_size=4, flush_interval="10s") as sink:
+        sink.register("x", hist.Hist.new.Reg(10, 0, 10, name="x").Weight())
+        sink.register("cat", hist.Hist.new.StrCat([], name="dataset", growth=True)
+                      .Reg(10, 0, 10, name="x").Double())
+        with LocalCluster(n_workers=2, threads_per_worker=2, processes=False,
+                          dashboard_address=None) as cluster, Client(cluster) as client:
+            sink.attach(client)
+            assert client.gather(client.map(process, range(25))) == [None] * 25
+            sink.flush(client)
+
+        h = sink.snapshot("x")
+        assert h.sum().value == pytest.approx(25 * 3 * 0.5)
+        assert h[0].value == pytest.approx(3 * 3 * 0.5)
+        assert sink.snapshot("cat")[{"dataset": "ds0"}].sum() == 13
+
+
+def test_fill_outside_of_a_worker():
+    """Test that fill() explains that it needs an attached sink"""
+    with pytest.raises(RuntimeError, match="HistSink"):
+        fill("x", x=[1])
+
+
+def test_failed_push_keeps_its_fills():
+    """Test that a failing histogram does not lose the fills of the others"""
+    remotes = {"x": MagicMock(), "y": MagicMock()}
+    remotes["x"].fill_many.side_effect = ConnectionError("histserv down")
+    histserv_module = MagicMock()
+    histserv_module.RemoteHist.from_connection_info.side_effect = remotes.get
+
+    with patch("coffea_casa.histsink._histserv", return_value=histserv_module):
+        plugin = HistservSinkPlugin({"x": "x", "y": "y"}, flush_interval="1h")
+        worker = MagicMock()
+        plugin.setup(worker)
+        plugin.fill("x", x=[1])
+        plugin.fill("y", x=[2])
+
+        with pytest.raises(ConnectionError):
+            plugin.flush()
+        remotes["y"].fill_many.assert_called_once()
+
+        plugin.fill("x", x=[3])
+        remotes["x"].fill_many.side_effect = None
+        plugin.flush()
+        fills = remotes["x"].fill_many.call_args[0][0]
+        assert fills == [{"x": [1]}, {"x": [3]}]
+        plugin.teardown(worker)
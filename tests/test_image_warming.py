@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from coffea_casa import image_warming
+from coffea_casa.image_warming import image_name, parse_image, warm_if_changed, warm_image
+
+IMAGE = "hub.opensciencegrid.org/coffea-casa/cc-analysis-ubuntu:2026.10"
+OLD, NEW = "sha256:" + "a" * 64, "sha256:" + "b" * 64
+
+CONDOR_STATUS = (
+    f"node1 hub.opensciencegrid.org/coffea-casa/cc-analysis-ubuntu@{NEW}\n"
+    f"node1 hub.opensciencegrid.org/coffea-casa/cc-analysis-ubuntu@{NEW}\n"
+    f"node2 hub.opensciencegrid.org/coffea-casa/cc-analysis-ubuntu@{OLD},other@{NEW[:-1]}c\n"
+    "node3 none\n"
+    "node4 undefined\n"
+)
+
+
+def test_parse_image():
+    """Test that references are split as the Docker client does"""
+    assert parse_image(IMAGE) == (
+        "hub.opensciencegrid.org", "coffea-casa/cc-analysis-ubuntu", "2026.10")
+    assert parse_image("localhost:5000/casa@" + NEW) == ("localhost:5000", "casa", NEW)
+    assert parse_image("coffeateam/coffea-dask") == (
+        "registry-1.docker.io", "coffeateam/coffea-dask", "latest")
+    assert image_name(IMAGE) == "hub.opensciencegrid.org/coffea-casa/cc-analysis-ubuntu"
+    assert image_name("localhost:5000/casa") == "localhost:5000/casa"
+
+
+def test_inventory_and_pull_jobs():
+    """Test that pull jobs go to the nodes without the digest only"""
+    calls = []
+
+    def call(cmd):
+        calls.append(cmd)
+        if cmd[0] == "condor_status":
+            return CONDOR_STATUS
+        with open(cmd[-1]) as f:
+            calls.append(f.read())
+        return "3 job(s) submitted to cluster 12.\n"
+
+    with patch.object(image_warming, "_call", side_effect=call):
+        inventory = warm_image(IMAGE, digest=NEW)
+
+    assert (inventory.warm, inventory.cold, inventory.unknown) == (
+        ["node1"], ["node2", "node3"], ["node4"])
+    assert inventory.submitted == ["node2", "node3", "node4"]
+    assert calls[1][:2] == ["condor_submit", "-spool"]
+    script = calls[2]
+    assert f"docker_image = hub.opensciencegrid.org/coffea-casa/cc-analysis-ubuntu@{NEW}" in script
+    assert '+CoffeaCasaWorkerType = "warm"' in script
+    assert 'requirements = (Machine == "$(Machine)")' in script
+    assert script.endswith("queue Machine in (node2, node3, node4)\n")
+
+
+def test_nothing_submitted_when_all_nodes_are_warm():
+    with patch.object(image_warming, "_call", return_value=f"node1 x@{NEW}\n") as call:
+        inventory = warm_image(IMAGE, digest=NEW)
+    call.assert_called_once()
+    assert inventory.submitted == []
+
+
+def test_warm_only_when_the_tag_moves(tmp_path):
+    """Test that a digest is warmed once, and again after a new push"""
+    state = tmp_path / "state.json"
+    with patch.object(image_warming, "resolve_digest", return_value=OLD), \
+         patch.object(image_warming, "warm_image") as warm:
+        assert warm_if_changed(IMAGE, state_file=str(state)) is warm.return_value
+        assert warm_if_changed(IMAGE, state_file=str(state)) is None
+    warm.assert_called_once_with(IMAGE, digest=OLD)
+
+    with patch.object(image_warming, "resolve_digest", return_value=NEW), \
+         patch.object(image_warming, "warm_image") as warm:
+        warm_if_changed(IMAGE, state_file=str(state))
+    warm.assert_called_once_with(IMAGE, digest=NEW)
@@ -0,0 +1,45 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.condor.fake import HELD, FakeCondor
+from coffea_casa.job_health import JOB_IDLE, query_queue, retry_delay, unhealthy_jobs
+
+SUBMIT = """executable = /bin/sleep
+arguments = 30
++CoffeaCasaClusterId = "abc"
+Queue 2
+"""
+
+
+def test_held_jobs_are_reported_with_their_reason():
+    """Test that the hold reason, with its spaces, survives condor_q -af:t"""
+    with FakeCondor(hold_fraction=1.0, hold_reason="Error pulling the image") as condor:
+        subprocess.run(["condor_submit", "-spool"], input=SUBMIT, text=True,
+                       capture_output=True, check=True)
+        deadline = time.monotonic() + 10
+        while set(condor.jobs().values()) != {HELD}:
+            assert time.monotonic() < deadline, "timed out"
+            time.sleep(0.05)
+        queue = query_queue('CoffeaCasaClusterId == "abc"')
+
+    assert set(queue) == {"1.0", "1.1"}
+    assert queue["1.0"]["hold_reason"] == "Error pulling the image"
+    assert unhealthy_jobs(["1.0", "1.1", "2.0"], queue, {"1.1"}, 0) == {
+        "1.0": "held: Error pulling the image", "2.0": "exited"}
+
+
+def test_idle_timeout():
+    queue = {"1.0": {"status": JOB_IDLE, "since": 1000, "hold_code": None, "hold_reason": None}}
+    assert unhealthy_jobs(["1.0"], queue, set(), 1500, idle_timeout=600) == {}
+    assert unhealthy_jobs(["1.0"], queue, set(), 1700, idle_timeout=600) == {
+        "1.0": "idle for 11.7m"}
+    assert unhealthy_jobs(["1.0"], queue, set(), 1700) == {}
+
+
+def test_retry_delay_is_capped():
+    assert retry_delay(1, 30, 600) == 30
+    assert retry_delay(20, 30, 600) == 600
@@ -0,0 +1,62 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from coffea_casa.journal import RunJournal, run_chunks
+
+CHUNKS = [(f"root://xcache//store/file{i // 3}.root", (i % 3) * 100, (i % 3 + 1) * 100)
+          for i in range(12)]
+calls = []
+failing = set()
+
+
+def process(chunk):
+    calls.append(chunk)
+    if chunk in failing:
+        raise RuntimeError("worker evicted")
+    return {"entries": chunk[2] - chunk[1], "files": {chunk[0]}}
+
+
+@pytest.fixture
+def client():
+    from distributed import Client, LocalCluster
+
+    with LocalCluster(n_workers=1, threads_per_worker=1, processes=False,
+                      dashboard_address=None) as cluster, Client(cluster) as client:
+        yield client
+
+
+@pytest.mark.parametrize("url", ["local", "memory://journal-test"])
+def test_interrupted_run_resumes(client, tmp_path, url):
+    """Test that a restarted run skips completed chunks and merges their partials"""
+    journal = RunJournal(str(tmp_path / "journal") if url == "local" else url)
+    failing.add(CHUNKS[7])
+    with pytest.raises(RuntimeError, match="evicted"):
+        run_chunks(client, process, CHUNKS, journal, compact_every=4)
+    assert len(journal.completed()) == len(CHUNKS) - 1
+
+    # A new journal object, as after a kernel restart
+    journal = RunJournal(journal.url)
+    failing.clear()
+    calls.clear()
+    out = run_chunks(client, process, CHUNKS, journal, compact_every=4)
+    assert calls == [CHUNKS[7]]
+    assert out["entries"] == 1200
+    assert len(out["files"]) == 4
+
+
+def test_compaction_keeps_every_chunk(tmp_path):
+    """Test that compaction merges chunk files into a single snapshot"""
+    journal = RunJournal(str(tmp_path))
+    for chunk in CHUNKS[:5]:
+        journal.record(chunk, {"entries": 100})
+    assert journal.compact() == 5
+    journal.record(CHUNKS[5], {"entries": 100})
+    assert journal.compact() == 1
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["chunks", "compacted-2.pkl"]
+    assert len(journal.completed()) == 6
+    assert journal.result() == {"entries": 600}
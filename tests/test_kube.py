@@ -0,0 +1,131 @@
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from coffea_casa.coffea_casa import CoffeaCasaCluster
+from coffea_casa.kube import CoffeaCasaKubeBackend, burst_target
+
+
+class FakeHub:
+    """The hub's burst worker API, with pods in the given phases"""
+    def __init__(self):
+        self.phases = {}
+        self.requests = []
+
+    def __call__(self, method, query=(), body=None):
+        self.requests.append((method, list(query), body))
+        if method == "POST":
+            names = [f"dask-burst-{len(self.phases) + i}" for i in range(body["count"])]
+            self.phases.update(dict.fromkeys(names, "Pending"))
+            return {"pods": names}
+        if method == "DELETE":
+            names = [name for _, name in query] or list(self.phases)
+            for name in names:
+                self.phases.pop(name, None)
+            return {}
+        return {"pods": [name for name, phase in self.phases.items()
+                         if phase not in ("Succeeded", "Failed")]}
+
+
+@pytest.fixture
+def backend():
+    backend = CoffeaCasaKubeBackend("tls://notebook:8786", image="dummy",
+                                    cores=2, memory="4GiB", start_latency="60s",
+                                    hub_api_url="http://hub:8081/hub/api/",
+                                    hub_api_token="token")
+    backend._request = FakeHub()
+    return backend
+
+
+def test_pods_are_requested_from_the_hub(backend):
+    """Test that the hub gets the worker parameters, not a pod spec"""
+    backend.create(2)
+    (method, query, body), = backend._request.requests
+    assert method == "POST"
+    assert body == {"count": 2, "scheduler_address": "tls://notebook:8786",
+                    "image": "dummy", "cores": 2, "memory": 4 * 2**30, "env": {}}
+
+
+def test_finished_pods_are_dropped(backend):
+    """Test that pods whose worker exited no longer count"""
+    first, second = backend.create(2)
+    backend._request.phases[first] = "Failed"
+    assert backend.pods() == [second]
+    assert list(backend._created) == [second]
+
+
+def test_start_latency_is_measured(backend, monkeypatch):
+    """Test that pod start-up times update the running average"""
+    monkeypatch.setattr("coffea_casa.kube.time.time", lambda: 1000.0)
+    name, = backend.create(1)
+
+    monkeypatch.setattr("coffea_casa.kube.time.time", lambda: 1160.0)
+    backend.worker_connected(name)
+    assert backend.start_latency == pytest.approx(60 + 0.3 * 100)
+
+
+def test_burst_target_follows_start_latency():
+    """Test that slow pod start-ups require longer-idle jobs"""
+    ages = [30, 150, 400]
+    assert burst_target(ages, 20, congested_after=60, maximum=10) == 2
+    assert burst_target(ages, 300, congested_after=60, maximum=10) == 1
+    assert burst_target(ages, 20, congested_after=60, maximum=1) == 1
+
+
+def test_burst_pods_follow_idle_jobs(backend, monkeypatch):
+    """Test that pods are started for idle jobs and retired once they run"""
+    from distributed.core import Status
+    from distributed.security import Security
+
+    async def noop(*args, **kwargs):
+        pass
+
+    monkeypatch.setenv("POD_IP", "192.168.1.100")
+    monkeypatch.setattr("coffea_casa.coffea_casa.CoffeaCasaKubeBackend",
+                        lambda *args, **kwargs: backend)
+    with patch("coffea_casa.coffea_casa.security_obj") as mock_sec_obj, \
+         patch("coffea_casa.coffea_casa.HTCondorCluster.__init__") as mock_init:
+
+        mock_sec_obj.return_value = MagicMock(spec=Security)
+        mock_sec_obj.return_value.get_connection_args.return_value = {"require_encryption": False}
+        mock_init.return_value = None
+
+        cluster = CoffeaCasaCluster(worker_image="dummy", burst_workers=4, burst_after="60s")
+    # As set up by SpecCluster
+    cluster.status = Status.running
+    cluster.new_spec = {"options": mock_init.call_args[1]}
+    cluster.scheduler_spec = {"options": mock_init.call_args[1]["scheduler_options"]}
+    cluster.workers = {}
+    cluster.worker_spec = {}
+    cluster.scheduler_info = {"workers": {}}
+    cluster.scheduler_comm = MagicMock(retire_workers=MagicMock(side_effect=noop))
+
+    def check_burst(now):
+        monkeypatch.setattr("coffea_casa.coffea_casa.time.time", lambda: now)
+        cluster.worker_spec = dict.fromkeys(cluster.workers, {})
+        asyncio.run(cluster._check_burst())
+
+    # Jobs submitted at 800 and 990: at 990 only the first one is worth a pod
+    cluster.workers["CoffeaCasaCluster-0"] = MagicMock(job_id="1.0")
+    check_burst(800.0)
+    assert backend.pods() == []
+    cluster.workers["CoffeaCasaCluster-1"] = MagicMock(job_id="2.0")
+    check_burst(990.0)
+    pod, = backend.pods()
+
+    # The long-idle job starts running: its pod is retired
+    cluster.scheduler_info["workers"] = {
+        "tls://node:1": {"name": "htcondor--1.0--"},
+        "tls://pod:8788": {"name": pod},
+    }
+    check_burst(1000.0)
+    assert backend.pods() == []
+    cluster.scheduler_comm.retire_workers.assert_called_once_with(
+        names=[pod], close_workers=True, remove=True)
+    assert backend._request.requests[-2] == ("DELETE", [("name", pod)], None)
+    cluster.status = Status.closed
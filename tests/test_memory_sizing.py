@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from coffea_casa.memory_sizing import (
+    MIB,
+    RUNS_KEPT,
+    fit_memory,
+    load_history,
+    merge_peaks,
+    save_history,
+    update_history,
+)
+
+
+def test_peaks_are_kept_per_worker_size():
+    """Test that peaks of workers with other thread counts are ignored"""
+    events = [
+        {"worker": "a", "nthreads": 2, "peaks": {"process": 1500 * MIB}},
+        {"worker": "b", "nthreads": 2, "peaks": {"process": 1700 * MIB}},
+        {"worker": "c", "nthreads": 1, "peaks": {"process": 900 * MIB}},
+    ]
+    history = update_history({}, merge_peaks({}, events, 2), 2)
+    assert history == {"2": {"process": [1700 * MIB]}}
+    assert fit_memory(history, 1) is None
+
+
+def test_only_recent_runs_are_kept():
+    history = {}
+    for peak in range(RUNS_KEPT + 2):
+        update_history(history, {"process": (peak + 1) * 1000 * MIB}, 1)
+    assert len(history["1"]["process"]) == RUNS_KEPT
+    assert history["1"]["process"][0] == 3000 * MIB
+
+
+def test_prefixes_expire_when_no_longer_run():
+    """Test that a large prefix of an old analysis stops setting the fit"""
+    history = update_history({}, {"old": 8000 * MIB, "process": 900 * MIB}, 1)
+    for _ in range(RUNS_KEPT):
+        update_history(history, {"process": 900 * MIB}, 1)
+    assert list(history["1"]) == ["process"]
+    assert fit_memory(history, 1) == 1280 * MIB
+
+
+def test_fit_holds_the_largest_peak_with_headroom():
+    history = {"1": {"process": [700 * MIB, 2000 * MIB], "sum": [300 * MIB]}}
+    fitted = fit_memory(history, 1, headroom=1.25)
+    assert fitted >= 2000 * MIB * 1.25
+    assert fitted % (256 * MIB) == 0
+    assert fit_memory({"1": {"sum": [10 * MIB]}}, 1) == 1024 * MIB
+
+
+def test_history_round_trip(tmp_path):
+    path = tmp_path / "task-memory.json"
+    assert load_history(path) == {}
+    save_history({"1": {"process": [MIB]}}, path)
+    assert load_history(path) == {"1": {"process": [MIB]}}
+    path.write_text("not json")
+    assert load_history(path) == {}
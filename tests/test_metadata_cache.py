@@ -0,0 +1,91 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from coffea_casa.metadata_cache import MetadataCache, uniform_steps
+
+
+class FakePreprocess:
+    """Stand-in for coffea.dataset_tools.preprocess: one entry per byte"""
+    def __init__(self):
+        self.files = []
+
+    def __call__(self, fileset, step_size=None, align_clusters=False, **kwargs):
+        out = {}
+        for name, dataset in fileset.items():
+            out[name] = dict(dataset, form="form", files={})
+            for url, object_path in dataset["files"].items():
+                self.files.append(url)
+                n = Path(url).stat().st_size
+                out[name]["files"][url] = {"object_path": object_path, "num_entries": n,
+                                           "uuid": url, "steps": uniform_steps(n, step_size)}
+        return out, out
+
+
+@pytest.fixture
+def fileset(tmp_path):
+    for i in range(4):
+        (tmp_path / f"f{i}.root").write_bytes(b"x" * 100 * (i + 1))
+    return {
+        "ttbar": {"files": {str(tmp_path / f"f{i}.root"): "Events" for i in range(3)},
+                  "metadata": {"xsec": 1.0}},
+        "data": {"files": {str(tmp_path / "f3.root"): "Events"}},
+    }
+
+
+def test_only_new_or_changed_files_are_preprocessed(tmp_path, fileset):
+    """Test that cached files are not preprocessed again"""
+    cache = MetadataCache(str(tmp_path / "cache"))
+    preprocess = FakePreprocess()
+
+    first, _ = cache.preprocess(fileset, step_size=50, preprocess=preprocess)
+    assert len(preprocess.files) == 4
+
+    # Another user sharing the store
+    second, _ = MetadataCache(str(tmp_path / "cache")).preprocess(
+        fileset, step_size=50, preprocess=preprocess)
+    assert len(preprocess.files) == 4
+    assert second["ttbar"]["files"] == first["ttbar"]["files"]
+    assert second["ttbar"]["metadata"] == {"xsec": 1.0}
+
+    changed = next(iter(fileset["ttbar"]["files"]))
+    Path(changed).write_bytes(b"x" * 1000)
+    third, _ = cache.preprocess(fileset, step_size=50, preprocess=preprocess)
+    assert preprocess.files[4:] == [changed]
+    assert third["ttbar"]["files"][changed]["num_entries"] == 1000
+
+
+def test_steps_follow_the_requested_step_size(tmp_path, fileset):
+    """Test that uniform steps are recomputed from the cached entry count"""
+    cache = MetadataCache(str(tmp_path / "cache"))
+    preprocess = FakePreprocess()
+    cache.preprocess(fileset, step_size=50, preprocess=preprocess)
+
+    out, _ = cache.preprocess(fileset, step_size=200, preprocess=preprocess)
+    assert len(preprocess.files) == 4
+    assert out["data"]["files"][str(tmp_path / "f3.root")]["steps"] == [[0, 200], [200, 400]]
+
+    cache.preprocess(fileset, step_size=200, align_clusters=True, preprocess=preprocess)
+    assert len(preprocess.files) == 8
+
+
+def test_cache_location_is_required(monkeypatch):
+    import dask
+
+    with dask.config.set({"jobqueue.coffea-casa.metadata-cache": None}):
+        with pytest.raises(ValueError, match="metadata-cache"):
+            MetadataCache()
+
+
+def test_cached_datasets_keep_their_form(tmp_path, fileset):
+    """Test that the dataset form comes back for datasets served from the cache"""
+    cache = MetadataCache(str(tmp_path / "cache"))
+    preprocess = FakePreprocess()
+    cache.preprocess(fileset, step_size=50, preprocess=preprocess)
+
+    available, updated = cache.preprocess(fileset, step_size=50, preprocess=preprocess)
+    assert len(preprocess.files) == 4
+    assert available["ttbar"]["form"] == updated["data"]["form"] == "form"
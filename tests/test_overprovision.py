@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from coffea_casa.overprovision import (
+    DEFAULT_FRACTION,
+    MAX_SAMPLES,
+    load_startup_times,
+    save_startup_times,
+    surplus_jobs,
+)
+
+
+def test_surplus_grows_with_the_tail():
+    """Test that heavier startup tails get a larger surplus"""
+    light = [60] * 19 + [600]
+    heavy = [60] * 16 + [600] * 4
+    assert surplus_jobs(50, light) < surplus_jobs(50, heavy)
+    assert surplus_jobs(50, [60] * 20) == 0
+
+
+def test_surplus_is_capped():
+    assert surplus_jobs(40, [60] * 10 + [600] * 10, maximum=0.25) == 10
+    assert surplus_jobs(1, [60] * 10 + [600] * 10) == 1
+    assert surplus_jobs(0, []) == 0
+
+
+def test_default_without_enough_samples():
+    assert surplus_jobs(30, [60] * 5) == round(30 * DEFAULT_FRACTION)
+
+
+def test_startup_times_round_trip(tmp_path):
+    path = tmp_path / "startup-times.json"
+    assert load_startup_times(path) == []
+    save_startup_times(range(MAX_SAMPLES + 10), path)
+    times = load_startup_times(path)
+    assert len(times) == MAX_SAMPLES and times[-1] == MAX_SAMPLES + 9
@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.condor.fake import evaluate, literal
+from coffea_casa.placement import rank_expression
+
+IMAGE = "hub.opensciencegrid.org/coffea-casa/cc-analysis-ubuntu:2026.10"
+REPO = "hub.opensciencegrid.org/coffea-casa/cc-analysis-ubuntu"
+
+
+def node(**attributes):
+    return {k: literal(v) for k, v in attributes.items()}
+
+
+def test_rank_orders_nodes_without_excluding_any():
+    """Test that nodes holding the image, at the site, with nvme rank first"""
+    rank = rank_expression(IMAGE, site="T2_US_Nebraska")
+    nodes = {
+        "warm": node(CoffeaCasaImageDigests=f"other:1@sha256:1,{REPO}:2026.10@sha256:2"),
+        "old-tag": node(CoffeaCasaImageDigests=f"{REPO}:2026.09@sha256:3",
+                        CoffeaCasaScratchType="nvme"),
+        "site-ssd": node(CoffeaCasaSite="T2_US_Nebraska", CoffeaCasaScratchType="ssd"),
+        "bare": node(),
+    }
+    ranks = {name: evaluate(rank, ad) for name, ad in nodes.items()}
+    assert ranks == {"warm": 100, "old-tag": 55, "site-ssd": 12.5, "bare": 0}
+
+
+def test_rank_of_digest_pinned_image():
+    rank = rank_expression(f"{REPO}@sha256:2", weights={"scratch": 0})
+    assert evaluate(rank, node(CoffeaCasaImageDigests=f"{REPO}:2026.10@sha256:2")) == 100
+    assert evaluate(rank, node(CoffeaCasaImageDigests=f"{REPO}:2026.10@sha256:9")) == 50
+
+
+def test_rank_without_terms():
+    assert rank_expression(IMAGE, weights={"image": 0, "scratch": 0}) is None
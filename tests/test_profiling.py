@@ -0,0 +1,68 @@
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from distributed import Client, LocalCluster
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from coffea_casa.profiling import (
+    flamegraph_svg,
+    format_folded,
+    parse_folded,
+    profile_workers,
+    sample_threads,
+)
+
+
+def spin(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        sum(range(1000))
+
+
+def test_sample_threads():
+    """Test that the sampler records the stacks of the given threads only"""
+    thread = threading.Thread(target=spin, args=(0.5,))
+    thread.start()
+    stacks = sample_threads(lambda: [thread.ident], 0.2, 0.01)
+    thread.join()
+    assert sum(stacks.values()) > 5
+    assert all(stack.split(";")[-1].startswith("spin (") for stack in stacks)
+
+
+def test_folded_round_trip():
+    """Test that folded stacks survive formatting and parsing"""
+    stacks = parse_folded("main (a.py);f (b.py) 3\nmain (a.py) 1\nnot a stack\n")
+    assert stacks == {"main (a.py);f (b.py)": 3, "main (a.py)": 1}
+    assert parse_folded(format_folded(stacks)) == stacks
+
+
+def test_flamegraph_svg():
+    """Test that the flamegraph is valid SVG with one frame per node"""
+    svg = flamegraph_svg({"main;f<x>": 3, "main;g": 1}, title="t")
+    root = ET.fromstring(svg)
+    titles = [el.text for el in root.iter("{http://www.w3.org/2000/svg}title")]
+    assert titles[0] == "all (4 samples, 100.00%)"
+    assert "f<x> (3 samples, 75.00%)" in titles
+    assert len(titles) == 4
+
+
+def test_profile_workers(tmp_path):
+    """Test that samples of all workers are merged into one flamegraph"""
+    with LocalCluster(n_workers=2, threads_per_worker=1, processes=False,
+                      dashboard_address=None) as cluster, Client(cluster) as client:
+        futures = client.map(spin, [1.5, 1.5], pure=False)
+        filename = str(tmp_path / "profile.svg")
+        profile = profile_workers(client, 0.5, filename=filename, native=True)
+        client.gather(futures)
+
+    assert len(profile.samplers) == 2
+    assert profile.samples > 10
+    assert profile.top(1)[0][0].startswith("spin (")
+    assert Path(filename).read_text().startswith("<svg")
+    # Workers without py-spy fall back to the Python sampler
+    for worker, sampler in profile.samplers.items():
+        assert sampler == "py-spy" or worker in profile.errors
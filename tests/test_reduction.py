@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from coffea_casa.reduction import accumulate, merge, tree_reduce
+
+hist = pytest.importorskip("hist")
+
+
+def make_output(i):
+    h = hist.Hist.new.Reg(10, 0, 10, name="x").Weight()
+    h.fill(x=[i % 10], weight=[2.0])
+    return {"hist": h, "cutflow": {"all": 1}, "datasets": {f"ds{i % 3}"}}
+
+
+def test_histograms_are_merged_in_place():
+    """Test that histogram buffers are added without a new histogram"""
+    a, b = make_output(1), make_output(1)
+    h = a["hist"]
+    out = accumulate(a, b)
+    assert out["hist"] is h
+    assert h[1].value == 4.0
+    assert h[1].variance == 8.0
+
+
+def test_merge_leaves_its_inputs_intact():
+    """Test that a merge failing half-way does not modify the worker's inputs"""
+    a, b = make_output(1), make_output(2)
+    c = {"hist": hist.Hist.new.Reg(10, 0, 10, name="x").Double()}
+    with pytest.raises(TypeError):
+        merge(a, b, c)
+    assert a["hist"].sum().value == 2.0 and a["cutflow"] == {"all": 1}
+    assert merge(a, b)["hist"].sum().value == 4.0
+    assert merge(None, a, b)["hist"] is not a["hist"]
+    assert a["hist"].sum().value == 2.0
+
+
+def test_storage_mismatch_is_an_error():
+    """Test that histograms with different storages are not silently merged"""
+    a = hist.Hist.new.Reg(10, 0, 10).Double()
+    b = hist.Hist.new.Reg(10, 0, 10).Weight()
+    with pytest.raises(TypeError, match="Double and Weight"):
+        accumulate(a, b)
+
+
+def test_tree_reduce():
+    """Test that the tree gives the full sum and reports the merge phase"""
+    from distributed import Client, LocalCluster
+
+    with LocalCluster(n_workers=2, threads_per_worker=1, processes=False,
+                      dashboard_address=None) as cluster, Client(cluster) as client:
+        futures = client.map(make_output, range(20))
+        out, report = tree_reduce(client, futures, fan_in=3, sample_interval="50ms")
+
+    assert out["cutflow"]["all"] == 20
+    assert out["datasets"] == {"ds0", "ds1", "ds2"}
+    assert out["hist"].sum().value == 40.0
+    # 20 -> 7 -> 3 -> 1
+    assert (report.levels, report.merges) == (3, 11)
+    assert report.wall_time > 0
+    assert report.peak_worker_memory > 0
+    assert "fan-in 3" in repr(report)
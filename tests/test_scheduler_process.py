@@ -0,0 +1,63 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from distributed import Client, SpecCluster, Worker
+from distributed.security import Security
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from coffea_casa.scheduler_process import SchedulerProcess
+
+
+@pytest.fixture(autouse=True)
+def importable(monkeypatch):
+    """Make coffea_casa importable by the scheduler process"""
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join(
+        filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])))
+
+
+async def run_cluster(security=None, protocol="tcp"):
+    async with SpecCluster(
+        scheduler={"cls": SchedulerProcess,
+                   "options": {"protocol": protocol, "port": 0,
+                               "dashboard_address": ":0", "security": security}},
+        workers={"a": {"cls": Worker, "options": {"nthreads": 1, "security": security}}},
+        security=security,
+        asynchronous=True,
+    ) as cluster:
+        process = cluster.scheduler.process
+        async with Client(cluster, security=security, asynchronous=True) as client:
+            assert await client.submit(sum, [1, 2]) == 3
+            scheduler_pid = await client.run_on_scheduler(os.getpid)
+            address = cluster.scheduler_address
+    return process, scheduler_pid, address
+
+
+def test_scheduler_runs_in_its_own_process():
+    """Test that the scheduler runs and stops outside of the cluster's process"""
+    process, scheduler_pid, _ = asyncio.run(run_cluster())
+    assert scheduler_pid == process.pid != os.getpid()
+    assert process.poll() is not None
+
+
+def test_scheduler_process_uses_tls():
+    """Test that the scheduler process listens with the cluster's TLS material"""
+    pytest.importorskip("cryptography")
+    security = Security.temporary()
+    _, _, address = asyncio.run(run_cluster(security, protocol="tls"))
+    assert address.startswith("tls://")
+
+
+def test_options_must_be_serializable():
+    """Test that options which cannot reach the child are rejected"""
+    scheduler = SchedulerProcess(plugins=[object()])
+
+    async def start():
+        await scheduler.start()
+
+    with pytest.raises(TypeError, match="JSON serializable"):
+        asyncio.run(start())
@@ -0,0 +1,89 @@
+import importlib.util
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PREPARE_ENV = Path(__file__).parent.parent / "docker/prepare-env"
+
+
+@pytest.fixture(scope="module")
+def sitecustomize():
+    spec = importlib.util.spec_from_file_location(
+        "image_sitecustomize", PREPARE_ENV / "sitecustomize.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_python(code, **env):
+    env = {**os.environ, "PYTHONPATH": str(PREPARE_ENV), **env}
+    return subprocess.run([sys.executable, "-c", code], env=env, capture_output=True,
+                          text=True, check=True, timeout=60)
+
+
+@pytest.mark.parametrize("argv, kind", [
+    (["python", "-m", "ipykernel_launcher", "-f", "kernel.json"], "kernel"),
+    (["python", "/opt/conda/bin/jupyterhub-singleuser", "--ip=0.0.0.0"], "server"),
+    (["python", "-m", "distributed.cli.dask_worker", "tls://sched:8786"], "worker"),
+    (["python", "/opt/conda/bin/dask", "worker", "tls://sched:8786"], "worker"),
+    (["python", "-c", "from coffea_casa.scheduler_process import main", "{}"], "scheduler"),
+    (["python", "-m", "pip", "install", "ipykernel"], "other"),
+    (["python", "-X", "importtime", "-c", "pass"], "other"),
+])
+def test_process_kind(sitecustomize, argv, kind):
+    assert sitecustomize.process_kind(argv, environ={}) == kind
+
+
+def test_process_kind_multiprocessing(sitecustomize):
+    argv = ["python", "-c", "from multiprocessing.spawn import spawn_main",
+            "--multiprocessing-fork"]
+    assert sitecustomize.process_kind(argv, environ={}) == "other"
+    assert sitecustomize.process_kind(
+        argv, environ={"PYROSCOPE_PROCESS_KIND": "worker"}) == "worker"
+
+
+def test_policy(sitecustomize):
+    assert sitecustomize.policy({}) == ({"server", "kernel"}, 100)
+    assert sitecustomize.policy({"PYROSCOPE_PROFILE": "none"})[0] == set()
+    kinds, rate = sitecustomize.policy({"PYROSCOPE_PROFILE": "all",
+                                        "PYROSCOPE_SAMPLE_RATE": "19"})
+    assert kinds == set(sitecustomize.KINDS) and rate == 19
+
+
+def test_unprofiled_startup_is_cheap():
+    out = run_python("import sys, sitecustomize; "
+                     "print(sitecustomize.STARTUP_SECONDS, 'threading' in sys.modules)")
+    seconds, threading = out.stdout.split()
+    assert float(seconds) < 0.005
+    assert threading == "False"
+
+
+def test_file_sink_is_opt_in(sitecustomize):
+    environ = {"PYROSCOPE_SERVER_ADDRESS": "http://127.0.0.1:1"}
+    assert sitecustomize.activate("kernel", 100, environ) is None
+
+
+def test_file_sink_stacks_are_capped(sitecustomize, tmp_path):
+    sink = sitecustomize.FileSink(str(tmp_path / "sink.folded"), 10, max_stacks=1)
+    sink.stacks["a;b"] = 1
+    sink.sample()
+    assert set(sink.stacks) == {"a;b", sitecustomize.OTHER_STACKS}
+
+
+def test_file_sink_when_server_unreachable(tmp_path):
+    code = ("import time\n"
+            "def busy_loop():\n"
+            "    end = time.monotonic() + 0.5\n"
+            "    while time.monotonic() < end:\n"
+            "        sum(range(1000))\n"
+            "busy_loop()\n")
+    out = run_python(code, PYROSCOPE_PROFILE="all", PYROSCOPE_START_DELAY="0",
+                     PYROSCOPE_SERVER_ADDRESS="http://127.0.0.1:1",
+                     PYROSCOPE_SINK_DIR=str(tmp_path))
+    assert "writing samples to" in out.stderr
+    [folded] = tmp_path.glob("other-*.folded")
+    stack, count = folded.read_text().splitlines()[0].rsplit(" ", 1)
+    assert stack.endswith("busy_loop (<string>)") and int(count) > 0
@@ -0,0 +1,94 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from coffea_casa.taskvine import CoffeaCasaVineCluster, JOB_IDLE, JOB_RUNNING
+
+
+@pytest.fixture
+def manager():
+    """A stand-in for an ndcctools.taskvine manager"""
+    return SimpleNamespace(
+        port=9123,
+        stats=SimpleNamespace(tasks_waiting=0, tasks_on_workers=0),
+    )
+
+
+@pytest.fixture
+def cluster(manager, monkeypatch):
+    monkeypatch.setenv("POD_IP", "192.168.1.100")
+    return CoffeaCasaVineCluster(manager=manager, worker_image="dummy",
+                                 force_tcp=True, cores=2, memory="4GiB",
+                                 batch_size=3)
+
+
+def test_job_script_targets_the_manager(cluster):
+    """Test that workers are tagged as taskvine and point at the manager"""
+    script = cluster.job_script(5)
+    assert '+CoffeaCasaWorkerType = "taskvine"' in script
+    assert '+DaskSchedulerAddress = "tcp://192.168.1.100:9123"' in script
+    assert f'+CoffeaCasaVineCluster = "{cluster.name}"' in script
+    assert "request_cpus = 2" in script
+    assert "request_memory = 4096" in script
+    assert script.endswith("queue 5\n")
+
+
+def test_external_manager_address(monkeypatch):
+    """Test submitting workers for a manager given as host:port"""
+    monkeypatch.setenv("POD_IP", "192.168.1.100")
+    cluster = CoffeaCasaVineCluster(manager="10.0.0.1:8786", worker_image="dummy",
+                                    force_tcp=True)
+    assert cluster.manager is None
+    assert '+DaskSchedulerAddress = "tcp://10.0.0.1:8786"' in cluster.job_script()
+    with pytest.raises(ValueError):
+        cluster.adapt()
+
+
+def test_scale_up_submits_in_batches(cluster):
+    """Test that scale() submits the missing workers in batches"""
+    calls = []
+
+    def call(cmd):
+        calls.append(cmd)
+        if cmd[0] == "condor_q":
+            return "10 0 2\n"
+        return f"4 job(s) submitted to cluster {len(calls)}.\n"
+
+    with patch.object(cluster, "_call", side_effect=call):
+        cluster.scale(8)
+
+    submits = [c for c in calls if c[0] == "condor_submit"]
+    assert len(submits) == 3  # 7 missing workers, batches of 3
+
+
+def test_scale_down_removes_idle_jobs_first(cluster):
+    """Test that scale-down cancels jobs that have not started yet"""
+    jobs = {"10.0": JOB_RUNNING, "10.1": JOB_IDLE, "11.0": JOB_IDLE}
+    with patch.object(cluster, "jobs", return_value=jobs), \
+         patch.object(cluster, "_call") as mock_call:
+        cluster.scale(1)
+
+    mock_call.assert_called_once_with(["condor_rm", "11.0", "10.1"])
+
+
+def test_adaptive_target_follows_waiting_tasks(cluster, manager):
+    """Test that the adaptive target is derived from the manager's task count"""
+    manager.stats.tasks_waiting = 9
+    manager.stats.tasks_on_workers = 4
+    assert cluster._adaptive_target(0, 100) == 7  # 13 tasks / 2 cores
+    assert cluster._adaptive_target(0, 5) == 5
+    manager.stats.tasks_waiting = manager.stats.tasks_on_workers = 0
+    assert cluster._adaptive_target(1, 5) == 1
+
+
+def test_close_removes_all_jobs_at_once(cluster):
+    """Test that close() issues a single constraint-based condor_rm"""
+    with patch.object(cluster, "_call") as mock_call:
+        cluster.close()
+    mock_call.assert_called_once_with(
+        ["condor_rm", "-constraint", f'CoffeaCasaVineCluster == "{cluster.name}"'])
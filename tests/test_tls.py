@@ -0,0 +1,103 @@
+import asyncio
+import importlib.util
+import ssl
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+pytest.importorskip("cryptography")
+pytest.importorskip("jwt")
+
+from distributed.comm import connect, listen
+
+from coffea_casa.tls import CoffeaCasaSecurity
+
+AUTH = Path(__file__).parent.parent / "charts/coffea-casa/files/hub-extra/auth.py"
+
+
+@pytest.fixture(scope="module")
+def auth():
+    """The hub's certificate helpers"""
+    spec = importlib.util.spec_from_file_location("hub_auth", AUTH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_pki(auth, path, key_type):
+    _, ca_cert, server, user = auth.generate_x509(key_type)
+    (path / "ca.pem").write_bytes(ca_cert)
+    (path / "server.pem").write_bytes(server)
+    (path / "user.pem").write_bytes(user)
+    return CoffeaCasaSecurity(
+        tls_ca_file=str(path / "ca.pem"),
+        tls_scheduler_cert=str(path / "server.pem"),
+        tls_client_cert=str(path / "user.pem"),
+        require_encryption=True,
+    )
+
+
+@pytest.mark.parametrize("key_type", ["ecdsa", "rsa"])
+def test_generate_x509_key_type(auth, key_type):
+    """Test that the per-user PKI uses the requested key type"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    expected = {"ecdsa": ec.EllipticCurvePublicKey, "rsa": rsa.RSAPublicKey}[key_type]
+    _, ca_cert, server, user = auth.generate_x509(key_type)
+    for pem in (ca_cert, server, user):
+        cert = x509.load_pem_x509_certificate(pem[pem.index(b"-----BEGIN CERTIFICATE"):])
+        assert isinstance(cert.public_key(), expected)
+
+
+def test_ecdsa_is_the_default(auth):
+    """Test that new users get an ECDSA P-256 PKI"""
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    key = auth.generate_private_key()
+    assert isinstance(key, ec.EllipticCurvePrivateKey)
+    assert key.curve.name == "secp256r1"
+
+
+def test_reconnect_resumes_session(auth, tmp_path):
+    """Test that reconnecting to a peer resumes the TLS session"""
+    security = write_pki(auth, tmp_path, "ecdsa")
+
+    async def handler(comm):
+        await comm.write(await comm.read())
+        await comm.close()
+
+    async def run():
+        listener = listen("tls://127.0.0.1:0", handler,
+                          **security.get_listen_args("scheduler"))
+        await listener.start()
+        reused = []
+        try:
+            args = security.get_connection_args("client")
+            for _ in range(3):
+                comm = await connect(listener.contact_address, **args)
+                await comm.write("ping")
+                assert await comm.read() == "ping"
+                sock = comm.stream.socket
+                reused.append(sock.session_reused)
+                assert sock.version() in ("TLSv1.2", "TLSv1.3")
+                await comm.close()
+        finally:
+            listener.stop()
+        return reused
+
+    assert asyncio.run(run()) == [False, True, True]
+
+
+def test_enable_session_resumption():
+    """Test that resumption is enabled in place on both kinds of contexts"""
+    from coffea_casa.tls import ResumingSSLSocket, enable_session_resumption
+
+    context = enable_session_resumption(ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT))
+    assert context.sslsocket_class is ResumingSSLSocket
+    assert not context.options & ssl.OP_NO_TICKET
+    server = enable_session_resumption(ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER))
+    assert server.num_tickets >= 2
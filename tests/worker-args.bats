@@ -270,3 +270,219 @@ write_ad() {
     [[ "$output" == *"--memory-limit 2048MB"* ]]
     [[ "$output" == *"--name dask-worker-"* ]]
 }
+
+# --- graceful drain ---------------------------------------------------------
+
+@test "drain timeout is read from CoffeaCasaDrainTimeout" {
+    write_ad 'CoffeaCasaDrainTimeout = 60'
+    run cc_worker_drain_timeout "$AD"
+    [ "$output" = "60" ]
+}
+
+@test "drain timeout is empty when absent, undefined or zero" {
+    write_ad 'DaskWorkerCores = 4'
+    run cc_worker_drain_timeout "$AD"
+    [ "$output" = "" ]
+    write_ad 'CoffeaCasaDrainTimeout = 0'
+    run cc_worker_drain_timeout "$AD"
+    [ "$output" = "" ]
+}
+
+@test "build_drain_command retires this worker on the scheduler" {
+    write_ad \
+        'DaskSchedulerAddress = "tls://1.2.3.4:8786"' \
+        'DaskWorkerName = "htcondor--12345.0--"'
+
+    PATH_CA_FILE=/tmp/ca.pem FILE_CERT=/tmp/host.pem FILE_KEY=/tmp/host.pem \
+        run cc_build_drain_command "$AD" 45
+
+    [ "$status" -eq 0 ]
+    [[ "$output" == *"-m coffea_casa.preemption tls://1.2.3.4:8786 htcondor--12345.0--"* ]]
+    [[ "$output" == *"--timeout 45"* ]]
+    [[ "$output" == *"--tls-ca-file /tmp/ca.pem"* ]]
+}
+
+# --- lifetime ---------------------------------------------------------------
+
+@test "lifetime uses DaskWorkerLifetime and its stagger when present" {
+    write_ad 'DaskWorkerLifetime = 7931' 'DaskWorkerLifetimeStagger = 300'
+    run cc_worker_lifetime "$AD"
+    [ "$output" = "7931" ]
+    run cc_worker_lifetime_stagger "$AD"
+    [ "$output" = "300" ]
+}
+
+@test "lifetime falls back to 7200s without stagger" {
+    write_ad 'DaskWorkerCores = 4'
+    run cc_worker_lifetime "$AD"
+    [ "$output" = "7200" ]
+    run cc_worker_lifetime_stagger "$AD"
+    [ "$output" = "0" ]
+}
+
+@test "build_worker_command passes the per-job lifetime" {
+    write_ad \
+        'nanny_ContainerPort = 8001' \
+        'dask_ContainerPort = 8786' \
+        'StartdIpAddr = "<10.0.0.7:9618>"' \
+        'DaskSchedulerAddress = "tls://1.2.3.4:8786"' \
+        'DaskWorkerLifetime = 7931' \
+        'DaskWorkerLifetimeStagger = 300'
+
+    run cc_build_worker_command "$AD"
+    [ "$status" -eq 0 ]
+    [[ "$output" == *"--lifetime 7931s"* ]]
+    [[ "$output" == *"--lifetime-stagger 300s"* ]]
+}
+
+@test "build_worker_command preloads TLS session resumption" {
+    write_ad \
+        'nanny_ContainerPort = 8001' \
+        'dask_ContainerPort = 8786' \
+        'StartdIpAddr = "<10.0.0.7:9618>"' \
+        'DaskSchedulerAddress = "tls://1.2.3.4:8786"'
+
+    run cc_build_worker_command "$AD"
+    [ "$status" -eq 0 ]
+    [[ "$output" == *"--preload coffea_casa.tls"* ]]
+}
+
+@test "build_worker_command sets the comm profile in the environment" {
+    write_ad \
+        'nanny_ContainerPort = 8001' \
+        'dask_ContainerPort = 8786' \
+        'StartdIpAddr = "<10.0.0.7:9618>"' \
+        'DaskSchedulerAddress = "tls://1.2.3.4:8786"' \
+        'DaskCommCompression = "zstd"' \
+        'DaskCommZstdLevel = 9' \
+        'DaskCommShard = "8MiB"' \
+        'DaskCommOffload = "1MiB"'
+
+    run cc_build_worker_command "$AD"
+    [ "$status" -eq 0 ]
+    [[ "$output" == "env DASK_DISTRIBUTED__COMM__COMPRESSION=zstd DASK_DISTRIBUTED__COMM__ZSTD__LEVEL=9 DASK_DISTRIBUTED__COMM__SHARD=8MiB DASK_DISTRIBUTED__COMM__OFFLOAD=1MiB /opt/conda/bin/python "* ]]
+}
+
+@test "build_worker_command has no env prefix without a comm profile" {
+    write_ad \
+        'nanny_ContainerPort = 8001' \
+        'dask_ContainerPort = 8786' \
+        'StartdIpAddr = "<10.0.0.7:9618>"' \
+        'DaskSchedulerAddress = "tls://1.2.3.4:8786"'
+
+    run cc_worker_comm_env "$AD"
+    [ "$status" -eq 0 ]
+    [ "$output" = "" ]
+    run cc_build_worker_command "$AD"
+    [[ "$output" == "/opt/conda/bin/python "* ]]
+}
+
+@test "build_worker_command advertises the job's worker resources" {
+    write_ad \
+        'nanny_ContainerPort = 8001' \
+        'dask_ContainerPort = 8786' \
+        'StartdIpAddr = "<10.0.0.7:9618>"' \
+        'DaskSchedulerAddress = "tls://1.2.3.4:8786"'
+    run cc_build_worker_command "$AD"
+    [[ "$output" != *"--resources"* ]]
+
+    printf '%s\n' 'DaskWorkerResources = "coffea-casa-bigmem=1"' >> "$AD"
+    run cc_build_worker_command "$AD"
+    [ "$status" -eq 0 ]
+    [[ "$output" == *"--contact-address tls://10.0.0.7:8786 --resources coffea-casa-bigmem=1" ]]
+}
+
+# --- taskvine ---------------------------------------------------------------
+
+@test "build_worker_command starts vine_worker for taskvine jobs" {
+    write_ad \
+        'CoffeaCasaWorkerType = "taskvine"' \
+        'DaskSchedulerAddress = "tls://1.2.3.4:9123"' \
+        'DaskWorkerCores = 2' \
+        'RequestMemory = 4096' \
+        'RequestDisk = 2097152' \
+        'CoffeaCasaVineTimeout = 120'
+
+    run cc_build_worker_command "$AD"
+    [ "$status" -eq 0 ]
+    [[ "$output" == *"vine_worker --ssl"* ]]
+    [[ "$output" == *"--cores 2 --memory 4096 --disk 2048 --timeout 120"* ]]
+    [[ "$output" == *" 1.2.3.4 9123" ]]
+    [[ "$output" != *"dask_worker"* ]]
+}
+
+@test "vine worker connects without SSL to a tcp:// manager" {
+    write_ad \
+        'CoffeaCasaWorkerType = "taskvine"' \
+        'DaskSchedulerAddress = "tcp://1.2.3.4:9123"'
+
+    run cc_build_worker_command "$AD"
+    [[ "$output" != *"--ssl"* ]]
+    [[ "$output" == *"--timeout 300"* ]]
+}
+
+# --- pilot jobs -------------------------------------------------------------
+
+write_pilot_ad() {
+    write_ad \
+        'DaskWorkerProcesses = 2' \
+        'DaskWorkerName = "htcondor--12345.0--"' \
+        'DaskWorkerCores = 8' \
+        'DaskWorkerMemory = 8589934592' \
+        'DaskSchedulerAddress = "tls://1.2.3.4:8786"' \
+        'StartdIpAddr = "<10.0.0.7:9618>"' \
+        'dask_ContainerPort = 8786' \
+        'nanny_ContainerPort = 8001' \
+        'dask1_ContainerPort = 8787' \
+        'nanny1_ContainerPort = 8002' \
+        'dask_HostPort = 30001' \
+        'nanny_HostPort = 30002' \
+        "$@"
+}
+
+@test "processes defaults to one worker per job" {
+    write_ad 'DaskWorkerCores = 4'
+    run cc_worker_processes "$AD"
+    [ "$output" = "1" ]
+    run cc_worker_name "$AD" 0
+    [[ "$output" != *"--0" ]]
+}
+
+@test "each worker of a pilot job gets its ports, name and share of the job" {
+    write_pilot_ad 'dask1_HostPort = 30003' 'nanny1_HostPort = 30004'
+
+    run cc_build_worker_command "$AD" 1
+    [ "$status" -eq 0 ]
+    [[ "$output" == *"--name htcondor--12345.0---1"* ]]
+    [[ "$output" == *"--nthreads 4"* ]]
+    [[ "$output" == *"--memory-limit 4294967296"* ]]
+    [[ "$output" == *"--listen-address tls://0.0.0.0:8787"* ]]
+    [[ "$output" == *"--nanny-port 8002"* ]]
+    [[ "$output" == *"--contact-address tls://10.0.0.7:30003"* ]]
+    [[ "$output" == *"--nanny-contact-address tls://10.0.0.7:30004"* ]]
+
+    run cc_build_worker_command "$AD" 0
+    [[ "$output" == *"--name htcondor--12345.0---0"* ]]
+    [[ "$output" == *"--contact-address tls://10.0.0.7:30001"* ]]
+}
+
+@test "a pilot job waits for and validates the ports of every worker" {
+    write_pilot_ad
+    run cc_worker_ports_defined "$AD"
+    [ "$status" -eq 1 ]
+    write_pilot_ad 'dask1_HostPort = 30003' 'nanny1_HostPort = 30004'
+    run cc_worker_ports_defined "$AD"
+    [ "$status" -eq 0 ]
+
+    write_ad 'DaskWorkerProcesses = 2' 'dask_ContainerPort = 8786' 'nanny_ContainerPort = 8001' \
+        'DaskSchedulerAddress = "tls://1.2.3.4:8786"' 'StartdIpAddr = "<10.0.0.7:9618>"'
+    run cc_worker_validate "$AD"
+    [ "$status" -eq 1 ]
+    [[ "$output" == *"dask1_ContainerPort nanny1_ContainerPort"* ]]
+}
+
+@test "build_drain_command retires all workers of a pilot job" {
+    write_pilot_ad
+    run cc_build_drain_command "$AD" 45
+    [[ "$output" == *"tls://1.2.3.4:8786 htcondor--12345.0---0 htcondor--12345.0---1 "* ]]
+}
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Time the interpreter start cost of the image's sitecustomize.py.
+
+Runs N short Python processes (``python -c pass``) without the module, with
+it and profiling disabled for the process, and with it and profiling enabled
+(the agent starts later, in a background thread), and prints the median and
+p90 wall time of each.
+
+    python tools/benchmark-sitecustomize.py --runs 50
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+here_dir = os.path.abspath(os.path.dirname(__file__))
+prepare_env = os.path.join(here_dir, os.pardir, "docker/prepare-env")
+
+
+def time_starts(env, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], env=env, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=50, help="processes per configuration")
+    args = parser.parse_args()
+
+    base = {k: v for k, v in os.environ.items() if not k.startswith("PYROSCOPE_")}
+    base.pop("PYTHONPATH", None)
+    configurations = (
+        ("no sitecustomize", base),
+        ("not profiled", {**base, "PYTHONPATH": prepare_env}),
+        ("profiled", {**base, "PYTHONPATH": prepare_env, "PYROSCOPE_PROFILE": "all",
+                      "PYROSCOPE_SINK_DIR": ""}),
+    )
+    print(f"{'configuration':<20}{'median ms':>10}{'p90 ms':>10}")
+    for label, env in configurations:
+        timings = time_starts(env, args.runs)
+        p90 = statistics.quantiles(timings, n=10)[-1]
+        print(f"{label:<20}{statistics.median(timings) * 1e3:>10.2f}{p90 * 1e3:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Time the TLS connection setup of Dask comms with the per-user PKI of the hub.
+
+For each key type (RSA-2048 and ECDSA P-256) a fresh PKI is generated with
+charts/coffea-casa/files/hub-extra/auth.py, a Dask TLS listener is started
+with the server certificate, and N sequential connections are opened with the
+user certificate, once with full handshakes and once resuming TLS sessions as
+``coffea_casa.security_obj()`` does. Each connection exchanges one message.
+
+    python tools/benchmark-tls-handshake.py --connections 200
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from distributed.comm import connect, listen
+from distributed.security import Security
+
+here_dir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(here_dir, os.pardir))
+
+from coffea_casa.tls import CoffeaCasaSecurity  # noqa: E402
+
+auth_py = os.path.join(here_dir, os.pardir, "charts/coffea-casa/files/hub-extra/auth.py")
+
+
+def load_auth():
+    spec = importlib.util.spec_from_file_location("hub_auth", auth_py)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_pki(auth, directory, key_type):
+    _, ca_cert, server, user = auth.generate_x509(key_type)
+    files = {}
+    for name, data in (("ca", ca_cert), ("server", server), ("user", user)):
+        files[name] = os.path.join(directory, f"{key_type}-{name}.pem")
+        with open(files[name], "wb") as f:
+            f.write(data)
+    return files
+
+
+async def time_connections(files, security_class, connections):
+    security = security_class(
+        tls_ca_file=files["ca"],
+        tls_scheduler_cert=files["server"],
+        tls_client_cert=files["user"],
+        require_encryption=True,
+    )
+
+    async def handler(comm):
+        await comm.write(await comm.read())
+        await comm.close()
+
+    listener = listen("tls://127.0.0.1:0", handler, **security.get_listen_args("scheduler"))
+    await listener.start()
+    args = security.get_connection_args("client")
+    timings, resumed = [], 0
+    try:
+        for _ in range(connections):
+            start = time.perf_counter()
+            comm = await connect(listener.contact_address, **args)
+            await comm.write(b"ping")
+            await comm.read()
+            timings.append(time.perf_counter() - start)
+            resumed += comm.stream.socket.session_reused
+            await comm.close()
+    finally:
+        listener.stop()
+    return timings, resumed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--connections", type=int, default=200,
+                        help="sequential connections per configuration")
+    args = parser.parse_args()
+
+    auth = load_auth()
+    print(f"{'key':<8}{'sessions':<12}{'median ms':>10}{'p90 ms':>10}"
+          f"{'conn/s':>10}{'resumed':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for key_type in ("rsa", "ecdsa"):
+            files = write_pki(auth, directory, key_type)
+            for label, security_class in (("full", Security),
+                                          ("resumed", CoffeaCasaSecurity)):
+                timings, resumed = asyncio.run(
+                    time_connections(files, security_class, args.connections))
+                p90 = statistics.quantiles(timings, n=10)[-1]
+                print(f"{key_type:<8}{label:<12}"
+                      f"{statistics.median(timings) * 1e3:>10.2f}{p90 * 1e3:>10.2f}"
+                      f"{len(timings) / sum(timings):>10.0f}{resumed:>10}")
+
+
+if __name__ == "__main__":
+    main()